@@ -8,6 +8,7 @@ from django.core.paginator import Page, Paginator
 from django.utils import simplejson
 from django.http import Http404
 from ella.utils.timezone import to_timestamp
+from ella.utils.pagination import CursorPage
 
 
 
@@ -19,7 +20,24 @@ def serialize_dict(request, d):
     return dict((k, object_serializer.serialize(request, v)) for k, v in d.iteritems())
 
 
+def _load_authors(page):
+    " Load authors of all the listed objects at once. "
+    publishables = [o.publishable if isinstance(o, Listing) else o for o in page.object_list]
+    Publishable.objects.load_authors([p for p in publishables if isinstance(p, Publishable)])
+
+
+def serialize_cursor_page(request, page):
+    _load_authors(page)
+    return {
+        'per_page': page.paginator.per_page,
+        'cursor': page.cursor,
+        'next_cursor': page.next_cursor,
+        'objects': serialize_list(request, page.object_list),
+    }
+
+
 def serialize_page(request, page):
+    _load_authors(page)
     return {
         'total': page.paginator.count,
         'per_page': page.paginator.per_page,
@@ -33,7 +51,11 @@ def serialize_full_category(request, category):
     page_no = 1
     if 'p' in request.GET and request.GET['p'].isdigit():
         page_no = int(request.GET['p'])
-    return object_serializer.serialize(request, {'category': category, 'listings': category.app_data.ella.get_listings_page(page_no)})
+    if 'cursor' in request.GET:
+        listings = category.app_data.ella.get_listings_page_after(request.GET['cursor'] or None)
+    else:
+        listings = category.app_data.ella.get_listings_page(page_no)
+    return object_serializer.serialize(request, {'category': category, 'listings': listings})
 
 
 def serialize_category(request, category):
@@ -86,7 +108,7 @@ def serialize_publishable(request, publishable):
         'content_type': publishable.content_type.name,
         'description': publishable.description,
         'photo': serialize_photo(request, publishable.photo, formats=api_settings.PUBLISHABLE_PHOTO_FORMATS) if publishable.photo_id else None,
-        'authors': [serialize_author(request, a) for a in publishable.authors.all()],
+        'authors': [serialize_author(request, a) for a in publishable.get_authors()],
         'source': serialize_source(request, publishable.source) if publishable.source_id else None
     }
 
@@ -102,6 +124,7 @@ object_serializer.register(list, serialize_list)
 object_serializer.register(dict, serialize_dict)
 object_serializer.register(tuple, serialize_list)
 object_serializer.register(Page, serialize_page)
+object_serializer.register(CursorPage, serialize_cursor_page)
 object_serializer.register(Author, serialize_full_author, FULL)
 object_serializer.register(Author, serialize_author)
 object_serializer.register(Source, serialize_source)
@@ -6,6 +6,7 @@ from django.core.cache import cache
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 
+from ella.core.cache import stats
 from ella.core.cache.utils import normalize_key, _get_key, KEY_PREFIX
 from ella.core.conf import core_settings
 
@@ -102,10 +103,16 @@ class Box(object):
                 return self.double_render()
         key = self.get_cache_key()
         if key:
+            group = 'box:%s.%s' % (self.ct.app_label, self.ct.model)
             rend = cache.get(key)
             if rend is None:
-                rend = self._render(context)
+                stats.incr(group, 'misses')
+                with stats.timer(group, 'render_time'):
+                    rend = self._render(context)
+                stats.sample_size(group, rend)
                 cache.set(key, rend, core_settings.CACHE_TIMEOUT)
+            else:
+                stats.incr(group, 'hits')
         else:
             rend = self._render(context)
         return rend
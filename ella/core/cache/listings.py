@@ -0,0 +1,269 @@
+"""
+Bookkeeping of cached listings updated from the ``Listing`` and publish
+signals:
+
+* numbers of listings in categories, so that paginating listings doesn't
+  have to count them on every page. Counts are kept per listing handler
+  class, category, children mode and content type.
+
+* generations of categories and content types that are part of the listing
+  cache keys, any change of listings moves the generations of the affected
+  categories (with all ancestors the listings propagate to) and content type
+  so that cached listings never outlive the change. So does moving a
+  category or changing its ``propagate_listings``.
+"""
+from __future__ import absolute_import
+
+from contextlib import contextmanager
+from hashlib import md5
+from threading import local
+from uuid import uuid4
+
+from django.db.models.loading import get_model
+
+from ella.core.cache import utils
+from ella.core.conf import core_settings
+
+COUNT_KEY = 'core.listing_count:%s:%s:%d:%s'
+GENERATION_KEY = 'core.listing_gen:%s:%s'
+
+# generations loaded ahead by ``prefetched_generations``
+_prefetched = local()
+
+
+def _get_key(handler_class, category_id, children, content_type_id=''):
+    return COUNT_KEY % (handler_class.__name__, category_id, children, content_type_id)
+
+
+def get_count_key(handler):
+    """
+    Return cache key for number of listings returned by ``handler``, None if
+    the handler's parameters are too specific to keep the count up to date.
+    """
+    if handler.category is None or handler.date_range or handler.exclude or \
+            handler.kwargs or len(handler.content_types) > 1:
+        return None
+    ct_id = handler.content_types[0].pk if handler.content_types else ''
+    return _get_key(handler.__class__, handler.category.pk, handler.children, ct_id)
+
+
+def get_count(handler, count):
+    " Return number of listings of ``handler``, calling ``count()`` if not cached. "
+    key = get_count_key(handler)
+    if key is None:
+        return count()
+
+    value = utils.cache.get(key)
+    if value is None:
+        value = count()
+        utils.cache.set(key, value, core_settings.CACHE_LISTING_COUNT_TIMEOUT)
+    return value
+
+
+def _get_generation_keys(category_ids=(), content_type_ids=()):
+    keys = [GENERATION_KEY % ('c', pk) for pk in category_ids]
+    keys.extend(GENERATION_KEY % ('ct', pk) for pk in content_type_ids)
+    return keys
+
+
+def _get_generation_keys_for(category=None, content_types=()):
+    if category is not None:
+        return _get_generation_keys([category.pk])
+    elif content_types:
+        return _get_generation_keys(content_type_ids=[ct.pk for ct in content_types])
+    return _get_generation_keys([''])
+
+
+def _load_generations(keys):
+    generations = utils.cache.get_many(keys)
+    missing = dict((k, uuid4().hex) for k in keys if k not in generations)
+    if missing:
+        # never fall back to a default, cached listings might still use it
+        utils.cache.set_many(missing, core_settings.CACHE_TIMEOUT_LONG)
+        generations.update(missing)
+    return generations
+
+
+def get_generation(category=None, content_types=()):
+    """
+    Return a token that changes whenever listings in ``category`` (and its
+    descendants) change, or listings of any of ``content_types`` when no
+    category is given, or any listings at all.
+    """
+    keys = _get_generation_keys_for(category, content_types)
+
+    generations = getattr(_prefetched, 'generations', None)
+    if generations is None or not all(k in generations for k in keys):
+        generations = _load_generations(keys)
+    return md5(','.join(generations[k] for k in keys)).hexdigest()
+
+
+@contextmanager
+def prefetched_generations(listings):
+    """
+    Load generations of all the (category, content_types) ``listings`` with
+    one cache call, ``get_generation`` uses them inside the block instead of
+    asking the cache for every listing.
+    """
+    keys = set()
+    for category, content_types in listings:
+        keys.update(_get_generation_keys_for(category, content_types))
+
+    _prefetched.generations = _load_generations(list(keys))
+    try:
+        yield
+    finally:
+        _prefetched.generations = None
+
+
+def bump_generations(ancestor_ids, content_type_id):
+    " Move generations of categories ``ancestor_ids``, ``content_type_id`` and of all listings. "
+    token = uuid4().hex
+    keys = _get_generation_keys(list(ancestor_ids) + [''], [content_type_id])
+    utils.cache.set_many(dict((k, token) for k in keys), core_settings.CACHE_TIMEOUT_LONG)
+
+
+def get_ancestors(category_id):
+    " Return (ancestor_id, depth) of all the categories listings of ``category_id`` appear in. "
+    CategoryClosure = get_model('core', 'categoryclosure')
+    return list(CategoryClosure.objects.filter(descendant=category_id).values_list('ancestor', 'depth'))
+
+
+def get_keys(ancestors, content_type_id, children_modes=None):
+    """
+    Keys of all the counts including listings of ``content_type_id`` in a
+    category with ``ancestors``, only of ``children_modes`` if given.
+    """
+    from ella.core.managers import ListingHandler
+    Listing = get_model('core', 'listing')
+
+    handlers = set(Listing.objects.get_listing_handler(s) for s in core_settings.LISTING_HANDLERS)
+    keys = []
+    for ancestor_id, depth in ancestors:
+        for handler in handlers:
+            for children in ListingHandler.get_children_modes(depth):
+                if children_modes is not None and children not in children_modes:
+                    continue
+                keys.append(_get_key(handler, ancestor_id, children))
+                keys.append(_get_key(handler, ancestor_id, children, content_type_id))
+    return keys
+
+
+def listings_changed(category_id, content_type_id, delta=0):
+    """
+    Account for ``delta`` listings of ``content_type_id`` added to (or removed
+    from if negative) ``category_id``.
+
+    Counts are dropped to be recounted on next use unless they are higher than
+    CACHE_LISTING_COUNT_APPROXIMATE, those are only adjusted by ``delta``.
+    Only counts of ``category_id``'s own listings (``ListingHandler.NONE``)
+    can be adjusted, the children modes count a publishable listed in
+    several categories once and are always dropped. ``delta`` of 0 means the
+    change is unknown and drops all the counts. Cached listings are
+    invalidated by moving the generations.
+    """
+    from ella.core.managers import ListingHandler
+
+    ancestors = get_ancestors(category_id)
+    bump_generations([a for a, depth in ancestors], content_type_id)
+
+    keys = get_keys(ancestors, content_type_id)
+    threshold = core_settings.CACHE_LISTING_COUNT_APPROXIMATE
+    if threshold is None or not delta:
+        utils.cache.delete_many(keys)
+        return
+
+    own_keys = get_keys([(category_id, 0)], content_type_id, children_modes=(ListingHandler.NONE, ))
+    stale = [k for k in keys if k not in own_keys]
+    for key, value in utils.cache.get_many(own_keys).iteritems():
+        if value <= threshold:
+            stale.append(key)
+            continue
+        try:
+            utils.cache.incr(key, delta)
+        except ValueError:
+            # expired in the meantime
+            pass
+    utils.cache.delete_many(stale)
+
+
+def category_moved(sender, category, old_ancestors, **kwargs):
+    """
+    Invalidate cached listings and counts after ``category`` moved in the
+    tree or changed its ``propagate_listings``, so that listings of its whole
+    subtree appear in different ancestors. ``old_ancestors`` are (ancestor_id,
+    depth) pairs of ``category`` before the change.
+    """
+    Listing = get_model('core', 'listing')
+    ancestors = set(old_ancestors).union(get_ancestors(category.pk))
+    # listings of the category itself and below it stay the same
+    ancestors = [(a, depth) for a, depth in ancestors if depth > 0]
+    content_type_ids = Listing.objects.filter(category__ancestor_set__ancestor=category).values_list(
+        'publishable__content_type', flat=True).distinct()
+    content_type_ids = list(content_type_ids)
+    if not ancestors or not content_type_ids:
+        return
+
+    token = uuid4().hex
+    keys = _get_generation_keys([a for a, depth in ancestors])
+    utils.cache.set_many(dict((k, token) for k in keys), core_settings.CACHE_TIMEOUT_LONG)
+
+    keys = set()
+    for ct_id in content_type_ids:
+        keys.update(get_keys(ancestors, ct_id))
+    utils.cache.delete_many(list(keys))
+
+
+def listing_pre_save(sender, instance, **kwargs):
+    if instance.pk:
+        instance._old_count_category_id = sender.objects.filter(pk=instance.pk).values_list('category_id', flat=True)[0]
+
+
+def listing_post_save(sender, instance, created, **kwargs):
+    publishable = instance.publishable
+    if created:
+        if publishable.published:
+            listings_changed(instance.category_id, publishable.content_type_id, 1)
+        return
+
+    listings_changed(instance.category_id, publishable.content_type_id)
+    old_category_id = getattr(instance, '_old_count_category_id', instance.category_id)
+    if old_category_id != instance.category_id:
+        listings_changed(old_category_id, publishable.content_type_id)
+
+
+def listing_pre_delete(sender, instance, **kwargs):
+    # publishable might be gone by the time of post_delete
+    instance._count_publishable = instance.publishable
+
+
+def listing_post_delete(sender, instance, **kwargs):
+    publishable = instance._count_publishable
+    if publishable.published:
+        listings_changed(instance.category_id, publishable.content_type_id, -1)
+
+
+def publishable_published(publishable, **kwargs):
+    for category_id in publishable.listing_set.values_list('category_id', flat=True):
+        listings_changed(category_id, publishable.content_type_id, 1)
+
+
+def publishable_unpublished(publishable, **kwargs):
+    for category_id in publishable.listing_set.values_list('category_id', flat=True):
+        listings_changed(category_id, publishable.content_type_id, -1)
+
+
+def connect_signals():
+    from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+    from ella.core.signals import content_published, content_unpublished, category_moved as category_moved_signal
+    from ella.core.models import Listing
+
+    category_moved_signal.connect(category_moved, dispatch_uid='ella.core.cache.listings')
+    content_published.connect(publishable_published, dispatch_uid='ella.core.cache.listings')
+    content_unpublished.connect(publishable_unpublished, dispatch_uid='ella.core.cache.listings')
+
+    pre_save.connect(listing_pre_save, sender=Listing, dispatch_uid='ella.core.cache.listings')
+    post_save.connect(listing_post_save, sender=Listing, dispatch_uid='ella.core.cache.listings')
+
+    pre_delete.connect(listing_pre_delete, sender=Listing, dispatch_uid='ella.core.cache.listings')
+    post_delete.connect(listing_post_delete, sender=Listing, dispatch_uid='ella.core.cache.listings')
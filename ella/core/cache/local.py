@@ -0,0 +1,114 @@
+"""
+Process-local cache tiers that can sit in front of the shared Django cache.
+"""
+import time
+from threading import Lock, local
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    # python 2.6
+    from django.utils.datastructures import SortedDict as OrderedDict
+
+
+class LocalCache(object):
+    """
+    Bounded in-process cache with LRU eviction and a TTL on every entry.
+
+    Values are kept for at most ``timeout`` seconds so that invalidations done
+    in other processes show up within that window. Cache with ``size`` of 0 is
+    disabled and never stores anything.
+    """
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        if not self.size:
+            return default
+
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                return default
+
+            if expires < time.time():
+                return default
+
+            # re-insert to mark the key as most recently used
+            self._data[key] = (expires, value)
+            return value
+
+    def get_many(self, keys):
+        out = {}
+        for k in keys:
+            value = self.get(k)
+            if value is not None:
+                out[k] = value
+        return out
+
+    def set(self, key, value, timeout=None):
+        if not self.size:
+            return
+
+        if timeout is None:
+            timeout = self.timeout
+
+        with self._lock:
+            self._data.pop(key, None)
+            while len(self._data) >= self.size:
+                # evict the least recently used entry
+                self._data.pop(iter(self._data).next())
+            self._data[key] = (time.time() + timeout, value)
+
+    def set_many(self, data, timeout=None):
+        for k, v in data.iteritems():
+            self.set(k, v, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class IdentityMap(local):
+    """
+    Objects already retrieved during the current request, so that every object
+    is only fetched and unpickled once. Inactive (storing nothing) unless
+    turned on for the request by ``ella.core.middleware.IdentityMapMiddleware``.
+    """
+    def __init__(self):
+        self.objects = None
+
+    def activate(self):
+        self.objects = {}
+
+    def deactivate(self):
+        self.objects = None
+
+    def get(self, key):
+        if self.objects is None:
+            return None
+        return self.objects.get(key)
+
+    def get_many(self, keys):
+        if self.objects is None:
+            return {}
+        return dict((k, self.objects[k]) for k in keys if k in self.objects)
+
+    def set(self, key, value):
+        if self.objects is not None:
+            self.objects[key] = value
+
+    def delete(self, key):
+        if self.objects is not None:
+            self.objects.pop(key, None)
@@ -8,8 +8,10 @@ from itertools import chain
 from django.conf import settings
 from django.db.models.loading import get_model
 
-from ella.core.cache.utils import get_cached_objects, SKIP
-from ella.core.managers import ListingHandler
+from ella.core.cache import utils
+from ella.core.cache.utils import get_cached_objects, NONE
+from ella.core.cache.listings import get_count
+from ella.core.managers import ListingHandler, get_excluded
 from ella.core.conf import core_settings
 from ella.utils.timezone import now, to_timestamp, from_timestamp
 
@@ -28,113 +30,340 @@ if hasattr(settings, 'LISTINGS_REDIS'):
 
 
 
+# Keys of the unions and intersections computed from a listing key are
+# recorded in its derived set, see DERIVED_KEY.
+#
+# Every key a script touches directly is passed in KEYS, the unions and
+# intersections deleted through a derived set are only known to redis. All
+# the listing keys have to live on one server, Redis Cluster is not
+# supported.
+DERIVED_KEY = '%s:derived'
+
+# Lua function deleting the unions and intersections recorded in a derived set
+# and the set itself, shared by the scripts changing listing keys.
+DROP_DERIVED_FUNCTION = """
+local function drop_derived(derived_key)
+    local derived = redis.call('SMEMBERS', derived_key)
+    if #derived > 0 then
+        redis.call('DEL', derived_key, unpack(derived))
+    end
+end
+"""
+
+# Reads listings of RedisListingHandler in one round trip.
+#
+# KEYS: listing key[, union key, intersection key, N content type keys,
+#       derived set of the listing key, N derived sets of the content type keys]
+# ARGV: timeout of the union and intersection keys, min and max score,
+#       offset, count, score and member of the cursor, members to exclude
+#
+# Returns number of members in the score range followed by (member, score)
+# pairs of the page. Unions and intersections are recorded in the derived
+# set of every key they were computed from, WRITE_LISTINGS_SCRIPT drops them
+# when it changes the key.
+READ_LISTINGS_SCRIPT = """
+local key = KEYS[1]
+local timeout = ARGV[1]
+local min, max = ARGV[2], ARGV[3]
+local offset, count = tonumber(ARGV[4]), tonumber(ARGV[5])
+local after_score, after_member = ARGV[6], ARGV[7]
+
+local function store(dest, command, keys, derived_keys)
+    -- reuse results of other requests until any of the sources changes
+    if redis.call('EXISTS', dest) == 0 then
+        local args = {dest, #keys, unpack(keys)}
+        args[#args + 1] = 'AGGREGATE'
+        args[#args + 1] = 'MAX'
+        redis.call(command, unpack(args))
+        redis.call('EXPIRE', dest, timeout)
+        for _, derived_key in ipairs(derived_keys) do
+            redis.call('SADD', derived_key, dest)
+            redis.call('EXPIRE', derived_key, timeout)
+        end
+    end
+end
+
+if #KEYS > 1 then
+    local n = (#KEYS - 4) / 2
+    local ct_keys, derived_keys = {}, {}
+    for i = 4, 3 + n do
+        ct_keys[#ct_keys + 1] = KEYS[i]
+        derived_keys[#derived_keys + 1] = KEYS[i + n + 1]
+    end
+    local ct_key = ct_keys[1]
+    if n > 1 then
+        ct_key = KEYS[2]
+        store(ct_key, 'ZUNIONSTORE', ct_keys, derived_keys)
+    end
+    derived_keys[#derived_keys + 1] = KEYS[4 + n]
+    store(KEYS[3], 'ZINTERSTORE', {ct_key, key}, derived_keys)
+    key = KEYS[3]
+end
+
+local function in_range(score)
+    score = tonumber(score)
+    return (min == '-inf' or score >= tonumber(min)) and (max == '+inf' or score <= tonumber(max))
+end
+
+local total = redis.call('ZCOUNT', key, min, max)
+
+-- excluded members in the listing and their positions
+local exclude, ranks = {}, {}
+for i = 8, #ARGV do
+    local member = ARGV[i]
+    local score = redis.call('ZSCORE', key, member)
+    if score and in_range(score) and not exclude[member] then
+        exclude[member] = true
+        ranks[#ranks + 1] = redis.call('ZREVRANK', key, member)
+        total = total - 1
+    end
+end
+
+local out = {total}
+local function add(values, limit)
+    for i = 1, #values, 2 do
+        if #out > limit * 2 then
+            break
+        end
+        if not exclude[values[i]] then
+            out[#out + 1] = values[i]
+            out[#out + 1] = values[i + 1]
+        end
+    end
+end
+
+if count == 0 then
+    return out
+end
+
+if after_score ~= '' then
+    -- members sharing the cursor's score come in reverse lexicographical
+    -- order, only those after the cursor's member are wanted
+    local ties = redis.call('ZREVRANGEBYSCORE', key, after_score, after_score, 'WITHSCORES')
+    local after = {}
+    for i = 1, #ties, 2 do
+        if ties[i] < after_member then
+            after[#after + 1] = ties[i]
+            after[#after + 1] = ties[i + 1]
+        end
+    end
+    add(after, count)
+    add(redis.call('ZREVRANGEBYSCORE', key, '(' .. after_score, min, 'WITHSCORES', 'LIMIT', 0, count + #ranks), count)
+    return out
+end
+
+if #ranks > 0 then
+    -- move the page past the excluded members that come before it
+    local above = 0
+    if max ~= '+inf' then
+        above = redis.call('ZCOUNT', key, '(' .. max, '+inf')
+    end
+    table.sort(ranks)
+    for _, rank in ipairs(ranks) do
+        if rank - above > offset then
+            break
+        end
+        offset = offset + 1
+    end
+end
+-- the rest of them can be on the page, fetch enough to fill it without them
+add(redis.call('ZREVRANGEBYSCORE', key, max, min, 'WITHSCORES', 'LIMIT', offset, count + #ranks), count)
+return out
+"""
+
+# Changes one member of several listings at once.
+#
+# KEYS: N listings to change followed by their N derived sets
+# ARGV: member followed by a change for every key - score to set, score
+#       prefixed with + to add to it, or an empty string to remove the member
+#
+# Unions and intersections READ_LISTINGS_SCRIPT computed from the keys are
+# deleted.
+WRITE_LISTINGS_SCRIPT = DROP_DERIVED_FUNCTION + """
+local member = ARGV[1]
+local n = #KEYS / 2
+for i = 1, n do
+    local key = KEYS[i]
+    drop_derived(KEYS[n + i])
+
+    local change = ARGV[i + 1]
+    if change == '' then
+        redis.call('ZREM', key, member)
+    elseif string.sub(change, 1, 1) == '+' then
+        redis.call('ZINCRBY', key, string.sub(change, 2), member)
+    else
+        redis.call('ZADD', key, change, member)
+    end
+end
+"""
+
+# Deletes unions and intersections of listing keys changed by other means
+# than WRITE_LISTINGS_SCRIPT.
+#
+# KEYS: derived sets of the changed listing keys
+DROP_DERIVED_SCRIPT = DROP_DERIVED_FUNCTION + """
+for _, derived_key in ipairs(KEYS) do
+    drop_derived(derived_key)
+end
+"""
+
+_scripts = {}
+
+
+def _get_script(name, script):
+    " Return ``script`` registered with the client, registration loads it to redis. "
+    if name not in _scripts:
+        _scripts[name] = client.register_script(script)
+    return _scripts[name]
+
+
+def get_read_listings_script():
+    return _get_script('read_listings', READ_LISTINGS_SCRIPT)
+
+
+def get_write_listings_script():
+    return _get_script('write_listings', WRITE_LISTINGS_SCRIPT)
+
+
+def get_drop_derived_script():
+    return _get_script('drop_derived', DROP_DERIVED_SCRIPT)
+
+
+FANOUT_KEY = 'core.listing_fanout:%s'
+
+
+def get_fanout(category):
+    """
+    Return (parent id, ancestor ids) - categories the listings in
+    ``category`` propagate to as children and as descendants, respecting
+    ``propagate_listings`` of the categories on the way up.
+
+    The result is cached until ``category`` or any of its ancestors changes.
+    """
+    key = FANOUT_KEY % category.id
+    fanout = utils.cache.get(key)
+    if fanout is None:
+        parent_id, ancestor_ids = None, []
+        if category.app_data.ella.propagate_listings and category.tree_parent_id:
+            parent_id = category.tree_parent_id
+            while category.tree_parent_id:
+                category = category.tree_parent
+                ancestor_ids.append(category.id)
+                if not category.app_data.ella.propagate_listings:
+                    break
+        fanout = (parent_id, ancestor_ids)
+        utils.cache.set(key, fanout, core_settings.CACHE_TIMEOUT_LONG)
+    return fanout
+
+
+def invalidate_fanout(sender, instance, **kwargs):
+    " Forget fan-out of ``instance`` and all its descendants, listings propagate through them. "
+    CategoryClosure = get_model('core', 'categoryclosure')
+    ids = set(CategoryClosure.objects.filter(ancestor=instance).values_list('descendant', flat=True))
+    ids.add(instance.pk)
+    utils.cache.delete_many([FANOUT_KEY % pk for pk in ids])
+
+
 def ListingHandlerClass():
     return get_model('core', 'Listing').objects.get_listing_handler(core_settings.REDIS_LISTING_HANDLER)
 
 
 def publishable_published(publishable, **kwargs):
-    pipe = client.pipeline()
+    # every change concerns the same member, apply them in one script call
+    handler = ListingHandlerClass()
     listings = publishable.listing_set.all()
-
+    changes = []
     for l in listings:
-        ListingHandlerClass().add_publishable(
-            l.category,
-            publishable,
-            publish_from=l.publish_from,
-            pipe=pipe,
-            commit=False
-        )
+        changes.extend(handler.get_add_changes(l.category, publishable, publish_from=l.publish_from))
 
     if len(listings) > 0:
-        AuthorListingHandler.add_publishable(publishable, pipe=pipe, commit=False)
+        changes.extend(AuthorListingHandler.get_add_changes(publishable))
 
-    pipe.execute()
+    handler.update(publishable, changes)
 
 
 def publishable_unpublished(publishable, **kwargs):
-    pipe = client.pipeline()
+    handler = ListingHandlerClass()
+    changes = []
     for l in publishable.listing_set.all():
-        ListingHandlerClass().remove_publishable(
-            l.category,
-            publishable,
-            pipe=pipe,
-            commit=False
-        )
+        changes.extend(handler.get_remove_changes(l.category, publishable))
 
-    AuthorListingHandler.remove_publishable(publishable, pipe=pipe, commit=False)
-    pipe.execute()
+    changes.extend(AuthorListingHandler.get_remove_changes(publishable))
+    handler.update(publishable, changes)
 
 
 def listing_pre_delete(sender, instance, **kwargs):
-    # prepare redis pipe for deletion...
-    instance.__pipe = ListingHandlerClass().remove_publishable(
+    # prepare redis changes for deletion...
+    instance.__changes = ListingHandlerClass().get_remove_changes(
         instance.category,
-        instance.publishable,
-        commit=False
+        instance.publishable
     )
 
 
 def listing_post_delete(sender, instance, **kwargs):
-    # but only delete it if the model delete went through
-    pipe = instance.__pipe
+    # but only apply them if the model delete went through
+    handler = ListingHandlerClass()
+    changes = instance.__dict__.pop('__changes')
     listings = instance.publishable.listing_set.all()
 
     if instance.publishable.published:
         for l in listings:
-            ListingHandlerClass().add_publishable(
-                l.category,
-                instance.publishable,
-                publish_from=l.publish_from,
-                pipe=pipe,
-                commit=False
-            )
+            changes.extend(handler.get_add_changes(l.category, instance.publishable, publish_from=l.publish_from))
 
     # If this is the last Listing that is being deleted, delete from author too.
     if not listings.exists():
-        AuthorListingHandler.remove_publishable(instance.publishable, pipe=pipe,
-                                                commit=False)
-    pipe.execute()
+        changes.extend(AuthorListingHandler.get_remove_changes(instance.publishable))
+    handler.update(instance.publishable, changes)
 
 
 def listing_pre_save(sender, instance, **kwargs):
     if instance.pk:
         # prepare deletion of stale data
         old_listing = instance.__class__.objects.get(pk=instance.pk)
-        instance.__pipe = ListingHandlerClass().remove_publishable(
-            old_listing.category,
+        instance.__old = (
             old_listing.publishable,
-            commit=False
+            ListingHandlerClass().get_remove_changes(old_listing.category, old_listing.publishable)
         )
 
 
 def listing_post_save(sender, instance, **kwargs):
-    pipe = getattr(instance, '__pipe', client.pipeline())
+    handler = ListingHandlerClass()
+    publishable = instance.publishable
+    changes = []
+
+    old_publishable, old_changes = instance.__dict__.pop('__old', (None, []))
+    if old_publishable is not None and old_publishable.pk != publishable.pk:
+        # the listing now belongs to another publishable, a different member
+        handler.update(old_publishable, old_changes)
+    else:
+        changes.extend(old_changes)
 
-    if instance.publishable.published:
-        ListingHandlerClass().add_publishable(
-            instance.category,
-            instance.publishable,
-            publish_from=instance.publish_from,
-            pipe=pipe,
-            commit=False
-        )
+    if publishable.published:
+        changes.extend(handler.get_add_changes(instance.category, publishable, publish_from=instance.publish_from))
 
         # This is the first listing being added.
-        if instance.publishable.listing_set.count() == 1:
-            AuthorListingHandler.add_publishable(instance.publishable, pipe=pipe,
-                                                 commit=False)
+        if publishable.listing_set.count() == 1:
+            changes.extend(AuthorListingHandler.get_add_changes(publishable))
 
-        pipe.execute()
+    # removal of the old listing and the new one in a single script call, the
+    # removal is applied even if the publishable is not published
+    handler.update(publishable, changes)
 
 
 def update_authors(sender, action, instance, reverse, model, pk_set, **kwargs):
     if action == 'pre_remove':
-        instance.__pipe = AuthorListingHandler.remove_publishable(instance, commit=False)
-    elif action in ('post_remove', 'post_add') and instance.published and instance.listing_set.exists():
-        AuthorListingHandler.add_publishable(instance, pipe=getattr(instance, '__pipe', None))
+        instance.__changes = AuthorListingHandler.get_remove_changes(instance)
+    elif action in ('post_remove', 'post_add'):
+        changes = instance.__dict__.pop('__changes', [])
+        if instance.published and instance.listing_set.exists():
+            changes.extend(AuthorListingHandler.get_add_changes(instance))
+        AuthorListingHandler.update(instance, changes)
 
 class RedisListingHandler(ListingHandler):
     PREFIX = 'listing'
+    # seconds to keep unions and intersections of keys for content types,
+    # they are deleted sooner when any of their keys changes
+    TEMP_KEY_TIMEOUT = 60
 
     @classmethod
     def get_value(cls, publishable):
@@ -150,30 +379,35 @@ class RedisListingHandler(ListingHandler):
         # content_type
         keys.append(':'.join((cls.PREFIX, 'ct', str(publishable.content_type_id))))
 
-        # category shouldn't be propagated
-        if not category.app_data.ella.propagate_listings:
-            return keys
+        parent_id, ancestor_ids = get_fanout(category)
 
         # children
-        if category.tree_parent_id:
-            keys.append(':'.join((cls.PREFIX, 'c', str(category.tree_parent_id))))
+        if parent_id:
+            keys.append(':'.join((cls.PREFIX, 'c', str(parent_id))))
 
         # all children
-        while category.tree_parent_id:
-            category = category.tree_parent
-            keys.append(':'.join((cls.PREFIX, 'd', str(category.id))))
-            if not category.app_data.ella.propagate_listings:
-                break
+        keys.extend(':'.join((cls.PREFIX, 'd', str(pk))) for pk in ancestor_ids)
 
         return keys
 
     @classmethod
-    def add_publishable(cls, category, publishable, score, pipe=None, commit=True):
+    def update(cls, publishable, changes, pipe=None, commit=True):
+        """
+        Apply ``changes`` - (key, change) pairs as understood by
+        WRITE_LISTINGS_SCRIPT - to ``publishable``'s listings at once.
+        """
         if pipe is None:
             pipe = client.pipeline()
 
-        for k in cls.get_keys(category, publishable):
-            pipe.zadd(k, cls.get_value(publishable), score)
+        if changes:
+            # repr keeps all the digits of float scores, str rounds them to 12
+            args = [repr(change) if isinstance(change, float) else str(change) for k, change in changes]
+            keys = [k for k, change in changes]
+            get_write_listings_script()(
+                keys=keys + [DERIVED_KEY % k for k in keys],
+                args=[cls.get_value(publishable)] + args,
+                client=pipe
+            )
 
         if commit:
             pipe.execute()
@@ -181,39 +415,37 @@ class RedisListingHandler(ListingHandler):
             return pipe
 
     @classmethod
-    def incr_score(cls, category, publishable, incr_by=1, pipe=None, commit=True):
-        if pipe is None:
-            pipe = client.pipeline()
+    def get_add_changes(cls, category, publishable, score):
+        " Changes for ``update`` placing ``publishable`` in ``category``. "
+        return [(k, score) for k in cls.get_keys(category, publishable)]
 
-        v = cls.get_value(publishable)
-        for k in cls.get_keys(category, publishable):
-            pipe.zincrby(k, v, incr_by)
-
-        if commit:
-            pipe.execute()
-        else:
-            return pipe
+    @classmethod
+    def get_remove_changes(cls, category, publishable):
+        " Changes for ``update`` removing ``publishable`` from ``category``. "
+        return [(k, '') for k in cls.get_keys(category, publishable)]
 
     @classmethod
-    def remove_publishable(cls, category, publishable, pipe=None, commit=True):
-        if pipe is None:
-            pipe = client.pipeline()
+    def add_publishable(cls, category, publishable, score, pipe=None, commit=True):
+        changes = cls.get_add_changes(category, publishable, score)
+        return cls.update(publishable, changes, pipe=pipe, commit=commit)
 
-        for k in cls.get_keys(category, publishable):
-            pipe.zrem(k, cls.get_value(publishable))
+    @classmethod
+    def incr_score(cls, category, publishable, incr_by=1, pipe=None, commit=True):
+        changes = [(k, '+%s' % incr_by) for k in cls.get_keys(category, publishable)]
+        return cls.update(publishable, changes, pipe=pipe, commit=commit)
 
-        if commit:
-            pipe.execute()
-        else:
-            return pipe
+    @classmethod
+    def remove_publishable(cls, category, publishable, pipe=None, commit=True):
+        changes = cls.get_remove_changes(category, publishable)
+        return cls.update(publishable, changes, pipe=pipe, commit=commit)
 
     def count(self):
-        key, pipe = self._get_key()
-        if pipe is None:
-            pipe = client.pipeline()
-        pipe = pipe.zcard(key)
-        results = pipe.execute()
-        return results[-1]
+        return get_count(self, self._count_listings)
+
+    def _count_listings(self):
+        if not hasattr(self, '_count'):
+            self._read_result(self._read_listings())
+        return self._count
 
     def _get_listing(self, publishable, score):
         Listing = get_model('core', 'listing')
@@ -227,50 +459,82 @@ class RedisListingHandler(ListingHandler):
             raise NotImplemented()
         return min_score, max_score
 
-    def get_listings(self, offset=0, count=10):
-        key, pipe = self._get_key()
-        if pipe is None:
-            pipe = client.pipeline()
-
-        # get the score range based on the date range
+    def _read_listings(self, offset=0, count=0, cursor=('', ''), pipe=None):
+        """
+        Run READ_LISTINGS_SCRIPT for this handler, on ``pipe`` if given.
+        ``cursor`` is (score, member) of the last listing already read.
+        """
         min_score, max_score = self._get_score_limits()
+        args = [
+            self.TEMP_KEY_TIMEOUT,
+            '-inf' if min_score is None else min_score,
+            '+inf' if max_score is None else max_score,
+            offset, count,
+        ]
+        args.extend(cursor)
+        args.extend(self.get_value(p) for p in get_excluded(self.exclude))
+        return get_read_listings_script()(keys=self._get_keys(), args=args, client=pipe)
+
+    def _read_result(self, result):
+        " Remember the number of listings from script's ``result`` and return (member, score) pairs. "
+        self._count = result[0]
+        return [(value, float(score)) for value, score in zip(result[1::2], result[2::2])]
 
-        # get all the relevant records
-        if min_score or max_score:
-            pipe = pipe.zrevrangebyscore(key,
-                max_score, min_score,
-                start=offset, num=count,
-                withscores=True
-            )
-        else:
-            pipe = pipe.zrevrange(key,
-                start=offset, end=offset + count - 1,
-                withscores=True
-            )
+    def get_listings(self, offset=0, count=10):
+        return self._get_listings_for(self._read_result(self._read_listings(offset, count)))
+
+    @classmethod
+    def get_listings_many(cls, requests):
+        # read all the listings in one pipeline
+        pipe = client.pipeline()
+        for handler, offset, count in requests:
+            handler._read_listings(offset, count, pipe=pipe)
         results = pipe.execute()
 
-        # get the data from redis into proper format
-        data = []
+        return cls._get_listings_for_many([(handler, handler._read_result(result)) for (handler, _, _), result in zip(requests, results)])
+
+    def _get_listings_for(self, values):
+        " Turn (member, score) pairs into Listing objects. "
+        return self._get_listings_for_many([(self, values)])[0]
+
+    @classmethod
+    def _get_listings_for_many(cls, items):
+        " Same as ``_get_listings_for`` for every (handler, values), publishables are loaded at once. "
         ids = []
-        for value, score in results[-1]:
-            ct_id, pk = value.split(':')
-            ids.append((int(ct_id), int(pk)))
-            data.append(score)
+        for handler, values in items:
+            for value, score in values:
+                ct_id, pk = value.split(':')
+                ids.append((int(ct_id), int(pk)))
 
         # and retrieve publishables from cache
-        publishables = get_cached_objects(ids, missing=SKIP)
+        publishables = iter(get_cached_objects(ids, missing=NONE))
 
         # create mock Listing objects to return
-        return map(lambda (p, score): self._get_listing(p, score), zip(publishables, data))
-
-    def _union(self, union_keys, pipe):
-        if len(union_keys) > 1:
-            result_key = '%s:zus:%s' % (self.PREFIX, md5(','.join(union_keys)).hexdigest())
-            pipe.zunionstore(result_key, union_keys, 'MAX')
-            pipe.expire(result_key, 60)
-            return result_key
-        else:
-            return union_keys[0]
+        out = []
+        for handler, values in items:
+            listings = []
+            for value, score in values:
+                p = publishables.next()
+                if p is None:
+                    continue
+                listing = handler._get_listing(p, score)
+                # remember the position for get_cursor
+                listing._score = score
+                listings.append(listing)
+            out.append(listings)
+        return out
+
+    def get_listings_after(self, cursor=None, count=10):
+        if cursor is None:
+            return self.get_listings(0, count)
+
+        score, member = cursor.split(':', 1)
+        score = repr(float(score))
+
+        return self._get_listings_for(self._read_result(self._read_listings(count=count, cursor=(score, member))))
+
+    def get_cursor(self, listing):
+        return '%s:%s' % (repr(listing._score), self.get_value(listing.publishable))
 
     def _get_base_key(self):
         key_parts = [self.PREFIX]
@@ -285,47 +549,30 @@ class RedisListingHandler(ListingHandler):
         return key
 
 
-    def _get_key(self):
-        pipe = None
-        if not hasattr(self, '_key'):
-            key = self._get_base_key()
-            # do everything in one pipeline
-            pipe = client.pipeline()
-
-            # store all the key sets we will want to ZUNIONSTORE
-            ct_key = None
-            if self.content_types:
-                # get the union of all content_type listings
-                ct_key = self._union([':'.join((self.PREFIX, 'ct', str(ct.pk))) for ct in self.content_types], pipe)
-
-
-            # do the intersect if required and output a single key
-            if ct_key:
-                inter_key = '%s:zis:%s' % (self.PREFIX, md5(','.join((ct_key, key))).hexdigest())
-                pipe.zinterstore(inter_key, (ct_key, key), 'MAX')
-                pipe.expire(inter_key, 60)
-                key = inter_key
-
-            if self.exclude:
-                v = '%d:%d' % (self.exclude.content_type_id, self.exclude.id)
-
-                # we are using some existing key, copy it before removing stuff
-                exclude_key = '%s:exclude:%s' % (key, v)
-                pipe.zunionstore(exclude_key, (key,))
-                pipe.zrem(exclude_key, v)
-                pipe.expire(exclude_key, 60)
-                key = exclude_key
+    def _get_keys(self):
+        " Keys for READ_LISTINGS_SCRIPT. "
+        key = self._get_base_key()
+        if not self.content_types:
+            return [key]
 
-            self._key = key
-        return self._key, pipe
+        ct_keys = sorted(':'.join((self.PREFIX, 'ct', str(ct.pk))) for ct in self.content_types)
+        union_key = '%s:zus:%s' % (self.PREFIX, md5(','.join(ct_keys)).hexdigest())
+        ct_key = union_key if len(ct_keys) > 1 else ct_keys[0]
+        inter_key = '%s:zis:%s' % (self.PREFIX, md5(','.join((ct_key, key))).hexdigest())
+        return [key, union_key, inter_key] + ct_keys + [DERIVED_KEY % k for k in [key] + ct_keys]
 
 
 class TimeBasedListingHandler(RedisListingHandler):
     @classmethod
-    def add_publishable(cls, category, publishable, score=None, publish_from=None, pipe=None, commit=True):
+    def get_add_changes(cls, category, publishable, score=None, publish_from=None):
         if score is None:
             score = repr(to_timestamp(publish_from or now()))
-        return super(TimeBasedListingHandler, cls).add_publishable(category, publishable, score, pipe=pipe, commit=commit)
+        return super(TimeBasedListingHandler, cls).get_add_changes(category, publishable, score)
+
+    @classmethod
+    def add_publishable(cls, category, publishable, score=None, publish_from=None, pipe=None, commit=True):
+        changes = cls.get_add_changes(category, publishable, score, publish_from)
+        return cls.update(publishable, changes, pipe=pipe, commit=commit)
 
     def _get_score_limits(self):
         max_score = repr(to_timestamp(now()))
@@ -344,30 +591,21 @@ class TimeBasedListingHandler(RedisListingHandler):
 
 class AuthorListingHandler(TimeBasedListingHandler):
     @classmethod
-    def remove_publishable(cls, publishable, pipe=None, commit=True):
-        if pipe is None:
-            pipe = client.pipeline()
+    def get_remove_changes(cls, publishable):
+        return [(k, '') for k in cls.get_keys(publishable)]
 
-        for k in cls.get_keys(publishable):
-            pipe.zrem(k, cls.get_value(publishable))
+    @classmethod
+    def get_add_changes(cls, publishable):
+        score = repr(to_timestamp(publishable.publish_from))
+        return [(k, score) for k in cls.get_keys(publishable)]
 
-        if commit:
-            pipe.execute()
-        else:
-            return pipe
+    @classmethod
+    def remove_publishable(cls, publishable, pipe=None, commit=True):
+        return cls.update(publishable, cls.get_remove_changes(publishable), pipe=pipe, commit=commit)
 
     @classmethod
     def add_publishable(cls, publishable, pipe=None, commit=True):
-        if pipe is None:
-            pipe = client.pipeline()
-
-        for k in cls.get_keys(publishable):
-            pipe.zadd(k, cls.get_value(publishable), repr(to_timestamp(publishable.publish_from)))
-
-        if commit:
-            pipe.execute()
-        else:
-            return pipe
+        return cls.update(publishable, cls.get_add_changes(publishable), pipe=pipe, commit=commit)
 
     @classmethod
     def get_keys(cls, publishable):
@@ -409,21 +647,11 @@ class SlidingListingHandler(RedisListingHandler):
         return base_keys + day_keys
 
     @classmethod
-    def remove_publishable(cls, category, publishable, pipe=None, commit=True):
-        if pipe is None:
-            pipe = client.pipeline()
-
+    def get_remove_changes(cls, category, publishable):
         days, last_day = cls._get_days()
         base_keys = super(SlidingListingHandler, cls).get_keys(category, publishable)
 
-        v = cls.get_value(publishable)
-        for k in chain(base_keys, ('%s:%s' % (k, day) for k in base_keys for day in days)):
-            pipe.zrem(k, v)
-
-        if commit:
-            pipe.execute()
-        else:
-            return pipe
+        return [(k, '') for k in chain(base_keys, ('%s:%s' % (k, day) for k in base_keys for day in days))]
 
     @classmethod
     def _get_days(cls, today=None):
@@ -452,22 +680,31 @@ class SlidingListingHandler(RedisListingHandler):
                 # and remove them from the zset index
                 pipe.zremrangebyscore(cls.window_key_zset(), 0, '(' + last_day)
 
-        for k in client.smembers(cls.base_key_set()):
+        base_keys = client.smembers(cls.base_key_set())
+        for k in base_keys:
             # store the aggregate for all keys over WINDOW_SIZE days
             pipe.zunionstore(k, ['%s:%s' % (k, day) for day in days], aggregate='SUM')
 
+        if base_keys:
+            # unions and intersections computed from the old aggregates
+            get_drop_derived_script()(keys=[DERIVED_KEY % k for k in base_keys], client=pipe)
+
         pipe.execute()
 
 
 def connect_signals():
-    from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
+    from django.db.models.signals import pre_save, post_save, post_delete, pre_delete
     from ella.core.signals import content_published, content_unpublished
-    from ella.core.models import Listing, Publishable
+    from ella.core.models import Listing, Category
+
+    # cached fan-out of categories is used by any redis listing handler
+    post_save.connect(invalidate_fanout, sender=Category, dispatch_uid='ella.core.cache.redis.fanout')
+    pre_delete.connect(invalidate_fanout, sender=Category, dispatch_uid='ella.core.cache.redis.fanout')
 
     if not core_settings.USE_REDIS_FOR_LISTINGS:
         return
-    # when redis is availible, use it for authors
-    m2m_changed.connect(update_authors, sender=Publishable._meta.get_field('authors').rel.through)
+    # update_authors is called by ella.core.models.publishable.authors_changed
+    # together with the update of Publishable.author_ids
 
     content_published.connect(publishable_published)
     content_unpublished.connect(publishable_unpublished)
@@ -0,0 +1,186 @@
+"""
+Counters and timers describing how well the caches perform, grouped by
+content type or key prefix.
+
+Nothing is recorded unless CACHE_STATS_BACKEND points to a backend class,
+see ``LocalStatsBackend`` and ``RedisStatsBackend``.
+"""
+from __future__ import absolute_import
+
+import cPickle as pickle
+import random
+import time
+from threading import Lock, local
+
+from ella.core.conf import core_settings
+from ella.utils import import_module_member
+
+
+class LocalStatsBackend(object):
+    " Keep the numbers in the memory of the current process. "
+    def __init__(self):
+        self._data = {}
+        self._lock = Lock()
+
+    def incr_many(self, values):
+        with self._lock:
+            for group, name, value in values:
+                stats = self._data.setdefault(group, {})
+                stats[name] = stats.get(name, 0) + value
+
+    def flush(self):
+        pass
+
+    def get_stats(self):
+        with self._lock:
+            return dict((group, dict(stats)) for group, stats in self._data.iteritems())
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisStatsBackend(object):
+    """
+    Share the numbers of all processes in redis (LISTINGS_REDIS), one hash per group.
+
+    Counters are summed in memory of the current thread and sent in a single
+    pipeline by ``flush``, called by ``CacheStatsMiddleware`` at the end of
+    every request or after CACHE_STATS_FLUSH_SIZE increments.
+    """
+    GROUPS_KEY = 'ella.stats'
+    GROUP_KEY = 'ella.stats:%s'
+
+    def __init__(self):
+        from ella.core.cache.redis import client
+        self.client = client
+        self._local = local()
+
+    def _get_buffer(self):
+        if not hasattr(self._local, 'values'):
+            self._local.values = {}
+            self._local.count = 0
+        return self._local.values
+
+    def incr_many(self, values):
+        buffer = self._get_buffer()
+        for group, name, value in values:
+            buffer[(group, name)] = buffer.get((group, name), 0) + value
+        self._local.count += len(values)
+        if self._local.count >= core_settings.CACHE_STATS_FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        buffer = self._get_buffer()
+        if not buffer:
+            return
+        self._local.values, self._local.count = {}, 0
+
+        pipe = self.client.pipeline(transaction=False)
+        for group in set(group for group, name in buffer):
+            pipe.sadd(self.GROUPS_KEY, group)
+        for (group, name), value in buffer.iteritems():
+            if isinstance(value, float):
+                pipe.hincrbyfloat(self.GROUP_KEY % group, name, value)
+            else:
+                pipe.hincrby(self.GROUP_KEY % group, name, value)
+        pipe.execute()
+
+    def get_stats(self):
+        self.flush()
+        groups = list(self.client.smembers(self.GROUPS_KEY))
+        pipe = self.client.pipeline()
+        for group in groups:
+            pipe.hgetall(self.GROUP_KEY % group)
+
+        out = {}
+        for group, stats in zip(groups, pipe.execute()):
+            out[group] = dict((name, float(value)) for name, value in stats.iteritems())
+        return out
+
+    def reset(self):
+        self._local.values, self._local.count = {}, 0
+        groups = self.client.smembers(self.GROUPS_KEY)
+        self.client.delete(self.GROUPS_KEY, *[self.GROUP_KEY % g for g in groups])
+
+
+_backends = {}
+
+
+def get_backend():
+    " Return the configured backend instance or None if stats are turned off. "
+    path = core_settings.CACHE_STATS_BACKEND
+    if not path:
+        return None
+    try:
+        return _backends[path]
+    except KeyError:
+        _backends[path] = backend = import_module_member(path, 'cache stats backend')()
+        return backend
+
+
+def enabled():
+    return bool(core_settings.CACHE_STATS_BACKEND)
+
+
+def incr(group, name, value=1):
+    incr_many([(group, name, value)])
+
+
+def incr_many(values):
+    " Add ``value`` to counter ``name`` of ``group`` for every (group, name, value). "
+    backend = get_backend()
+    if backend is not None and values:
+        backend.incr_many(values)
+
+
+class timer(object):
+    " Context manager adding the seconds spent inside the block to counter ``name``. "
+    def __init__(self, group, name='time'):
+        self.group, self.name = group, name
+
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, *exc_info):
+        incr(self.group, self.name, time.time() - self.start)
+
+
+def sample_size(group, value):
+    """
+    For a CACHE_STATS_SAMPLE_RATE fraction of calls record the pickled size
+    of ``value`` as stored in the cache.
+    """
+    if enabled() and random.random() < core_settings.CACHE_STATS_SAMPLE_RATE:
+        incr_many([
+            (group, 'sampled', 1),
+            (group, 'sampled_bytes', len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))),
+        ])
+
+
+def flush():
+    " Send counters buffered by the backend of the current thread. "
+    backend = get_backend()
+    if backend is not None:
+        backend.flush()
+
+
+def get_stats():
+    """
+    Return collected numbers as {group: {name: value}}, average size of
+    sampled entries is added as ``avg_bytes``.
+    """
+    backend = get_backend()
+    if backend is None:
+        return {}
+    stats = backend.get_stats()
+    for values in stats.itervalues():
+        if values.get('sampled'):
+            values['avg_bytes'] = values['sampled_bytes'] / float(values['sampled'])
+    return stats
+
+
+def reset():
+    backend = get_backend()
+    if backend is not None:
+        backend.reset()
@@ -1,9 +1,15 @@
+from contextlib import contextmanager
+from copy import copy
 from hashlib import md5
+from threading import local
+from uuid import uuid4
 import logging
+import time
 
-from django.dispatch import receiver
+from django.db import router
 from django.db.models import ObjectDoesNotExist
-from django.db.models.loading import get_model
+from django.db.models.fields.files import FieldFile
+from django.db.models.loading import get_model, get_models
 from django.db.models.signals import post_save, post_delete
 from django.core.cache import cache
 from django.core.cache.backends.dummy import DummyCache
@@ -12,28 +18,173 @@ from django.contrib.contenttypes.models import ContentType
 from django.utils.encoding import smart_str
 from django.conf import settings
 
+from ella.core.cache import stats
+from ella.core.cache.local import LocalCache, IdentityMap
+from ella.core.conf import core_settings
+
 
 log = logging.getLogger('ella.core.cache.utils')
 
 KEY_PREFIX = 'ella.obj'
 CACHE_TIMEOUT = getattr(settings, 'CACHE_TIMEOUT', 10 * 60)
 
+# per-process tier in front of the shared cache, disabled unless configured
+local_cache = LocalCache(core_settings.CACHE_LOCAL_SIZE, core_settings.CACHE_LOCAL_TIMEOUT)
+
+# objects retrieved during current request, see IdentityMapMiddleware
+identity_map = IdentityMap()
+
+# how often to look for a value being recomputed by someone else
+LOCK_POLL_INTERVAL = 0.05
+# how long (in seconds) a caller has to refresh a stale cache_this value
+REFRESH_LOCK_TIMEOUT = 10
+
+# stored in place of objects that don't exist
+MISSING = 'ella.obj:MISSING'
+
+# first item of objects stored in the compact form, see _pack
+PACKED = 'ella.obj:P'
+# first item of values stored by cache_this, see _unwrap
+WRAPPED = 'ella.cache_this:W'
+# field layout fingerprints of models, see _get_fingerprint
+_fingerprints = {}
+
+# models whose changes invalidate cached objects, see register_cached_model
+cached_models = set()
+
+# invalidations collected by the current thread, see invalidation_batch
+_batch = local()
+
 
 def invalidate_cache(sender, instance, **kwargs):
     invalidate_cache_for_object(instance)
 
 
+def _get_model_label(model):
+    return '%s.%s' % (model._meta.app_label, model._meta.object_name.lower())
+
+
+def is_cached_model(model):
+    """
+    Whether changes of ``model`` should invalidate cached objects, see
+    CACHE_MODELS and CACHE_EXCLUDED_MODELS settings. Models also match when
+    any of their parents is listed.
+    """
+    labels = set(_get_model_label(m) for m in model.__mro__ if hasattr(m, '_meta'))
+    if core_settings.CACHE_MODELS is not None:
+        return bool(labels.intersection(core_settings.CACHE_MODELS))
+    return not labels.intersection(core_settings.CACHE_EXCLUDED_MODELS)
+
+
+def register_cached_model(model):
+    " Invalidate cached objects of ``model`` whenever an instance is saved or deleted. "
+    uid = 'ella.core.cache:%s' % _get_model_label(model)
+    post_save.connect(invalidate_cache, sender=model, dispatch_uid=uid)
+    post_delete.connect(invalidate_cache, sender=model, dispatch_uid=uid)
+    cached_models.add(model)
+
+
 def connect_invalidation_signals():
-    post_save.connect(invalidate_cache)
-    post_delete.connect(invalidate_cache)
+    for model in get_models():
+        if is_cached_model(model):
+            register_cached_model(model)
 
 
 def invalidate_cache_for_object(obj):
-    key = _get_key(KEY_PREFIX, ContentType.objects.get_for_model(obj), pk=obj.pk, version_key=True)
+    ct = ContentType.objects.get_for_model(obj)
+    if getattr(_batch, 'objects', None) is not None:
+        _batch.objects.add((ct, obj.pk))
+        _batch.keys.add(_get_key(KEY_PREFIX, ct, pk=obj.pk, versioned=False))
+        _batch.models.add(_get_key_model(ct).pk)
+    else:
+        _invalidate([(ct, obj.pk)])
+
+
+def _is_pending(model, key, pk_lookup):
+    """
+    Whether the object under ``key`` may have been changed in the open
+    invalidation batch of this thread. Such objects are read from the
+    database, their cached copies are outdated until the batch is flushed.
+    Lookups other than pk are affected by a change of any object of the model.
+    """
+    if getattr(_batch, 'objects', None) is None:
+        return False
+    if pk_lookup:
+        return key in _batch.keys
+    return _get_key_model(model).pk in _batch.models
+
+
+def _invalidate(objects):
+    """
+    Drop given (content_type, pk) pairs from the local tiers and move their
+    versions (and model versions if misses are cached) to a new unique
+    token, all in a single ``set_many``.
+    """
+    token = uuid4().hex
+    versions = {}
+    for ct, pk in objects:
+        key = _get_key(KEY_PREFIX, ct, pk=pk, versioned=False)
+        identity_map.delete(key)
+        local_cache.delete(key)
+        versions[key + ':VER'] = token
+
+        if core_settings.CACHE_MISSING_TIMEOUT:
+            # lookups other than pk remember misses until any object of the model changes
+            versions[_get_model_version_key(ct)] = token
+
+    if versions:
+        cache.set_many(versions, timeout=CACHE_TIMEOUT)
+        stats.incr_many([(_get_stats_group(ct), 'invalidations', 1) for ct, pk in objects])
+
+
+def start_invalidation_batch():
+    """
+    Collect invalidations done by this thread until the matching
+    ``flush_invalidation_batch``, batches can be nested.
+    """
+    if not getattr(_batch, 'depth', 0):
+        _batch.objects = set()
+        _batch.keys, _batch.models = set(), set()
+        _batch.depth = 0
+    _batch.depth += 1
+
+
+def flush_invalidation_batch():
+    """
+    Close the current batch. Leaving the outermost one invalidates every
+    collected object once, using a single cache call.
+    """
+    _batch.depth -= 1
+    if not _batch.depth:
+        objects, _batch.objects = _batch.objects, None
+        _batch.keys, _batch.models = set(), set()
+        _invalidate(objects)
+
+
+def reset_invalidation_batch():
+    """
+    Close all batches left open by this thread (a request whose response
+    never got back to InvalidationBatchMiddleware), invalidating the objects
+    they collected.
+    """
+    if getattr(_batch, 'depth', 0):
+        log.warning('Closing %d unfinished invalidation batch(es).', _batch.depth)
+        _batch.depth = 1
+        flush_invalidation_batch()
+
+
+@contextmanager
+def invalidation_batch():
+    """
+    Defer invalidation of objects changed inside the block until its end,
+    wrap bulk edits and imports (outside of their transaction) with it.
+    Objects changed inside the block are read from the database until then.
+    """
+    start_invalidation_batch()
     try:
-        cache.incr(key)
-    except ValueError:
-        cache.set(key, 1, timeout=CACHE_TIMEOUT)
+        yield
+    finally:
+        flush_invalidation_batch()
 
 
 def normalize_key(key):
@@ -42,10 +193,101 @@ def normalize_key(key):
     return md5(key).hexdigest()
 
 
-def _get_key(start, model, pk=None, version_key=False, **kwargs):
+def _get_key_model(model):
+    " All publishables share the keys of Publishable. "
     Publishable = get_model('core', 'publishable')
     if issubclass(model.model_class(), Publishable) and model.model_class() != Publishable:
-        model = ContentType.objects.get_for_model(Publishable)
+        return ContentType.objects.get_for_model(Publishable)
+    return model
+
+
+def _get_stats_group(ct):
+    return '%s:%s.%s' % (KEY_PREFIX, ct.app_label, ct.model)
+
+
+def _get_model_version_key(model):
+    return ':'.join((KEY_PREFIX, str(_get_key_model(model).pk), 'VER'))
+
+
+def _is_versioned(value):
+    """
+    Whether ``value`` is a (version, object) pair, anything else (bare
+    objects cached before versions were stored along) is treated as a miss.
+    """
+    return isinstance(value, tuple) and len(value) == 2
+
+
+def _is_missing(obj):
+    return isinstance(obj, basestring) and obj == MISSING
+
+
+def _get_model_fields(model):
+    " Fields in the order Model.__init__ expects positional arguments. "
+    opts = model._meta
+    return getattr(opts, 'concrete_fields', opts.fields)
+
+
+def _get_fingerprint(model):
+    """
+    Short hash of the model's field layout, packed objects of a different
+    layout (stored before a deploy that changed the model) are not used.
+    """
+    try:
+        return _fingerprints[model]
+    except KeyError:
+        layout = ','.join(f.attname for f in _get_model_fields(model))
+        _fingerprints[model] = fp = md5(_get_model_label(model) + ':' + layout).hexdigest()[:8]
+        return fp
+
+
+def _pack(obj):
+    """
+    Turn a model instance into its compact cache representation when
+    CACHE_COMPACT_OBJECTS is on: (PACKED, content type id, fingerprint,
+    field values).
+    """
+    if not core_settings.CACHE_COMPACT_OBJECTS or _is_missing(obj):
+        return obj
+    model = obj.__class__
+    return (
+        PACKED,
+        ContentType.objects.get_for_model(model).pk,
+        _get_fingerprint(model),
+        tuple(_get_field_value(obj, f) for f in _get_model_fields(model))
+    )
+
+
+def _get_field_value(obj, field):
+    value = getattr(obj, field.attname)
+    if isinstance(value, FieldFile):
+        # store just the file name, the descriptor wraps it again
+        return value.name
+    return value
+
+
+def _unpack(data):
+    """
+    Rebuild a model instance from the compact representation, return None
+    if it cannot be used. Anything else is returned untouched.
+    """
+    if not (isinstance(data, tuple) and data and data[0] == PACKED):
+        return data
+    _, ct_id, fingerprint, values = data
+    try:
+        model = ContentType.objects.get_for_id(ct_id).model_class()
+    except ContentType.DoesNotExist:
+        return None
+    if model is None or _get_fingerprint(model) != fingerprint:
+        return None
+
+    obj = model(*values)
+    obj._state.adding = False
+    obj._state.db = router.db_for_read(model)
+    return obj
+
+
+def _get_key(start, model, pk=None, version_key=False, versioned=True, **kwargs):
+    model = _get_key_model(model)
 
     if pk and not kwargs:
         key = ':'.join((
@@ -53,6 +295,8 @@ def _get_key(start, model, pk=None, version_key=False, **kwargs):
         ))
         if version_key:
             return key + ':VER'
+        if not versioned:
+            return key
         version = cache.get(key + ':VER') or '0'
         return '%s:%s' % (key, version)
 
@@ -67,6 +311,80 @@ def _get_key(start, model, pk=None, version_key=False, **kwargs):
     )))
 
 
+def _get_many_versioned(keys, stale=None, ver_keys=None):
+    """
+    Retrieve objects stored under unversioned object ``keys`` together with
+    their current versions using a single ``get_many``.
+
+    Returns a tuple of dicts (found objects, current versions). Objects stored
+    under an outdated version are left out of found objects, if ``stale`` dict
+    is given, they are put there instead. Found objects can be MISSING.
+
+    ``ver_keys`` default to the objects' own :VER keys. When given (model-wide
+    version for lookups other than pk) only MISSING entries are checked.
+    """
+    per_object = ver_keys is None
+    if per_object:
+        ver_keys = [k + ':VER' for k in keys]
+    data = cache.get_many(list(keys) + list(ver_keys))
+
+    found, versions = {}, {}
+    for k, vk in zip(keys, ver_keys):
+        versions[k] = version = data.get(vk) or 0
+        if _is_versioned(data.get(k)):
+            v, obj = data[k]
+            obj = _unpack(obj)
+            if obj is None:
+                continue
+            if v == version or not (per_object or _is_missing(obj)):
+                found[k] = obj
+            elif stale is not None and not _is_missing(obj):
+                stale[k] = obj
+    return found, versions
+
+
+def _acquire_lock(key):
+    """
+    Try to become the only one recomputing value for ``key``. Always succeeds
+    when stampede protection is turned off (CACHE_LOCK_TIMEOUT is 0).
+    """
+    if not core_settings.CACHE_LOCK_TIMEOUT:
+        return True
+    return cache.add(key + ':LOCK', 1, core_settings.CACHE_LOCK_TIMEOUT)
+
+
+def _release_lock(key):
+    if core_settings.CACHE_LOCK_TIMEOUT:
+        cache.delete(key + ':LOCK')
+
+
+def _wait_for(fetch):
+    """
+    Wait at most CACHE_LOCK_WAIT seconds for a value being recomputed by
+    someone else to appear. Returns None if it doesn't.
+    """
+    deadline = time.time() + core_settings.CACHE_LOCK_WAIT
+    while time.time() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = fetch()
+        if value is not None:
+            return value
+    return None
+
+
+def _fetch_object(model_ct, group, **kwargs):
+    " Get the object of ``model_ct`` matching ``kwargs`` from the database. "
+    # if we are looking for a publishable, fetch just the actual content
+    # type and then fetch the actual object
+    if model_ct.app_label == 'core' and model_ct.model == 'publishable':
+        actual_ct_id = model_ct.model_class()._default_manager.values('content_type_id').get(**kwargs)['content_type_id']
+        model_ct = ContentType.objects.get_for_id(actual_ct_id)
+
+    # fetch the actual object we want
+    with stats.timer(group, 'db_time'):
+        return model_ct.model_class()._default_manager.get(**kwargs)
+
+
 def get_cached_object(model, timeout=CACHE_TIMEOUT, **kwargs):
     """
     Return a cached object. If the object does not exist in the cache, create it.
@@ -84,26 +402,83 @@ def get_cached_object(model, timeout=CACHE_TIMEOUT, **kwargs):
     else:
         model_ct = model
 
-    key = _get_key(KEY_PREFIX, model_ct, **kwargs)
+    # objects are stored under unversioned keys, the version is part of the
+    # value so that both can be fetched in one round trip
+    key = _get_key(KEY_PREFIX, model_ct, versioned=False, **kwargs)
+    pk_lookup = kwargs.keys() == ['pk']
+    group = _get_stats_group(model_ct)
+
+    if _is_pending(model_ct, key, pk_lookup):
+        # changed earlier in the open invalidation batch, skip all the caches
+        stats.incr(group, 'db_fetches')
+        return _fetch_object(model_ct, group, **kwargs)
+
+    # object already retrieved during this request
+    obj = identity_map.get(key)
+    if obj is not None:
+        stats.incr(group, 'local_hits')
+        return obj
+
+    # the local tier ignores versions, staleness is bound by its TTL
+    obj = local_cache.get(key)
+    if obj is not None:
+        stats.incr(group, 'local_hits')
+        obj = copy(obj)
+        identity_map.set(key, obj)
+        return obj
+
+    if pk_lookup:
+        ver_keys = None
+    else:
+        ver_keys = [_get_model_version_key(model_ct)]
+    fetch = lambda stale=None: _get_many_versioned([key], stale, ver_keys)
+
+    stale = {}
+    found, versions = fetch(stale)
+    obj = found.get(key)
 
-    obj = cache.get(key)
+    locked = False
     if obj is None:
-        # if we are looking for a publishable, fetch just the actual content
-        # type and then fetch the actual object
-        if model_ct.app_label == 'core' and model_ct.model == 'publishable':
-            actual_ct_id = model_ct.model_class()._default_manager.values('content_type_id').get(**kwargs)['content_type_id']
-            model_ct = ContentType.objects.get_for_id(actual_ct_id)
-
-        # fetch the actual object we want
-        obj = model_ct.model_class()._default_manager.get(**kwargs)
-
-        # since 99% of lookups are done via PK make sure we set the cache for
-        # that lookup even if we retrieved it using a different one.
-        if 'pk' in kwargs:
-            cache.set(key, obj, timeout)
-        elif not isinstance(cache, DummyCache):
-            cache.set_many({key: obj, _get_key(KEY_PREFIX, model_ct, pk=obj.pk): obj}, timeout=timeout)
+        stats.incr(group, 'misses')
+        locked = _acquire_lock(key)
+        if not locked:
+            # somebody else is already fetching the object, use the outdated
+            # version if we have it or wait for theirs
+            obj = stale.get(key) or _wait_for(lambda: fetch()[0].get(key))
+    else:
+        stats.incr(group, 'hits')
 
+    if obj is None:
+        stats.incr(group, 'db_fetches')
+        try:
+            obj = _fetch_object(model_ct, group, **kwargs)
+
+            # since 99% of lookups are done via PK make sure we set the cache for
+            # that lookup even if we retrieved it using a different one.
+            packed = _pack(obj)
+            stats.sample_size(group, packed)
+            if pk_lookup:
+                cache.set(key, (versions[key], packed), timeout)
+            elif not isinstance(cache, DummyCache):
+                pk_key = _get_key(KEY_PREFIX, model_ct, pk=obj.pk, versioned=False)
+                version = cache.get(pk_key + ':VER') or 0
+                cache.set_many({key: (versions[key], packed), pk_key: (version, packed)}, timeout=timeout)
+        except ObjectDoesNotExist:
+            # remember the miss so that repeated requests don't hit the DB
+            if core_settings.CACHE_MISSING_TIMEOUT:
+                cache.set(key, (versions[key], MISSING), core_settings.CACHE_MISSING_TIMEOUT)
+            raise
+        finally:
+            if locked:
+                _release_lock(key)
+
+    if _is_missing(obj):
+        raise model_ct.model_class().DoesNotExist(
+            '%s matching query does not exist.' % model_ct.model_class()._meta.object_name)
+
+    local_cache.set(key, obj)
+    obj = copy(obj)
+    identity_map.set(key, obj)
     return obj
 
 
@@ -129,16 +504,40 @@ def get_cached_objects(pks, model=None, timeout=CACHE_TIMEOUT, missing=RAISE):
     else:
         pks = [(ContentType.objects.get_for_id(ct_id), pk) for (ct_id, pk) in pks]
 
-    keys = [_get_key(KEY_PREFIX, model, pk=pk) for (model, pk) in pks]
+    all_keys = [_get_key(KEY_PREFIX, model, pk=pk, versioned=False) for (model, pk) in pks]
+
+    # objects changed earlier in the open invalidation batch skip all the caches
+    pending = set(k for k, (model, pk) in zip(all_keys, pks) if _is_pending(model, k, True))
+
+    # objects already retrieved during this request
+    retrieved = identity_map.get_many([k for k in all_keys if k not in pending])
 
-    cached = cache.get_many(keys)
+    # the local tier ignores versions, staleness is bound by its TTL
+    cached = local_cache.get_many(k for k in all_keys if k not in retrieved and k not in pending)
+
+    # objects and their versions that have to come from the shared cache
+    keys = [k for k in all_keys if k not in cached and k not in retrieved]
+    if keys:
+        found, versions = _get_many_versioned([k for k in keys if k not in pending])
+        for k, obj in found.iteritems():
+            cached[k] = obj
+            if not _is_missing(obj):
+                local_cache.set(k, obj)
+
+    # build lookup to get model and pks from the key
+    lookup = dict(zip(all_keys, pks))
 
     # keys not in cache
     keys_to_set = set(keys) - set(cached.keys())
-    if keys_to_set:
-        # build lookup to get model and pks from the key
-        lookup = dict(zip(keys, pks))
 
+    if stats.enabled():
+        keys = set(keys)
+        stats.incr_many([
+            (_get_stats_group(lookup[k][0]), k in keys_to_set and 'misses' or k in keys and 'hits' or 'local_hits', 1)
+            for k in all_keys
+        ])
+
+    if keys_to_set:
         to_get = {}
         # group lookups by CT so we can do in_bulk
         for k in keys_to_set:
@@ -159,19 +558,40 @@ def get_cached_objects(pks, model=None, timeout=CACHE_TIMEOUT, missing=RAISE):
         to_set = {}
         # retrieve all the models from DB
         for ct, vals in to_get.items():
-            models = ct.model_class()._default_manager.in_bulk(vals.keys())
+            group = _get_stats_group(ct)
+            stats.incr(group, 'db_fetches')
+            with stats.timer(group, 'db_time'):
+                models = ct.model_class()._default_manager.in_bulk(vals.keys())
             for pk, m in models.items():
                 k = vals[pk]
-                cached[k] = to_set[k] = m
+                cached[k] = m
+                if k in pending:
+                    continue
+                to_set[k] = (versions[k], _pack(m))
+                local_cache.set(k, m)
+                stats.sample_size(group, to_set[k][1])
 
         if not isinstance(cache, DummyCache):
             # write them into cache
             cache.set_many(to_set, timeout=timeout)
 
+            # remember the objects that don't exist
+            if core_settings.CACHE_MISSING_TIMEOUT:
+                cache.set_many(
+                    dict((k, (versions[k], MISSING)) for k in keys_to_set if k not in cached and k not in pending),
+                    timeout=core_settings.CACHE_MISSING_TIMEOUT
+                )
+
+    for k, obj in cached.iteritems():
+        if not _is_missing(obj):
+            retrieved[k] = copy(obj)
+            if k not in pending:
+                identity_map.set(k, retrieved[k])
+
     out = []
-    for k in keys:
+    for k in all_keys:
         try:
-            out.append(cached[k])
+            out.append(retrieved[k])
         except KeyError:
             if missing == NONE:
                 out.append(None)
@@ -196,24 +616,108 @@ def get_cached_object_or_404(model, timeout=CACHE_TIMEOUT, **kwargs):
         raise Http404('Reason: %s' % str(e))
 
 
-def cache_this(key_getter, timeout=CACHE_TIMEOUT):
+def _resolve_timeout(timeout, args, kwargs):
+    if callable(timeout):
+        return timeout(*args, **kwargs)
+    return timeout
+
+
+def _wrap(result, refresh_at):
+    return (WRAPPED, refresh_at, result)
+
+
+def _unwrap(cached):
+    """
+    Return (refresh_at, result) of a value stored by ``cache_this`` or None
+    for a miss. Values stored in any other format (by an older version) are
+    misses as well.
+    """
+    if not (isinstance(cached, tuple) and len(cached) == 3 and cached[0] == WRAPPED):
+        return None
+    return cached[1:]
+
+
+def cache_this(key_getter, timeout=CACHE_TIMEOUT, refresh_timeout=None):
+    """
+    Cache the decorated function's result under the key returned by
+    ``key_getter`` (called with the same arguments), ``None`` key means no
+    caching. ``None`` results are cached like any other value.
+
+    After ``refresh_timeout`` seconds the value becomes stale, one caller
+    recomputes it while the others keep getting the stale value until
+    ``timeout`` expires. Both timeouts can be callables taking the function's
+    arguments to override them per call.
+
+    ``decorated.get_many(calls)`` returns results for a list of (args,
+    kwargs) pairs reading all of them from the cache with one ``get_many``.
+    """
     def wrapped_decorator(func):
-        def wrapped_func(*args, **kwargs):
-            key = key_getter(*args, **kwargs)
-            if key is not None:
-                result = cache.get(key)
+        def get_result(key, cached, args, kwargs):
+            " Return the result for ``key`` given its (unwrapped) ``cached`` value. "
+            group = key.split(':', 1)[0]
+            locked = False
+            if cached is not None:
+                refresh_at, result = cached
+                if refresh_at is None or refresh_at > time.time():
+                    stats.incr(group, 'hits')
+                    return result
+
+                # stale, refresh it unless somebody else already does
+                if not cache.add(key + ':REFRESH', 1, REFRESH_LOCK_TIMEOUT):
+                    stats.incr(group, 'stale_hits')
+                    return result
+                log.debug('cache_this(key=%s), refreshing stale value.', key)
             else:
-                result = None
-            if result is None:
+                stats.incr(group, 'misses')
+                locked = _acquire_lock(key)
+                if not locked:
+                    # somebody else is computing the result, give them a chance
+                    cached = _wait_for(lambda: _unwrap(cache.get(key)))
+                    if cached is not None:
+                        return cached[1]
                 log.debug('cache_this(key=%s), object not cached.', key)
-                result = func(*args, **kwargs)
-                cache.set(key, result, timeout)
+
+            try:
+                with stats.timer(group, 'compute_time'):
+                    result = func(*args, **kwargs)
+                refresh = _resolve_timeout(refresh_timeout, args, kwargs)
+                value = _wrap(result, refresh and time.time() + refresh or None)
+                stats.sample_size(group, value)
+                cache.set(key, value, _resolve_timeout(timeout, args, kwargs))
+            finally:
+                if locked:
+                    _release_lock(key)
+                elif cached is not None:
+                    cache.delete(key + ':REFRESH')
             return result
 
+        def wrapped_func(*args, **kwargs):
+            key = key_getter(*args, **kwargs)
+            if key is None:
+                return func(*args, **kwargs)
+            # values are stored wrapped with their refresh time so that None
+            # can be told apart from a miss
+            return get_result(key, _unwrap(cache.get(key)), args, kwargs)
+
+        def get_many(calls):
+            calls = [(args, kwargs, key_getter(*args, **kwargs)) for args, kwargs in calls]
+            cached = cache.get_many(list(set(key for _, _, key in calls if key is not None)))
+
+            results = []
+            for args, kwargs, key in calls:
+                if key is None:
+                    results.append(func(*args, **kwargs))
+                    continue
+                result = get_result(key, _unwrap(cached.get(key)), args, kwargs)
+                # computed once even if the batch asks for it repeatedly
+                cached[key] = _wrap(result, None)
+                results.append(result)
+            return results
+
         wrapped_func.__dict__ = func.__dict__
         wrapped_func.__doc__ = func.__doc__
         wrapped_func.__name__ = func.__name__
+        wrapped_func.get_many = get_many
 
         return wrapped_func
     return wrapped_decorator
-
@@ -8,6 +8,60 @@ gettext = lambda s: s
 CACHE_TIMEOUT = 10 * 60
 CACHE_TIMEOUT_LONG = 60 * 60
 
+# Process-local object cache in front of the shared one, 0 entries disables it
+CACHE_LOCAL_SIZE = 0
+# How long (in seconds) can the process-local object cache serve stale objects
+CACHE_LOCAL_TIMEOUT = 5
+# Let only one process at a time recompute a missing cached object, the others
+# use the outdated value or wait up to CACHE_LOCK_WAIT seconds. The lock
+# expires after CACHE_LOCK_TIMEOUT seconds, 0 turns the protection off.
+CACHE_LOCK_TIMEOUT = 0
+CACHE_LOCK_WAIT = 1
+# Remember objects that don't exist for this many seconds, 0 turns it off
+CACHE_MISSING_TIMEOUT = 0
+# Store cached objects as tuples of their field values instead of pickling
+# whole model instances
+CACHE_COMPACT_OBJECTS = False
+# Class collecting cache hit/miss counters and timings, None turns them off,
+# see ella.core.cache.stats. Fraction of cache writes whose size is sampled,
+# number of increments buffered by a thread before they are sent to redis.
+CACHE_STATS_BACKEND = None
+CACHE_STATS_SAMPLE_RATE = 0.01
+CACHE_STATS_FLUSH_SIZE = 100
+# Cache warming (warm_caches command): listing pages per category, URLs to
+# render into the page cache, parallel workers, max. tasks started per second
+# and how often (in minutes) to run it as a celery periodic task
+CACHE_WARM_PAGES = 1
+CACHE_WARM_URLS = ()
+CACHE_WARM_CONCURRENCY = 1
+CACHE_WARM_RATE = None
+CACHE_WARM_INTERVAL = None
+# How long (in seconds) to cache listings unless some listing is scheduled to
+# appear or disappear sooner
+CACHE_LISTING_TIMEOUT = CACHE_TIMEOUT
+# Number of top listings cached together for every listing definition, all
+# pages (and listing tags) within it are sliced from this one cache entry
+CACHE_LISTING_HEAD_SIZE = 100
+# How long (in seconds) after CACHE_TIMEOUT can a stale listing or position
+# still be served while a single request is recomputing it
+CACHE_STALE_TIMEOUT = 60
+# How long (in seconds) to keep numbers of listings in categories, counts of
+# a category's own listings higher than CACHE_LISTING_COUNT_APPROXIMATE are
+# only adjusted on changes instead of being recounted (None means always
+# recount)
+CACHE_LISTING_COUNT_TIMEOUT = CACHE_TIMEOUT
+CACHE_LISTING_COUNT_APPROXIMATE = None
+# Models ('app_label.model') whose changes invalidate cached objects, None
+# means all installed models except those in CACHE_EXCLUDED_MODELS
+CACHE_MODELS = None
+CACHE_EXCLUDED_MODELS = (
+    'admin.logentry',
+    'core.categoryclosure',
+    'redirects.redirect',
+    'sessions.session',
+    'south.migrationhistory',
+)
+
 DOUBLE_RENDER = False
 DOUBLE_RENDER_EXCLUDE_URLS = None
 
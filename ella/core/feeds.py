@@ -5,7 +5,7 @@ from django.utils.feedgenerator import Atom1Feed
 from django.http import Http404
 from django.template import TemplateDoesNotExist, RequestContext, NodeList
 
-from ella.core.models import Listing, Category
+from ella.core.models import Listing, Category, Publishable
 from ella.core.conf import core_settings
 from ella.core.managers import ListingHandler
 from ella.photos.models import Format, FormatedPhoto
@@ -38,7 +38,9 @@ class RSSTopCategoryListings(Feed):
 
     def items(self, obj):
         qset = Listing.objects.get_queryset_wrapper(category=obj, children=ListingHandler.ALL)
-        return qset.get_listings(count=core_settings.RSS_NUM_IN_FEED)
+        listings = qset.get_listings(count=core_settings.RSS_NUM_IN_FEED)
+        Publishable.objects.load_authors([l.publishable for l in listings])
+        return listings
 
     # Feed metadata
     ###########################################################################
@@ -81,7 +83,7 @@ class RSSTopCategoryListings(Feed):
         return desc
 
     def item_author_name(self, item):
-        return ', '.join(map(unicode, item.publishable.authors.all()))
+        return ', '.join(map(unicode, item.publishable.get_authors()))
 
     # Enclosure - Photo
     ###########################################################################
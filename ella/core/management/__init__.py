@@ -1,7 +1,26 @@
+import logging
+import threading
+import time
+import urllib2
+from multiprocessing.pool import ThreadPool
+from urlparse import urlsplit
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.db import connection
+from django.http import Http404
+
+from ella.core.cache.utils import get_cached_objects, SKIP
+from ella.core.conf import core_settings
 from ella.core.signals import content_published, content_unpublished
-from ella.core.models import Publishable, Listing
+from ella.core.models import Publishable, Listing, Category
 from ella.utils import timezone
 
+log = logging.getLogger('ella.core.management')
+
+# seconds to wait for a page requested by warm_url
+WARM_URL_TIMEOUT = 60
+
 
 def regenerate_publish_signals(now=None):
     if now is None:
@@ -36,3 +55,92 @@ def regenerate_listing_handlers(today=None):
     Listing.objects.get_listing_handler('default')
     for lh in Listing.objects._listing_handlers.values():
         lh.regenerate(today)
+
+
+class Throttle(object):
+    " Let at most ``rate`` callers per second through ``wait``, None means no limit. "
+    def __init__(self, rate=None):
+        self.interval = rate and 1.0 / rate or 0
+        self.next_slot = time.time()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def warm_category(category, pages=1):
+    """
+    Load the first ``pages`` pages of the category's listings, the way the
+    category view does, and all the listed objects into cache.
+    """
+    ella_data = category.app_data.ella
+    kwargs = {'children': ella_data.child_behavior, 'source': ella_data.listing_handler}
+    for page_no in xrange(1, pages + 1):
+        try:
+            page = ella_data.get_listings_page(page_no, **kwargs)
+        except Http404:
+            break
+        listings = list(page.object_list)
+        get_cached_objects([l.publishable_id for l in listings], Publishable, missing=SKIP)
+
+
+def warm_url(url):
+    """
+    Request ``url`` over HTTP so that ``UpdateCacheMiddleware`` of the
+    running site stores the page. Paths are requested from the current
+    site's domain.
+    """
+    if not urlsplit(url).netloc:
+        url = 'http://%s%s' % (Site.objects.get_current().domain, url)
+    try:
+        response = urllib2.urlopen(url, timeout=WARM_URL_TIMEOUT)
+    except urllib2.HTTPError, e:
+        log.warning('Warming %s returned %d.', url, e.code)
+        return
+    try:
+        if response.getcode() != 200:
+            log.warning('Warming %s returned %d.', url, response.getcode())
+    finally:
+        response.close()
+
+
+def warm_caches(pages=None, urls=None, concurrency=None, rate=None):
+    """
+    Preload listings and listed objects of all categories on the current
+    site and pre-render ``urls`` into the page cache. Up to ``concurrency``
+    categories/urls are warmed at once, starting at most ``rate`` per second.
+    Arguments default to their CACHE_WARM_* settings.
+    """
+    pages = pages or core_settings.CACHE_WARM_PAGES
+    urls = core_settings.CACHE_WARM_URLS if urls is None else urls
+    concurrency = concurrency or core_settings.CACHE_WARM_CONCURRENCY
+    throttle = Throttle(rate or core_settings.CACHE_WARM_RATE)
+
+    def run(task):
+        throttle.wait()
+        try:
+            task()
+        except Exception:
+            log.exception('Cache warming failed.')
+        finally:
+            if concurrency > 1:
+                # every thread has its own connection
+                connection.close()
+
+    tasks = [lambda c=c: warm_category(c, pages) for c in Category.objects.filter(site=settings.SITE_ID).order_by('tree_path')]
+    tasks.extend(lambda u=u: warm_url(u) for u in urls)
+
+    if concurrency > 1:
+        pool = ThreadPool(concurrency)
+        pool.map(run, tasks)
+        pool.close()
+        pool.join()
+    else:
+        map(run, tasks)
@@ -0,0 +1,26 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from ella.core.cache import stats
+
+
+class Command(NoArgsCommand):
+    help = 'Print hit/miss counters and timings collected by CACHE_STATS_BACKEND.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--reset', action='store_true', dest='reset', default=False,
+            help='Reset the counters after printing them.'),
+    )
+
+    def handle_noargs(self, **options):
+        if not stats.enabled():
+            self.stderr.write('Cache stats are turned off, set CACHE_STATS_BACKEND.\n')
+            return
+
+        for group, values in sorted(stats.get_stats().iteritems()):
+            self.stdout.write('%s\n' % group)
+            for name, value in sorted(values.iteritems()):
+                self.stdout.write('    %-16s %s\n' % (name, value))
+
+        if options['reset']:
+            stats.reset()
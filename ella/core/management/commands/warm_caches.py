@@ -0,0 +1,21 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from ella.core.management import warm_caches
+
+class Command(NoArgsCommand):
+    help = 'Preload cached listings, listed objects and pages (CACHE_WARM_URLS).'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--pages', type='int', dest='pages', default=None,
+            help='Number of listing pages to load for every category.'),
+        make_option('--url', action='append', dest='urls', default=None,
+            help='URL (or path on the current site) to request over HTTP into the page cache, can be repeated.'),
+        make_option('--concurrency', type='int', dest='concurrency', default=None,
+            help='Number of categories or URLs warmed at once.'),
+        make_option('--rate', type='float', dest='rate', default=None,
+            help='Maximum number of categories or URLs started per second.'),
+    )
+
+    def handle_noargs(self, **options):
+        warm_caches(options['pages'], options['urls'], options['concurrency'], options['rate'])
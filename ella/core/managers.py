@@ -1,3 +1,4 @@
+from datetime import datetime, timedelta
 from operator import attrgetter
 
 from django.db import models
@@ -6,7 +7,8 @@ from django.utils.encoding import smart_str
 from django.db.models.loading import get_model
 from django.conf import settings
 
-from ella.core.cache import cache_this
+from ella.core.cache import cache_this, get_cached_objects, SKIP, NONE
+from ella.core.cache.listings import get_count, get_generation, prefetched_generations
 from ella.core.conf import core_settings
 from ella.utils import timezone, import_module_member
 
@@ -20,6 +22,19 @@ class PublishableManager(models.Manager):
             published=True, publish_from__lte=now
         )
 
+    def load_authors(self, publishables):
+        """
+        Load authors of all ``publishables`` using one ``get_cached_objects``
+        call, ``publishable.get_authors()`` then doesn't hit cache or DB.
+        """
+        Author = get_model('core', 'author')
+        ids = set()
+        for p in publishables:
+            ids.update(p.get_author_ids())
+        authors = dict((a.pk, a) for a in get_cached_objects(list(ids), Author, missing=SKIP))
+        for p in publishables:
+            p._authors_cache = [authors[pk] for pk in p.get_author_ids() if pk in authors]
+
 
 class CategoryManager(models.Manager):
     _cache = {}
@@ -79,6 +94,112 @@ class CategoryManager(models.Manager):
         return children
 
 
+class CategoryClosureManager(models.Manager):
+    def rebuild(self, category=None):
+        """
+        Recompute ancestors of ``category`` and all its descendants, of all
+        categories if ``category`` is None.
+
+        Category is recorded as a descendant only of the ancestors its listings
+        propagate to, the path between them contains no category with
+        ``propagate_listings`` turned off.
+        """
+        Category = get_model('core', 'category')
+        qset = Category.objects.all()
+        if category is not None:
+            qset = qset.filter(site=category.site_id)
+        categories = dict((c.pk, c) for c in qset)
+
+        if category is None:
+            self.all().delete()
+            subtree = categories.values()
+        else:
+            children = {}
+            for c in categories.itervalues():
+                children.setdefault(c.tree_parent_id, []).append(c)
+            subtree = []
+            to_process = [categories[category.pk]]
+            while to_process:
+                c = to_process.pop()
+                subtree.append(c)
+                to_process.extend(children.get(c.pk, []))
+            self.filter(descendant__in=[c.pk for c in subtree]).delete()
+
+        rows = []
+        for descendant in subtree:
+            c, depth = descendant, 0
+            rows.append(self.model(ancestor_id=c.pk, descendant_id=descendant.pk, depth=depth))
+            while c.tree_parent_id in categories and c.app_data.ella.propagate_listings:
+                c, depth = categories[c.tree_parent_id], depth + 1
+                rows.append(self.model(ancestor_id=c.pk, descendant_id=descendant.pk, depth=depth))
+        bulk_create(self, rows)
+
+
+def bulk_create(manager, objs):
+    " ``manager.bulk_create(objs)``, one INSERT per object on Django 1.3. "
+    if hasattr(manager, 'bulk_create'):
+        manager.bulk_create(objs)
+    else:
+        for o in objs:
+            o.save(force_insert=True)
+
+
+class ListingFeedManager(models.Manager):
+    def update_publishable(self, publishable):
+        """
+        Recreate rows of ``publishable`` from its listings, only remove them if
+        it isn't published.
+        """
+        self.filter(publishable=publishable).delete()
+        if not publishable.published:
+            return
+
+        Listing = get_model('core', 'listing')
+        CategoryClosure = get_model('core', 'categoryclosure')
+
+        listings = list(Listing.objects.filter(publishable=publishable).values_list(
+            'id', 'category', 'publish_from', 'publish_to', 'commercial'))
+        ancestors = {}
+        for descendant_id, ancestor_id, depth in CategoryClosure.objects.filter(
+                descendant__in=[l[1] for l in listings]).values_list('descendant', 'ancestor', 'depth'):
+            ancestors.setdefault(descendant_id, []).append((ancestor_id, depth))
+
+        # one row per listing and target, scheduled and expired listings
+        # included - which of them is visible depends on the time of reading
+        rows = []
+        for listing_id, category_id, publish_from, publish_to, commercial in listings:
+            for ancestor_id, depth in ancestors.get(category_id, []):
+                for children in ListingHandler.get_children_modes(depth):
+                    rows.append(self.model(
+                        category_id=ancestor_id,
+                        children=children,
+                        listing_id=listing_id,
+                        listing_category_id=category_id,
+                        publishable_id=publishable.pk,
+                        content_type_id=publishable.content_type_id,
+                        publish_from=publish_from,
+                        publish_to=publish_to,
+                        commercial=commercial
+                    ))
+        bulk_create(self, rows)
+
+    def update_category(self, category):
+        """
+        Recreate rows of all publishables listed in ``category`` and its
+        descendants after the category moved.
+        """
+        Publishable = get_model('core', 'publishable')
+        for p in Publishable.objects.filter(listing__category__ancestor_set__ancestor=category).distinct():
+            self.update_publishable(p)
+
+    def rebuild(self):
+        " Recreate the whole table from ``Listing`` objects. "
+        Publishable = get_model('core', 'publishable')
+        self.all().delete()
+        for p in Publishable.objects.filter(published=True, listing__isnull=False).distinct():
+            self.update_publishable(p)
+
+
 class RelatedManager(models.Manager):
     def collect_related(self, finder_funcs, obj, count, *args, **kwargs):
         """
@@ -147,6 +268,18 @@ class ListingHandler(object):
     def regenerate(cls, today=None):
         pass
 
+    @classmethod
+    def get_children_modes(cls, depth):
+        """
+        Return children modes in which category ``depth`` levels up the tree
+        (see ``CategoryClosure``) includes listings of its descendant.
+        """
+        if depth == 0:
+            return (cls.NONE, cls.IMMEDIATE, cls.ALL)
+        elif depth == 1:
+            return (cls.IMMEDIATE, cls.ALL)
+        return (cls.ALL, )
+
     def __init__(self, category, children=NONE, content_types=[],
                  date_range=(), exclude=None, **kwargs):
         self.category = category
@@ -175,8 +308,31 @@ class ListingHandler(object):
     def get_listings(self, offset=0, count=10):
         raise NotImplementedError
 
+    @classmethod
+    def get_listings_many(cls, requests):
+        """
+        Return results of ``get_listings(offset, count)`` for every
+        (handler, offset, count) in ``requests``, handlers being instances of
+        this class. Subclasses fetch them all in as few round trips as they
+        can, by default every handler is asked separately.
+        """
+        return [handler.get_listings(offset, count) for handler, offset, count in requests]
+
     def get_listing(self, i):
-        return self.get_listings(i, i + 1)[0]
+        return self.get_listings(i, 1)[0]
+
+    def get_listings_after(self, cursor=None, count=10):
+        """
+        Return ``count`` listings following the position described by
+        ``cursor`` (see ``get_cursor``), from the top if it's None. Unlike
+        ``get_listings`` the cost doesn't grow with the depth of the page.
+        Invalid cursor raises ValueError.
+        """
+        raise NotImplementedError
+
+    def get_cursor(self, listing):
+        " Return opaque string describing position of ``listing``. "
+        raise NotImplementedError
 
     def count(self):
         raise NotImplementedError
@@ -185,17 +341,44 @@ class ListingHandler(object):
         return self.count()
 
 
+def get_excluded(exclude):
+    " Return ``exclude`` given to listing handlers - None, a publishable or several of them - as a list. "
+    if not exclude:
+        return []
+    if isinstance(exclude, models.Model):
+        return [exclude]
+    return list(exclude)
+
+
 def get_listings_key(self, category=None, children=ListingHandler.NONE, count=10, offset=0, content_types=[], date_range=(), exclude=None, **kwargs):
     c = category and  category.id or ''
 
-    return 'core.get_listing:%s:%d:%d:%d:%d:%s:%s:%s' % (
-            c, count, offset, children, exclude.id if exclude else 0,
+    return 'core.get_listing:%s:%d:%d:%d:%s:%s:%s:%s:%s' % (
+            c, count, offset, children, ','.join(str(p.pk) for p in get_excluded(exclude)) or 0,
             ','.join(map(lambda ct: str(ct.pk), content_types)),
             ','.join(map(lambda d: d.strftime('%Y%m%d'), date_range)),
             ','.join(':'.join((k, smart_str(v))) for k, v in kwargs.items()),
+            get_generation(category, content_types),
     )
 
 
+def get_listings_refresh_timeout(self, category=None, children=ListingHandler.NONE, count=10, offset=0, content_types=[], date_range=(), exclude=None, **kwargs):
+    """
+    Cache listings for CACHE_LISTING_TIMEOUT seconds or until the next
+    listing is due to appear or disappear, whichever comes first.
+    """
+    timeout = core_settings.CACHE_LISTING_TIMEOUT
+    next_change = self.get_next_change(category, children, content_types, date_range, exclude, **kwargs)
+    if next_change is not None:
+        delta = next_change - timezone.now()
+        timeout = min(timeout, max(1, delta.days * 24 * 3600 + delta.seconds + 1))
+    return timeout
+
+
+# what ListingManager.get_listing_rows returns for every listing
+LISTING_ROW_FIELDS = ('id', 'category', 'publishable__content_type', 'publishable', 'publish_from', 'publish_to', 'commercial')
+
+
 class ListingManager(models.Manager):
     def clean_listings(self):
         """
@@ -212,35 +395,36 @@ class ListingManager(models.Manager):
             )
         return qset
 
-    def get_listing_queryset(self, category=None, children=ListingHandler.NONE, content_types=[], date_range=(), exclude=None, **kwargs):
-        # give the database some chance to cache this query
-        now = timezone.now().replace(second=0, microsecond=0)
+    def load_publishables(self, listings):
+        """
+        Replace ``publishable`` of all ``listings`` with the instance of its
+        concrete class (``Article``, ...) using one ``get_cached_objects``
+        call. Listings whose publishable no longer exists are left out.
+        """
+        listings = list(listings)
+        publishables = get_cached_objects(
+            [(l.publishable.content_type_id, l.publishable_id) for l in listings],
+            missing=NONE
+        )
 
-        if date_range:
-            qset = self.filter(publish_from__range=date_range, publishable__published=True, **kwargs)
-        else:
-            qset = self.filter(publish_from__lte=now, publishable__published=True, **kwargs)
+        out = []
+        for l, p in zip(listings, publishables):
+            if p is not None:
+                l.publishable = p
+                out.append(l)
+        return out
 
+    def _filter_listings(self, qset, category=None, children=ListingHandler.NONE, content_types=[], exclude=None):
         if category:
             if children == ListingHandler.NONE:
                 # only this one category
                 qset = qset.filter(category=category)
             elif children == ListingHandler.IMMEDIATE:
-                # this category and its children
-                qset = qset.filter(models.Q(category__tree_parent=category) | models.Q(category=category))
-
-                for c in category.get_children():
-                    if not c.app_data.ella.propagate_listings:
-                        qset = qset.exclude(category=c)
-
+                # this category and its children that propagate listings
+                qset = qset.filter(category__ancestor_set__ancestor=category, category__ancestor_set__depth__lte=1)
             elif children == ListingHandler.ALL:
-                # this category and all its descendants
-                qset = qset.filter(category__tree_path__startswith=category.tree_path, category__site=category.site_id)
-
-                for c in category.get_children(True):
-                    if not c.app_data.ella.propagate_listings:
-                        qset = qset.exclude(category__tree_path__startswith=c.tree_path)
-
+                # this category and all its descendants that propagate listings
+                qset = qset.filter(category__ancestor_set__ancestor=category)
             else:
                 raise AttributeError('Invalid children value (%s) - should be one of (%s, %s, %s)' % (children, self.NONE, self.IMMEDIATE, self.ALL))
 
@@ -248,13 +432,51 @@ class ListingManager(models.Manager):
         if content_types:
             qset = qset.filter(publishable__content_type__in=content_types)
 
-        # we were asked to omit certain Publishable
-        if exclude:
-            qset = qset.exclude(publishable=exclude)
+        # we were asked to omit certain Publishables
+        excluded = get_excluded(exclude)
+        if excluded:
+            qset = qset.exclude(publishable__in=[p.pk for p in excluded])
+
+        return qset
+
+    def get_listing_queryset(self, category=None, children=ListingHandler.NONE, content_types=[], date_range=(), exclude=None, **kwargs):
+        # give the database some chance to cache this query
+        now = timezone.now().replace(second=0, microsecond=0)
+
+        if date_range:
+            qset = self.filter(publish_from__range=date_range, publishable__published=True, **kwargs)
+        else:
+            qset = self.filter(publish_from__lte=now, publishable__published=True, **kwargs)
 
+        qset = self._filter_listings(qset, category, children, content_types, exclude)
         return qset.exclude(publish_to__lt=now).order_by('-publish_from')
 
-    @cache_this(get_listings_key)
+    def get_next_change(self, category=None, children=ListingHandler.NONE, content_types=[], date_range=(), exclude=None, **kwargs):
+        """
+        Return the nearest time in the future when the result of
+        ``get_listing_queryset`` with the same parameters changes because of
+        some listing's ``publish_from`` or ``publish_to``, None if there is no
+        such change scheduled.
+        """
+        now = timezone.now()
+        qset = self._filter_listings(self.filter(publishable__published=True, **kwargs), category, children, content_types, exclude)
+        if date_range:
+            qset = qset.filter(publish_from__range=date_range)
+
+        changes = []
+        next_from = qset.filter(publish_from__gt=now).aggregate(next=models.Min('publish_from'))['next']
+        if next_from is not None:
+            # listings show up on the first whole minute past publish_from
+            minute = next_from.replace(second=0, microsecond=0)
+            changes.append(minute if minute == next_from else minute + timedelta(minutes=1))
+
+        next_to = qset.filter(publish_from__lte=now, publish_to__gt=now).aggregate(next=models.Min('publish_to'))['next']
+        if next_to is not None:
+            # and disappear a minute after publish_to
+            changes.append(next_to.replace(second=0, microsecond=0) + timedelta(minutes=1))
+
+        return min(changes) if changes else None
+
     def get_listing(self, category=None, children=ListingHandler.NONE, count=10, offset=0, content_types=[], date_range=(), exclude=None, **kwargs):
         """
         Get top objects for given category and potentionally also its child categories.
@@ -273,38 +495,171 @@ class ListingManager(models.Manager):
         if not count:
             return []
 
-        limit = offset + count
+        rows_count, rows_offset, rows_exclude, pick = self._get_rows_window(count, offset, exclude)
+        rows = self.get_listing_rows(category, children, rows_count, rows_offset, content_types, date_range, rows_exclude, **kwargs)
+        return self._load_rows(pick(rows))
+
+    def get_listing_many(self, specs):
+        """
+        Same as ``get_listing`` for every dict of its arguments in ``specs``.
+        All the cached listings are read with one cache call and publishables
+        of all of them are loaded together.
+        """
+        calls = []
+        for spec in specs:
+            kwargs = dict(spec)
+            count, offset = kwargs.get('count', 10), kwargs.get('offset', 0)
+            assert offset >= 0, "Offset must be a positive integer"
+            assert count >= 0, "Count must be a positive integer"
+
+            kwargs['count'], kwargs['offset'], kwargs['exclude'], pick = self._get_rows_window(count, offset, kwargs.get('exclude'))
+            calls.append((kwargs, pick))
 
+        with prefetched_generations((kw.get('category'), kw.get('content_types', [])) for kw, _ in calls):
+            results = self.get_listing_rows.get_many([((self, ), kwargs) for kwargs, _ in calls])
+        rows = [pick(result) for (_, pick), result in zip(calls, results)]
+
+        return self._load_rows_many(rows)
+
+    def _get_rows_window(self, count, offset, exclude=None):
+        """
+        Return count, offset and exclude to call ``get_listing_rows`` with and
+        a function picking ``count`` listings from ``offset`` out of its result.
+
+        All the early pages share one cached head of the listing. Publishables
+        in ``exclude`` are filtered out of the head here rather than by the
+        query, so that excluding them doesn't create a separate head.
+        """
+        excluded = get_excluded(exclude)
+        if offset + count + len(excluded) <= core_settings.CACHE_LISTING_HEAD_SIZE:
+            excluded_ids = set(p.pk for p in excluded)
+            def pick(rows):
+                # publishable id is the 4th of LISTING_ROW_FIELDS
+                return [r for r in rows if r[3] not in excluded_ids][offset:offset + count]
+            return core_settings.CACHE_LISTING_HEAD_SIZE, 0, None, pick
+        return count, offset, exclude, lambda rows: rows
+
+    @cache_this(get_listings_key,
+        timeout=core_settings.CACHE_LISTING_TIMEOUT + core_settings.CACHE_STALE_TIMEOUT,
+        refresh_timeout=get_listings_refresh_timeout)
+    def get_listing_rows(self, category=None, children=ListingHandler.NONE, count=10, offset=0, content_types=[], date_range=(), exclude=None, **kwargs):
+        """
+        Same as ``get_listing`` only returns the listings as compact tuples
+        of their field values (see ``LISTING_ROW_FIELDS``) that are cheap to
+        cache.
+        """
         qset = self.get_listing_queryset(category, children, content_types, date_range, exclude, **kwargs)
 
         # direct listings, we don't need to check for duplicates
         if children == ListingHandler.NONE:
-            return qset[offset:limit]
+            return list(qset.values_list(*LISTING_ROW_FIELDS)[offset:offset + count])
 
-        seen = set()
-        out = []
-        while len(out) < count:
-            skip = 0
-            # 2 i a reasonable value for padding, wouldn't you say dear Watson?
-            for l in qset[offset:limit + 2]:
-                if l.publishable_id not in seen:
-                    seen.add(l.publishable_id)
-                    out.append(l)
-                    if len(out) == count:
-                        break
-                else:
-                    skip += 1
-
-            # no enough skipped, or not enough listings to work with, no need for another try
-            if skip <= 2 or (len(out) + skip) < (count + 2):
-                break
-
-            # get another page to fill in the gaps
-            offset += count
-            limit += count
+        return self._get_unique_rows(qset, self._get_publishables(qset)[offset:offset + count])
+
+    def _load_rows(self, rows):
+        " Turn rows from ``get_listing_rows`` back into listings of concrete publishables. "
+        return self._load_rows_many([rows])[0]
+
+    def _load_rows_many(self, rows_list):
+        " Same as ``_load_rows`` for several lists of rows, all publishables are loaded at once. "
+        publishables = iter(get_cached_objects(
+            [(ct_id, pk) for rows in rows_list for _, _, ct_id, pk, _, _, _ in rows],
+            missing=NONE
+        ))
 
+        out = []
+        for rows in rows_list:
+            listings = []
+            for pk, category_id, ct_id, publishable_id, publish_from, publish_to, commercial in rows:
+                p = publishables.next()
+                if p is None:
+                    continue
+                l = self.model(id=pk, category_id=category_id, publishable_id=publishable_id,
+                               publish_from=publish_from, publish_to=publish_to, commercial=commercial)
+                l._state.adding = False
+                l._state.db = self.db
+                l.publishable = p
+                listings.append(l)
+            out.append(listings)
         return out
 
+    def _get_publishables(self, qset):
+        """
+        Group listings from ``qset`` by publishable so that publishables listed
+        in several categories only come up once, under their newest listing.
+
+        The page of publishables is sliced from this in SQL, their listings
+        are then read by ``_get_unique_rows`` - two queries returning a page
+        each, a single one would need the whole ``qset`` repeated in raw SQL.
+        """
+        return qset.values('publishable').annotate(
+                last_publish_from=models.Max('publish_from')
+            ).order_by('-last_publish_from', '-publishable')
+
+    def _get_listings_up_to(self, qset, publish_from):
+        """
+        Listings from ``qset`` not newer than ``publish_from`` whose
+        publishables aren't listed any later, so that a page after a cursor
+        only groups the rows below it instead of the whole listing.
+        """
+        newer = qset.filter(publish_from__gt=publish_from).values('publishable')
+        return qset.filter(publish_from__lte=publish_from).exclude(publishable__in=newer)
+
+    def _get_unique_rows(self, qset, publishables):
+        """
+        Return the newest listing from ``qset`` for each of ``publishables``
+        as a row (see ``LISTING_ROW_FIELDS``), listings published at the same
+        time go to the category higher in the tree.
+        """
+        ids = [p['publishable'] for p in publishables]
+        if not ids:
+            return []
+
+        rows = {}
+        for row in qset.filter(publishable__in=ids).order_by(
+                '-publish_from', 'category__tree_path').values_list(*LISTING_ROW_FIELDS):
+            # publishable id is the 4th of LISTING_ROW_FIELDS
+            rows.setdefault(row[3], row)
+        return [rows[pk] for pk in ids if pk in rows]
+
+    def get_listing_count(self, category=None, children=ListingHandler.NONE, content_types=[], date_range=(), exclude=None, **kwargs):
+        " Number of listings ``get_listing`` can return for given parameters. "
+        qset = self.get_listing_queryset(category, children, content_types, date_range, exclude, **kwargs)
+        if children == ListingHandler.NONE:
+            return qset.count()
+        return qset.values('publishable').distinct().count()
+
+    def get_listing_after(self, category=None, children=ListingHandler.NONE, count=10, cursor=None, content_types=[], date_range=(), exclude=None, **kwargs):
+        """
+        Get ``count`` objects listed after ``cursor``, a (publish_from,
+        publishable_id) tuple of the last listing already seen. See
+        ``get_listing`` for the rest of the parameters.
+        """
+        assert count >= 0, "Count must be a positive integer"
+
+        qset = self.get_listing_queryset(category, children, content_types, date_range, exclude, **kwargs)
+
+        if children == ListingHandler.NONE:
+            page = qset.order_by('-publish_from', '-publishable__id')
+            if cursor:
+                publish_from, publishable_id = cursor
+                page = page.filter(
+                    models.Q(publish_from__lt=publish_from) |
+                    models.Q(publish_from=publish_from, publishable__id__lt=publishable_id)
+                )
+            return self._load_rows(list(page.values_list(*LISTING_ROW_FIELDS)[:count]))
+
+        if cursor:
+            publish_from, publishable_id = cursor
+            qset = self._get_listings_up_to(qset, publish_from)
+            publishables = self._get_publishables(qset).filter(
+                models.Q(last_publish_from__lt=publish_from) |
+                models.Q(last_publish_from=publish_from, publishable__lt=publishable_id)
+            )
+        else:
+            publishables = self._get_publishables(qset)
+        return self._load_rows(self._get_unique_rows(qset, publishables[:count]))
+
     def get_listing_handler(self, source, fallback=True):
         if not hasattr(self, '_listing_handlers'):
             self._listing_handlers = {}
@@ -334,37 +689,200 @@ class ListingManager(models.Manager):
 
 
 class ModelListingHandler(ListingHandler):
-    def get_listing(self, i):
+    def get_listings(self, offset=0, count=10):
         Listing = get_model('core', 'listing')
-        return Listing.objects.get_listing_queryset(
+        return Listing.objects.get_listing(
                 self.category,
                 children=self.children,
                 content_types=self.content_types,
                 date_range=self.date_range,
+                offset=offset,
+                count=count,
                 exclude=self.exclude
-            )[i]
+            )
 
-    def get_listings(self, offset=0, count=10):
+    @classmethod
+    def get_listings_many(cls, requests):
         Listing = get_model('core', 'listing')
-        return Listing.objects.get_listing(
+        return Listing.objects.get_listing_many([
+            dict(
+                category=handler.category,
+                children=handler.children,
+                content_types=handler.content_types,
+                date_range=handler.date_range,
+                offset=offset,
+                count=count,
+                exclude=handler.exclude
+            )
+            for handler, offset, count in requests
+        ])
+
+    CURSOR_FORMAT = '%Y%m%d%H%M%S%f'
+
+    def _parse_cursor(self, cursor):
+        publish_from, publishable_id = cursor.split(':')
+        publish_from = datetime.strptime(publish_from, self.CURSOR_FORMAT)
+        if timezone.use_tz:
+            publish_from = timezone.utc.localize(publish_from)
+        return publish_from, int(publishable_id)
+
+    def get_listings_after(self, cursor=None, count=10):
+        if cursor is not None:
+            cursor = self._parse_cursor(cursor)
+
+        Listing = get_model('core', 'listing')
+        return Listing.objects.get_listing_after(
                 self.category,
                 children=self.children,
                 content_types=self.content_types,
                 date_range=self.date_range,
-                offset=offset,
                 count=count,
+                cursor=cursor,
                 exclude=self.exclude
             )
 
+    def get_cursor(self, listing):
+        publish_from = timezone.utc_localize(listing.publish_from)
+        return '%s:%d' % (publish_from.strftime(self.CURSOR_FORMAT), listing.publishable_id)
+
+    def _count_listings(self):
+        Listing = get_model('core', 'listing')
+        return Listing.objects.get_listing_count(
+            self.category,
+            children=self.children,
+            content_types=self.content_types,
+            date_range=self.date_range,
+            exclude=self.exclude
+        )
+
     def count(self):
         if not hasattr(self, '_count'):
-            Listing = get_model('core', 'listing')
-            self._count = Listing.objects.get_listing_queryset(
-                self.category,
-                children=self.children,
-                content_types=self.content_types,
-                date_range=self.date_range,
-                exclude=self.exclude
-            ).count()
+            self._count = get_count(self, self._count_listings)
         return self._count
 
+
+class FeedListingHandler(ModelListingHandler):
+    """
+    Listing handler reading the denormalized ``ListingFeed`` table with one
+    indexed row per listing and category/children mode it should appear in,
+    so no joins or tree lookups are needed to list a category.
+
+    Rows are maintained by signals connected when this handler is used in
+    ``LISTING_HANDLERS``.
+    """
+    ROW_FIELDS = ('listing', 'listing_category', 'publishable', 'content_type', 'publish_from', 'publish_to', 'commercial')
+
+    def get_queryset(self):
+        " Rows of the listings visible now, duplicates included. "
+        ListingFeed = get_model('core', 'listingfeed')
+        now = timezone.now().replace(second=0, microsecond=0)
+
+        if self.date_range:
+            qset = ListingFeed.objects.filter(publish_from__range=self.date_range)
+        else:
+            qset = ListingFeed.objects.filter(publish_from__lte=now)
+
+        if self.category:
+            qset = qset.filter(category=self.category, children=self.children)
+        else:
+            # everything listed anywhere on this site, once
+            Category = get_model('core', 'category')
+            qset = qset.filter(category=Category.objects.get_by_tree_path(''), children=ListingHandler.ALL)
+
+        if self.content_types:
+            qset = qset.filter(content_type__in=self.content_types)
+
+        excluded = get_excluded(self.exclude)
+        if excluded:
+            qset = qset.exclude(publishable__in=[p.pk for p in excluded])
+
+        return qset.exclude(publish_to__lt=now)
+
+    def _is_unique(self):
+        # only several listings in one category can lead to the same row
+        return self.category and self.children == ListingHandler.NONE
+
+    def _get_publishables(self, qset):
+        " Newest visible listing time of every publishable, see ``ListingManager._get_publishables``. "
+        return qset.values('publishable').annotate(
+                last_publish_from=models.Max('publish_from')
+            ).order_by('-last_publish_from', '-publishable')
+
+    def _get_rows(self, offset, count, cursor=None):
+        qset = self.get_queryset()
+
+        if self._is_unique():
+            page = qset.order_by('-publish_from', '-publishable')
+            if cursor is not None:
+                publish_from, publishable_id = cursor
+                page = page.filter(
+                    models.Q(publish_from__lt=publish_from) |
+                    models.Q(publish_from=publish_from, publishable__lt=publishable_id)
+                )
+            return list(page.values_list(*self.ROW_FIELDS)[offset:offset + count])
+
+        if cursor is not None:
+            publish_from, publishable_id = cursor
+            # group only the rows below the cursor, see ListingManager._get_listings_up_to
+            newer = qset.filter(publish_from__gt=publish_from).values('publishable')
+            qset = qset.filter(publish_from__lte=publish_from).exclude(publishable__in=newer)
+            publishables = self._get_publishables(qset).filter(
+                models.Q(last_publish_from__lt=publish_from) |
+                models.Q(last_publish_from=publish_from, publishable__lt=publishable_id)
+            )
+        else:
+            publishables = self._get_publishables(qset)
+        ids = [p['publishable'] for p in publishables[offset:offset + count]]
+        if not ids:
+            return []
+
+        # the newest listing of every publishable, the category higher in
+        # the tree wins a tie like in ListingManager
+        rows = {}
+        for row in qset.filter(publishable__in=ids).order_by(
+                '-publish_from', 'listing_category__tree_path').values_list(*self.ROW_FIELDS):
+            rows.setdefault(row[2], row)
+        return [rows[pk] for pk in ids if pk in rows]
+
+    @classmethod
+    def _get_listings_many(cls, rows_list):
+        " Turn lists of rows (see ``ROW_FIELDS``) into listings, publishables are loaded at once. "
+        Listing = get_model('core', 'listing')
+        publishables = iter(get_cached_objects(
+            [(row[3], row[2]) for rows in rows_list for row in rows],
+            missing=NONE
+        ))
+
+        out = []
+        for rows in rows_list:
+            listings = []
+            for listing_id, category_id, publishable_id, ct_id, publish_from, publish_to, commercial in rows:
+                p = publishables.next()
+                if p is None:
+                    continue
+                l = Listing(id=listing_id, category_id=category_id, publishable_id=publishable_id,
+                            publish_from=publish_from, publish_to=publish_to, commercial=commercial)
+                l._state.adding = False
+                l.publishable = p
+                listings.append(l)
+            out.append(listings)
+        return out
+
+    def get_listings(self, offset=0, count=10):
+        return self._get_listings_many([self._get_rows(offset, count)])[0]
+
+    @classmethod
+    def get_listings_many(cls, requests):
+        # indexed queries for every listing, publishables are loaded together
+        return cls._get_listings_many([handler._get_rows(offset, count) for handler, offset, count in requests])
+
+    def get_listings_after(self, cursor=None, count=10):
+        if cursor is not None:
+            cursor = self._parse_cursor(cursor)
+        return self._get_listings_many([self._get_rows(0, count, cursor)])[0]
+
+    def _count_listings(self):
+        qset = self.get_queryset()
+        if self._is_unique():
+            return qset.count()
+        return qset.values('publishable').distinct().count()
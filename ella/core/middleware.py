@@ -9,6 +9,9 @@ from django.core.cache import cache
 from django.utils.cache import get_cache_key, add_never_cache_headers, learn_cache_key
 from django.conf import settings
 from ella.core.conf import core_settings
+from ella.core.cache import stats
+from ella.core.cache.utils import identity_map, start_invalidation_batch, \
+    flush_invalidation_batch, reset_invalidation_batch
 
 class DoubleRenderMiddleware(object):
 
@@ -164,3 +167,70 @@ class FetchFromCacheMiddleware(object):
 
         request._cache_update_cache = False
         return response
+
+class IdentityMapMiddleware(object):
+    """
+    Remember every object retrieved via ``ella.core.cache`` for the duration of
+    the request so that it is only fetched and unpickled once, no matter how
+    many cached foreign keys or template tags point to it.
+
+    Objects are shared between all their users within the request, they should
+    not be modified when this middleware is active.
+    """
+    def process_request(self, request):
+        identity_map.activate()
+
+    def process_response(self, request, response):
+        identity_map.deactivate()
+        return response
+
+    def process_exception(self, request, exception):
+        identity_map.deactivate()
+
+class InvalidationBatchMiddleware(object):
+    """
+    Invalidate cached objects changed during the request only once the
+    response is ready. Every object is invalidated once, all of them in a
+    single cache call. Until then the request itself reads the changed
+    objects from the database.
+
+    The batch is flushed in ``process_response`` (or ``process_exception``),
+    it has to run after the request's transaction is committed, otherwise
+    other requests can cache the old data again. Put this middleware above
+    ``django.middleware.transaction.TransactionMiddleware`` in
+    ``MIDDLEWARE_CLASSES``, with ``ATOMIC_REQUESTS`` the transaction is
+    committed before any response middleware runs.
+
+    A batch left open by a request whose response never got here (when
+    another middleware failed) is flushed when the thread starts its next
+    request.
+    """
+    def process_request(self, request):
+        reset_invalidation_batch()
+        start_invalidation_batch()
+        request._invalidation_batch = True
+
+    def _flush(self, request):
+        if getattr(request, '_invalidation_batch', False):
+            request._invalidation_batch = False
+            flush_invalidation_batch()
+
+    def process_response(self, request, response):
+        self._flush(request)
+        return response
+
+    def process_exception(self, request, exception):
+        # the response to an unhandled exception skips process_response
+        self._flush(request)
+
+class CacheStatsMiddleware(object):
+    """
+    Send the cache stats counters collected during the request in one go,
+    see ``CACHE_STATS_BACKEND`` and ``CACHE_STATS_FLUSH_SIZE``.
+    """
+    def process_response(self, request, response):
+        stats.flush()
+        return response
+
+    def process_exception(self, request, exception):
+        stats.flush()
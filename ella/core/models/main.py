@@ -9,9 +9,10 @@ from django.utils.translation import ugettext_lazy as _
 
 from app_data import AppDataField
 
-from ella.core.cache import CachedGenericForeignKey, SiteForeignKey, ContentTypeForeignKey, CategoryForeignKey, CachedForeignKey, redis
+from ella.core.cache import CachedGenericForeignKey, SiteForeignKey, ContentTypeForeignKey, CategoryForeignKey, CachedForeignKey, redis, listings
 from ella.core.conf import core_settings
-from ella.core.managers import CategoryManager, ListingHandler
+from ella.core.managers import CategoryManager, CategoryClosureManager, ListingHandler
+from ella.core.signals import category_moved
 
 if hasattr(settings, 'AUTH_USER_MODEL'):
     User = settings.AUTH_USER_MODEL
@@ -126,9 +127,19 @@ class Category(models.Model):
     def __unicode__(self):
         return '%s/%s' % (self.site.name, self.tree_path)
 
+    def _get_closure_state(self):
+        " Everything the category's ``CategoryClosure`` rows depend on. "
+        return self.tree_parent_id, self.app_data.ella.propagate_listings
+
     def save(self, **kwargs):
         "Override save() to construct tree_path based on the category's parent."
         old_tree_path = self.tree_path
+        old_state = None
+        if self.pk:
+            old = list(Category.objects.filter(pk=self.pk))
+            if old:
+                old_state = old[0]._get_closure_state()
+
         if self.tree_parent:
             if self.tree_parent.tree_path:
                 self.tree_path = '%s/%s' % (self.tree_parent.tree_path, self.slug)
@@ -143,6 +154,14 @@ class Category(models.Model):
             children = Category.objects.filter(tree_parent=self)
             for child in children:
                 child.save(force_update=True)
+        # the rebuild covers all descendants, children only moving along with
+        # this category keep their closure state and skip it
+        if old_state != self._get_closure_state():
+            old_ancestors = listings.get_ancestors(self.pk) if old_state else []
+            CategoryClosure.objects.rebuild(self)
+            if old_state:
+                # listings of the subtree moved to other ancestors
+                category_moved.send(sender=Category, category=self, old_ancestors=old_ancestors)
 
     def get_root_category(self):
         if '/' not in self.tree_path:
@@ -199,6 +218,30 @@ class Category(models.Model):
     draw_title.allow_tags = True
 
 
+class CategoryClosure(models.Model):
+    """
+    Every category paired with all the categories its listings propagate to
+    (including itself with ``depth`` of 0), so that listings of a category
+    and its descendants can be selected with a single join. Maintained by
+    ``Category.save``, use ``CategoryClosure.objects.rebuild()`` to fill it
+    after categories have been changed by other means.
+    """
+    ancestor = models.ForeignKey(Category, related_name='descendant_set')
+    descendant = models.ForeignKey(Category, related_name='ancestor_set')
+    depth = models.PositiveIntegerField()
+
+    objects = CategoryClosureManager()
+
+    class Meta:
+        app_label = 'core'
+        unique_together = (('ancestor', 'descendant'),)
+        verbose_name = _('Category closure')
+        verbose_name_plural = _('Category closures')
+
+    def __unicode__(self):
+        return u'%s > %s' % (self.ancestor, self.descendant)
+
+
 class Dependency(models.Model):
     """
     Captures relations between objects to simplify finding out what other objects
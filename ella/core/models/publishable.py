@@ -1,3 +1,4 @@
+import django
 from django.db import models
 from django.conf import settings
 from django.utils.translation import ugettext_lazy as _, ugettext
@@ -11,12 +12,14 @@ from app_data import AppDataField
 
 from ella.core.box import Box
 from ella.core.cache import CachedGenericForeignKey, \
-    CachedForeignKey, ContentTypeForeignKey, CategoryForeignKey
+    CachedForeignKey, ContentTypeForeignKey, CategoryForeignKey, \
+    invalidate_cache_for_object, redis
+from ella.core.cache.utils import invalidation_batch
 from ella.core.conf import core_settings
 from ella.core.managers import ListingManager, RelatedManager, \
-    PublishableManager
-from ella.core.models.main import Author, Source
-from ella.core.signals import content_published, content_unpublished
+    PublishableManager, ListingFeedManager
+from ella.core.models.main import Author, Source, Category
+from ella.core.signals import content_published, content_unpublished, category_moved
 from ella.utils.timezone import now, localize
 
 
@@ -48,6 +51,8 @@ class Publishable(models.Model):
 
     # Authors and Sources
     authors = models.ManyToManyField(Author, verbose_name=_('Authors'))
+    # ids of authors kept in sync by update_author_ids, never written by save()
+    author_ids = models.TextField(blank=True, default='', editable=False)
     source = CachedForeignKey(Source, blank=True, null=True,
         verbose_name=_('Source'), on_delete=models.SET_NULL)
 
@@ -203,6 +208,11 @@ class Publishable(models.Model):
         if not self.last_updated:
             self.last_updated = self.publish_from
 
+        if old_self:
+            # author_ids are only written by update_author_ids, don't overwrite
+            # them with a value that may have changed since the object was loaded
+            self.author_ids = old_self.author_ids
+
         super(Publishable, self).save(**kwargs)
 
         if send_signal:
@@ -221,6 +231,60 @@ class Publishable(models.Model):
         return self.published and cur_time > self.publish_from and \
             (self.publish_to is None or cur_time < self.publish_to)
 
+    def get_author_ids(self):
+        return [int(pk) for pk in self.author_ids.split(',') if pk]
+
+    def get_authors(self):
+        " Authors loaded through the object cache, see PublishableManager.load_authors. "
+        if not hasattr(self, '_authors_cache'):
+            Publishable.objects.load_authors([self])
+        return self._authors_cache
+
+
+def update_author_ids(sender, instance, action, reverse, pk_set, **kwargs):
+    " Keep Publishable.author_ids in sync with the authors relation. "
+    if reverse:
+        # instance is an Author, remember its publishables before they are gone
+        if action == 'pre_clear':
+            instance._cleared_publishable_ids = list(sender.objects.filter(author=instance).values_list('publishable_id', flat=True))
+            return
+        if action == 'post_clear':
+            pk_set = getattr(instance, '_cleared_publishable_ids', [])
+        publishable_ids = list(pk_set)
+    else:
+        publishable_ids = [instance.pk]
+
+    if action not in ('post_add', 'post_remove', 'post_clear') or not publishable_ids:
+        return
+
+    # ids of all the publishables in one query, one UPDATE per distinct value
+    author_ids = dict((pk, []) for pk in publishable_ids)
+    for publishable_id, author_id in sender.objects.filter(publishable__in=publishable_ids).order_by(
+            'author').values_list('publishable_id', 'author_id'):
+        author_ids[publishable_id].append(str(author_id))
+    by_value = {}
+    for pk, ids in author_ids.iteritems():
+        by_value.setdefault(','.join(ids), []).append(pk)
+
+    with invalidation_batch():
+        for value, pks in by_value.iteritems():
+            Publishable.objects.filter(pk__in=pks).update(author_ids=value)
+        for pk in publishable_ids:
+            invalidate_cache_for_object(Publishable(pk=pk))
+
+    if not reverse:
+        instance.author_ids = ','.join(author_ids[instance.pk])
+        # drop authors loaded for the previous ids
+        instance.__dict__.pop('_authors_cache', None)
+
+
+def authors_changed(sender, **kwargs):
+    update_author_ids(sender, **kwargs)
+    if core_settings.USE_REDIS_FOR_LISTINGS:
+        redis.update_authors(sender, **kwargs)
+
+models.signals.m2m_changed.connect(authors_changed, sender=Publishable.authors.through)
+
 
 def ListingBox(listing, *args, **kwargs):
     " Delegate the boxing to the target's Box class. "
@@ -279,6 +343,39 @@ class Listing(models.Model):
         return self.get_absolute_url(domain=True)
 
 
+class ListingFeed(models.Model):
+    """
+    Denormalized ``Listing`` used by ``ella.core.managers.FeedListingHandler``,
+    one row per listing of a published publishable and every category and
+    children mode the listing appears in, propagation of listings to parent
+    categories is already applied. Publishables listed several times are
+    de-duplicated when reading.
+    """
+    category = models.ForeignKey(Category, related_name='listing_feed_set')
+    children = models.PositiveSmallIntegerField()
+    listing = models.ForeignKey(Listing)
+    listing_category = models.ForeignKey(Category, related_name='+')
+    publishable = models.ForeignKey(Publishable)
+    content_type = models.ForeignKey(ContentType)
+    publish_from = models.DateTimeField()
+    publish_to = models.DateTimeField(null=True, blank=True)
+    commercial = models.BooleanField(default=False)
+
+    objects = ListingFeedManager()
+
+    class Meta:
+        app_label = 'core'
+        unique_together = (('category', 'children', 'listing'),)
+        if django.VERSION >= (1, 5):
+            # listings of a category are read by publish_from
+            index_together = (('category', 'children', 'publish_from'),)
+        verbose_name = _('Listing feed')
+        verbose_name_plural = _('Listing feeds')
+
+    def __unicode__(self):
+        return u'%s in %s/%s' % (self.publishable_id, self.category_id, self.children)
+
+
 class Related(models.Model):
     """
     Related objects - model for recording related ``Publishable`` objects.
@@ -303,3 +400,23 @@ class Related(models.Model):
         return _(u'%(pub)s relates to %(rel)s') % {'pub': self.publishable, 'rel': self.related}
 
 
+def update_listing_feed(sender, instance=None, publishable=None, **kwargs):
+    if instance is not None:
+        publishable = instance.publishable
+        # the publishable is being deleted together with the listing
+        if not Publishable.objects.filter(pk=publishable.pk).exists():
+            return
+    ListingFeed.objects.update_publishable(publishable)
+
+
+def update_listing_feed_of_category(sender, category, **kwargs):
+    ListingFeed.objects.update_category(category)
+
+
+def connect_listing_feed_signals():
+    " Keep ``ListingFeed`` up to date, only needed when it's being used. "
+    models.signals.post_save.connect(update_listing_feed, sender=Listing, dispatch_uid='ella.core.ListingFeed')
+    models.signals.post_delete.connect(update_listing_feed, sender=Listing, dispatch_uid='ella.core.ListingFeed')
+    content_published.connect(update_listing_feed, dispatch_uid='ella.core.ListingFeed')
+    content_unpublished.connect(update_listing_feed, dispatch_uid='ella.core.ListingFeed')
+    category_moved.connect(update_listing_feed_of_category, dispatch_uid='ella.core.ListingFeed')
@@ -1,16 +1,19 @@
 from django import forms
 from django import template
+from django.core.paginator import InvalidPage
 from django.http import Http404
 from django.utils.translation import ugettext_lazy as _
 
 from app_data import app_registry, AppDataForm, AppDataContainer
 
 from ella.core.models import Category, Listing
-from ella.core.managers import ListingHandler
+from ella.core.models.publishable import connect_listing_feed_signals
+from ella.core.managers import ListingHandler, FeedListingHandler
 from ella.core.conf import core_settings
 from ella.core.cache.redis import connect_signals
+from ella.core.cache.listings import connect_signals as connect_count_signals
 from ella.core.cache.utils import connect_invalidation_signals
-from ella.utils.pagination import FirstPagePaginator
+from ella.utils.pagination import FirstPagePaginator, CursorPaginator
 
 
 LISTING_CHOICES = (
@@ -56,6 +59,16 @@ class EllaAppDataContainer(AppDataContainer):
 
         return paginator.page(page_no)
 
+    def get_listings_page_after(self, cursor=None, paginate_by=None, first_page_count=None, **kwargs):
+        " Page of listings following ``cursor``, see CursorPaginator. "
+        paginator = CursorPaginator(self.get_listings(**kwargs),
+                                    paginate_by or self.paginate_by,
+                                    first_page_count=first_page_count or self.first_page_count)
+        try:
+            return paginator.page_after(cursor)
+        except InvalidPage:
+            raise Http404(_('Invalid cursor %r') % cursor)
+
     @property
     def child_behavior(self):
         if self.child_listings is None:
@@ -71,6 +84,13 @@ connect_signals()
 # connect cache invalidation signals
 connect_invalidation_signals()
 
+# keep listing counts up to date
+connect_count_signals()
+
+# maintain the listing feed table if it's used
+if any(issubclass(Listing.objects.get_listing_handler(s), FeedListingHandler) for s in core_settings.LISTING_HANDLERS):
+    connect_listing_feed_signals()
+
 # add core templatetags to builtin so that you don't have to invoke {% load core %} in every template
 template.add_to_builtins('ella.core.templatetags.core')
 # keep this here for backwards compatibility
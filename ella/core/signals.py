@@ -6,6 +6,10 @@ content_published = Signal(providing_args=['publishable'])
 # and when it's taken down
 content_unpublished = Signal(providing_args=['publishable'])
 
+# category moved in the tree or changed its propagate_listings, listings of
+# its subtree now appear in other ancestors (CategoryClosure is already rebuilt)
+category_moved = Signal(providing_args=['category', 'old_ancestors'])
+
 # category or publishable is about to be rendered
 object_rendering = Signal(providing_args=['request', 'category', 'publishable'])
 
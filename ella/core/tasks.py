@@ -8,10 +8,13 @@ try:
 
     from celery.task import periodic_task
 
-    from ella.core.management import generate_publish_signals, regenerate_listing_handlers
+    from ella.core.conf import core_settings
+    from ella.core.management import generate_publish_signals, regenerate_listing_handlers, warm_caches
 
     periodic_task(run_every=timedelta(minutes=5))(generate_publish_signals)
     periodic_task(run_every=timedelta(hours=3))(regenerate_listing_handlers)
+    if core_settings.CACHE_WARM_INTERVAL:
+        periodic_task(run_every=timedelta(minutes=core_settings.CACHE_WARM_INTERVAL))(warm_caches)
 except ImportError:
     # celery not installed
     pass
@@ -5,10 +5,11 @@ from django.db import models
 from django.utils.encoding import smart_str
 from django.utils.safestring import mark_safe
 from django.template.defaultfilters import stringfilter
+from django.template.defaulttags import IfNode
 from django.contrib.contenttypes.models import ContentType
 
 from ella.core.models import Listing, Category
-from ella.core.managers import ListingHandler
+from ella.core.managers import ListingHandler, get_excluded
 from ella.core.cache.utils import get_cached_object
 from ella.core.box import Box
 
@@ -17,12 +18,20 @@ log = logging.getLogger('ella.core.templatetags')
 register = template.Library()
 
 
+# context variable holding listings fetched by {% batchlistings %}
+BATCH_LISTINGS_VAR = '__ella_batch_listings'
+
+
 class ListingNode(template.Node):
     def __init__(self, var_name, parameters):
         self.var_name = var_name
         self.parameters = parameters
 
-    def render(self, context):
+    def get_handler(self, context):
+        """
+        Return the listing handler and (offset, count) the tag asks for,
+        along with a key identifying the request.
+        """
         params = {}
         for key, value in self.parameters.items():
             if isinstance(value, template.Variable):
@@ -40,12 +49,113 @@ class ListingNode(template.Node):
         if 'count' in params:
             limits['count'] = params.pop('count')
 
+        offset, count = limits.get('offset', 0), limits.get('count', 10)
+        category = params.get('category')
+        key = (
+            params.get('source', 'default'),
+            category.pk if category else None,
+            params.get('children', ListingHandler.NONE),
+            tuple(ct.pk for ct in params.get('content_types', [])),
+            tuple(p.pk for p in get_excluded(params.get('exclude'))),
+            offset, count,
+        )
+
         lh = Listing.objects.get_queryset_wrapper(**params)
+        return lh, offset, count, key
 
-        context[self.var_name] = lh.get_listings(**limits)
+    def render(self, context):
+        lh, offset, count, key = self.get_handler(context)
+
+        batch = context.get(BATCH_LISTINGS_VAR, {})
+        if key in batch:
+            context[self.var_name] = batch[key]
+        else:
+            context[self.var_name] = lh.get_listings(offset, count)
         return ''
 
 
+def _get_rendered_listing_nodes(nodelist, context):
+    """
+    ``ListingNode``s within ``nodelist`` skipping branches of ``{% if %}`` tags
+    that won't be rendered in ``context``.
+    """
+    nodes = []
+    for node in nodelist:
+        if isinstance(node, ListingNode):
+            nodes.append(node)
+        elif isinstance(node, IfNode) and hasattr(node, 'conditions_nodelists'):
+            for condition, branch in node.conditions_nodelists:
+                try:
+                    match = condition is None or condition.eval(context)
+                except template.VariableDoesNotExist:
+                    match = None
+                if match:
+                    nodes.extend(_get_rendered_listing_nodes(branch, context))
+                    break
+        else:
+            for attr in node.child_nodelists:
+                nodes.extend(_get_rendered_listing_nodes(getattr(node, attr, None) or [], context))
+    return nodes
+
+
+class BatchListingsNode(template.Node):
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def render(self, context):
+        requests = {}
+        for node in _get_rendered_listing_nodes(self.nodelist, context):
+            try:
+                lh, offset, count, key = node.get_handler(context)
+            except Exception:
+                # depends on variables set inside the block or is broken,
+                # either way leave it to the tag's own render
+                continue
+            requests.setdefault(lh.__class__, {}).setdefault(key, (lh, offset, count))
+
+        batch = dict(context.get(BATCH_LISTINGS_VAR, {}))
+        for handler_class, handler_requests in requests.items():
+            keys = handler_requests.keys()
+            listings = handler_class.get_listings_many([handler_requests[k] for k in keys])
+            batch.update(zip(keys, listings))
+
+        context.update({BATCH_LISTINGS_VAR: batch})
+        try:
+            return self.nodelist.render(context)
+        finally:
+            context.pop()
+
+
+@register.tag
+def batchlistings(parser, token):
+    """
+    Fetch the listings of all ``{% listing %}`` tags inside the block (and
+    inside blocks it contains) at once before rendering it - one redis
+    pipeline or one cache read per listing handler and one load of all the
+    publishables instead of separate round trips for every tag. Identical
+    listings are only fetched once.
+
+    Tags in branches of ``{% if %}`` that won't be rendered are skipped, tags
+    depending on variables that are only set inside the block (for loops,
+    ``{% with %}`` etc.) fetch their listings separately as usual.
+
+    Usage::
+
+        {% batchlistings %}
+            {% listing 10 for "home_page" as obj_list %}
+            {% listing 5 of articles.article for category with children as articles %}
+            ...
+        {% endbatchlistings %}
+
+    """
+    bits = token.split_contents()
+    if len(bits) != 1:
+        raise template.TemplateSyntaxError, "%r tag takes no arguments" % bits[0]
+    nodelist = parser.parse(('end' + bits[0],))
+    parser.delete_first_token()
+    return BatchListingsNode(nodelist)
+
+
 @register.tag
 def listing(parser, token):
     """
@@ -68,7 +178,8 @@ def listing(parser, token):
                                             or variable containing a Category object.
         ``children``                        Include items from direct subcategories.
         ``descendents``                     Include items from all descend subcategories.
-        ``exclude``                         Variable including a ``Publishable`` to omit.
+        ``exclude``                         Variable including a ``Publishable`` (or a
+                                            list of them) to omit.
         ``using``                           Name of Listing Handler ro use
         ``result``                          Store the resulting list in context under given
                                             name.
@@ -82,6 +193,7 @@ def listing(parser, token):
         {% listing 10 of articles.article for category with descendents as obj_list %}
         {% listing 10 from 10 of articles.article as obj_list %}
         {% listing 10 of articles.article, photos.photo as obj_list %}
+        {% listing 10 for category without object as obj_list %}
 
     """
     var_name, parameters = listing_parse(token.split_contents())
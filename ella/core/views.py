@@ -3,15 +3,18 @@ from datetime import datetime, timedelta
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
-from django.http import Http404
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse
 from django.shortcuts import redirect, render
 from django.template.defaultfilters import slugify
 from django.template.response import TemplateResponse
+from django.utils import simplejson
 from django.utils.translation import ugettext_lazy as _
 from django.views.generic.list import ListView
 
 from ella.core.models import Listing, Category, Publishable, Author
-from ella.core.cache import get_cached_object_or_404, cache_this, get_cached_object
+from ella.core.cache import get_cached_object_or_404, cache_this, get_cached_object, \
+    prefetch_cached, stats
 from ella.core import custom_urls
 from ella.core.conf import core_settings
 from ella.core.signals import object_rendering, object_rendered
@@ -406,6 +409,9 @@ class ListContentType(EllaCoreView):
 
         # add pagination
         page = ella_data.get_listings_page(page_no, **kwa)
+        # resolve photos, sources and authors of all listed objects at once
+        prefetch_cached(page.object_list, 'publishable__photo', 'publishable__source')
+        Publishable.objects.load_authors([l.publishable for l in page.object_list])
         context.update({
             'is_paginated': page.has_other_pages(),
             'results_per_page': page.paginator.per_page,
@@ -534,7 +540,9 @@ def get_export_key(request, count, name='', content_type=None):
             settings.SITE_ID, count, name, content_type
         )
 
-@cache_this(get_export_key, timeout=core_settings.CACHE_TIMEOUT_LONG)
+@cache_this(get_export_key,
+    timeout=core_settings.CACHE_TIMEOUT_LONG + core_settings.CACHE_STALE_TIMEOUT,
+    refresh_timeout=core_settings.CACHE_TIMEOUT_LONG)
 def export(request, count, name='', content_type=None):
     """
     Export banners.
@@ -562,6 +570,15 @@ def export(request, count, name='', content_type=None):
         )
 
 
+@staff_member_required
+def cache_stats(request):
+    """
+    Numbers collected by the CACHE_STATS_BACKEND as JSON, not part of the
+    default urls, hook it up where appropriate.
+    """
+    return HttpResponse(simplejson.dumps(stats.get_stats()), content_type='application/json')
+
+
 ##
 # Error handlers
 ##
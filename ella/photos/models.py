@@ -17,6 +17,7 @@ from django.template.defaultfilters import slugify
 from app_data import AppDataField
 
 from ella.core.models.main import Author, Source
+from ella.core.cache import stats
 from ella.core.cache.utils import get_cached_object
 from ella.photos.conf import photos_settings
 from ella.utils.timezone import now
@@ -276,15 +277,18 @@ class FormatedPhotoManager(models.Manager):
         if not isinstance(format, Format):
             format = Format.objects.get_for_name(format)
 
+        group = 'photos.format:%s' % format.name
         if redis:
             p = redis.pipeline()
             p.hgetall(REDIS_PHOTO_KEY % photo_id)
             p.hgetall(REDIS_FORMATTED_PHOTO_KEY % (photo_id, format.id))
             original, formatted = p.execute()
             if formatted:
+                stats.incr(group, 'hits')
                 if include_original:
                     formatted['original'] = original
                 return formatted
+        stats.incr(group, 'misses')
 
         if not photo:
             try:
@@ -298,7 +302,9 @@ class FormatedPhotoManager(models.Manager):
             try:
                 # use get or create because there is a possible race condition here
                 # we don't want to JUST use get_or_create to go through cache 99.9% of the time
-                formated_photo, _ = self.get_or_create(photo=photo, format=format)
+                stats.incr(group, 'db_fetches')
+                with stats.timer(group, 'db_time'):
+                    formated_photo, _ = self.get_or_create(photo=photo, format=format)
             except (IOError, SystemError), e:
                 log.warning("Cannot create formatted photo due to %s.", e)
                 return format.get_blank_img()
@@ -9,6 +9,7 @@ from django.core.exceptions import ValidationError
 from ella.core.box import Box
 from ella.core.cache import cache_this, CachedGenericForeignKey, \
     CategoryForeignKey, ContentTypeForeignKey, get_cached_object
+from ella.core.conf import core_settings
 from ella.utils import timezone
 
 
@@ -22,7 +23,9 @@ def get_position_key(self, category, name, nofallback=False):
 
 
 class PositionManager(models.Manager):
-    @cache_this(get_position_key)
+    @cache_this(get_position_key,
+        timeout=core_settings.CACHE_TIMEOUT + core_settings.CACHE_STALE_TIMEOUT,
+        refresh_timeout=core_settings.CACHE_TIMEOUT)
     def get_active_position(self, category, name, nofallback=False):
         """
         Get active position for given position name.
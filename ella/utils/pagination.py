@@ -1,6 +1,6 @@
 from math import ceil
 
-from django.core.paginator import Paginator, Page
+from django.core.paginator import Paginator, Page, InvalidPage
 
 
 class FirstPagePaginator(Paginator):
@@ -35,3 +35,45 @@ class FirstPagePaginator(Paginator):
         return self._num_pages
 
     num_pages = property(_get_num_pages)
+
+
+class CursorPage(Page):
+    """
+    Page of a ``CursorPaginator``, ``cursor`` is the one it was requested
+    with, ``next_cursor`` continues after its last item (None on the last
+    page).
+    """
+    def __init__(self, object_list, cursor, next_cursor, paginator):
+        super(CursorPage, self).__init__(object_list, None, paginator)
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+
+    def __repr__(self):
+        return '<Page after %r>' % self.cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.cursor is not None
+
+
+class CursorPaginator(FirstPagePaginator):
+    """
+    ``FirstPagePaginator`` over a listing handler that can also seek to a
+    cursor instead of an offset, so that deep pages are as cheap as the
+    first one.
+    """
+    def page_after(self, cursor=None):
+        count = self.first_page_count if cursor is None else self.per_page
+        # one more to tell whether there is a next page
+        try:
+            object_list = self.object_list.get_listings_after(cursor, count + 1)
+        except ValueError:
+            raise InvalidPage('Invalid cursor %r' % cursor)
+
+        next_cursor = None
+        if len(object_list) > count:
+            object_list = object_list[:count]
+            next_cursor = self.object_list.get_cursor(object_list[-1])
+        return CursorPage(object_list, cursor, next_cursor, self)
@@ -56,6 +56,7 @@ INSTALLED_APPS = (
 LISTING_HANDLERS = {
     'default': 'ella.core.managers.ModelListingHandler',
     'redis': 'ella.core.cache.redis.TimeBasedListingHandler',
+    'feed': 'ella.core.managers.FeedListingHandler',
 }
 LISTINGS_REDIS = {}
 USE_REDIS_FOR_LISTINGS = True
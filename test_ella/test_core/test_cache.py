@@ -7,14 +7,22 @@ from hashlib import md5
 from test_ella.cases import RedisTestCase as TestCase
 from django.test.client import RequestFactory
 from django.contrib.sites.models import Site
+from django.contrib.sessions.models import Session
 from django.contrib.contenttypes.models import ContentType
 
-from ella.core.cache import utils, redis
-from ella.core.models import Listing, Publishable
+from ella.core.cache import utils, redis, stats
+from ella.core.cache.fields import prefetch_cached
+from ella.core.cache.listings import get_generation
+from ella.core.cache.local import LocalCache
+from ella.core.models import Listing, Publishable, Related, Source, Category
 from ella.core.views import ListContentType
-from ella.core.managers import ListingHandler
+from ella.core.middleware import IdentityMapMiddleware, InvalidationBatchMiddleware, \
+    CacheStatsMiddleware
+from ella.core import management
+from ella.core.management import warm_caches, Throttle
+from ella.core.managers import ListingHandler, get_listings_key
 from ella.articles.models import Article
-from ella.utils.timezone import from_timestamp, now
+from ella.utils.timezone import from_timestamp, to_timestamp, now
 
 from test_ella.test_core import create_basic_categories, create_and_place_a_publishable, \
         create_and_place_more_publishables, list_all_publishables_in_category_by_hour
@@ -25,6 +33,7 @@ class CacheTestCase(TestCase):
     def setUp(self):
         self.old_cache = utils.cache
         self.cache = get_cache('locmem://')
+        self.cache.clear()
         utils.cache = self.cache
         super(CacheTestCase, self).setUp()
 
@@ -88,17 +97,688 @@ class TestCacheUtils(CacheTestCase):
             utils._get_key(utils.KEY_PREFIX, ContentType.objects.get_for_model(Article), pk=123)
         )
 
+class TestVersionedObjectKeys(CacheTestCase):
+    def setUp(self):
+        super(TestVersionedObjectKeys, self).setUp()
+        self.calls = []
+        get = self.cache.get
+        def counting_get(key, *args, **kwargs):
+            self.calls.append(key)
+            return get(key, *args, **kwargs)
+        def counting_get_many(keys):
+            self.calls.append(keys)
+            # locmem's get_many is implemented using get
+            return dict((k, get(k)) for k in keys if get(k) is not None)
+        self.cache.get_many = counting_get_many
+        self.cache.get = counting_get
+        self.ct = ContentType.objects.get_for_model(ContentType)
+        self.pks = [ct.pk for ct in ContentType.objects.order_by('pk')[:5]]
+
+    def test_get_many_objects_uses_single_round_trip(self):
+        utils.get_cached_objects(self.pks, self.ct)
+        self.calls = []
+
+        with self.assertNumQueries(0):
+            objs = utils.get_cached_objects(self.pks, self.ct)
+        tools.assert_equals(list(ContentType.objects.filter(pk__in=self.pks).order_by('pk')), objs)
+        tools.assert_equals(1, len(self.calls))
+
+    def test_get_object_uses_single_round_trip(self):
+        utils.get_cached_object(self.ct, pk=self.ct.pk)
+        self.calls = []
+
+        tools.assert_equals(self.ct, utils.get_cached_object(self.ct, pk=self.ct.pk))
+        tools.assert_equals(1, len(self.calls))
+
+    def test_outdated_version_is_a_miss(self):
+        utils.get_cached_objects(self.pks, self.ct)
+        ContentType.objects.get(pk=self.pks[0]).save()
+
+        keys = [utils._get_key(utils.KEY_PREFIX, self.ct, pk=pk, versioned=False) for pk in self.pks]
+        found, versions = utils._get_many_versioned(keys)
+        tools.assert_equals(set(keys[1:]), set(found.keys()))
+        tools.assert_equals(self.cache.get(keys[0] + ':VER'), versions[keys[0]])
+        tools.assert_equals(0, versions[keys[1]])
+
+class TestStampedeProtection(CacheTestCase):
+    def setUp(self):
+        super(TestStampedeProtection, self).setUp()
+        self.ct = ContentType.objects.get_for_model(ContentType)
+        self.key = utils._get_key(utils.KEY_PREFIX, self.ct, pk=self.ct.pk, versioned=False)
+
+    def test_outdated_object_is_used_while_locked(self):
+        utils.get_cached_object(self.ct, pk=self.ct.pk)
+        self.ct.save()
+        self.cache.add(self.key + ':LOCK', 1)
+
+        with self.settings(CACHE_LOCK_TIMEOUT=10):
+            with self.assertNumQueries(0):
+                tools.assert_equals(self.ct, utils.get_cached_object(self.ct, pk=self.ct.pk))
+
+    def test_object_is_fetched_when_lock_wait_expires(self):
+        self.cache.add(self.key + ':LOCK', 1)
+
+        with self.settings(CACHE_LOCK_TIMEOUT=10, CACHE_LOCK_WAIT=0):
+            with self.assertNumQueries(1):
+                tools.assert_equals(self.ct, utils.get_cached_object(self.ct, pk=self.ct.pk))
+
+    def test_lock_is_released_after_fetch(self):
+        with self.settings(CACHE_LOCK_TIMEOUT=10):
+            utils.get_cached_object(self.ct, pk=self.ct.pk)
+        tools.assert_equals(None, self.cache.get(self.key + ':LOCK'))
+
+    def test_cache_this_releases_lock(self):
+        @utils.cache_this(lambda: 'key')
+        def f():
+            return 42
+
+        with self.settings(CACHE_LOCK_TIMEOUT=10):
+            tools.assert_equals(42, f())
+        tools.assert_equals(None, self.cache.get('key:LOCK'))
+
+    def test_cache_this_computes_result_when_lock_wait_expires(self):
+        @utils.cache_this(lambda: 'key')
+        def f():
+            return 42
+
+        self.cache.add('key:LOCK', 1)
+        with self.settings(CACHE_LOCK_TIMEOUT=10, CACHE_LOCK_WAIT=0):
+            tools.assert_equals(42, f())
+
+class TestCacheThis(CacheTestCase):
+    def setUp(self):
+        super(TestCacheThis, self).setUp()
+        self.calls = []
+
+    def cached(self, **kwargs):
+        @utils.cache_this(lambda value: 'key', **kwargs)
+        def f(value):
+            self.calls.append(value)
+            return value
+        return f
+
+    def test_none_result_is_cached(self):
+        f = self.cached()
+        tools.assert_equals(None, f(None))
+        tools.assert_equals(None, f(None))
+        tools.assert_equals([None], self.calls)
+
+    def test_fresh_value_is_served_from_cache(self):
+        f = self.cached(refresh_timeout=60)
+        f(1)
+        tools.assert_equals(1, f(2))
+        tools.assert_equals([1], self.calls)
+
+    def test_stale_value_is_refreshed(self):
+        f = self.cached(refresh_timeout=-1)
+        f(1)
+        tools.assert_equals(2, f(2))
+        tools.assert_equals(None, self.cache.get('key:REFRESH'))
+
+    def test_stale_value_is_served_while_being_refreshed(self):
+        f = self.cached(refresh_timeout=-1)
+        f(1)
+        self.cache.add('key:REFRESH', 1)
+        tools.assert_equals(1, f(2))
+        tools.assert_equals([1], self.calls)
+
+    def test_get_many_reads_cached_values_at_once(self):
+        @utils.cache_this(lambda value: 'key:%s' % value)
+        def f(value):
+            self.calls.append(value)
+            return value
+        f(1)
+        get = self.cache.get
+        def counting_get_many(keys):
+            self.calls.append(sorted(keys))
+            # locmem's get_many is implemented using get
+            return dict((k, get(k)) for k in keys if get(k) is not None)
+        self.cache.get_many = counting_get_many
+        self.cache.get = lambda key, *args, **kwargs: self.calls.append(key) or get(key, *args, **kwargs)
+        try:
+            tools.assert_equals([1, 2, 2], f.get_many([((1, ), {}), ((2, ), {}), ((2, ), {})]))
+        finally:
+            del self.cache.get, self.cache.get_many
+        tools.assert_equals([1, ['key:1', 'key:2'], 2], self.calls)
+        tools.assert_equals(2, f(2))
+
+    def test_value_cached_in_other_format_is_a_miss(self):
+        f = self.cached(refresh_timeout=60)
+        # stored as (refresh_at, result) by an older version
+        self.cache.set('key', (None, 1))
+        tools.assert_equals(2, f(2))
+        tools.assert_equals(2, f(3))
+        tools.assert_equals([2], self.calls)
+
+    def test_timeout_can_be_computed_per_call(self):
+        timeouts = []
+        def timeout(value):
+            timeouts.append(value)
+            return 60
+        f = self.cached(timeout=timeout)
+        f(1)
+        tools.assert_equals([1], timeouts)
+
+class TestNegativeCaching(CacheTestCase):
+    def setUp(self):
+        super(TestNegativeCaching, self).setUp()
+        self.settings_override = self.settings(CACHE_MISSING_TIMEOUT=60)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        super(TestNegativeCaching, self).tearDown()
+
+    def test_missing_object_is_remembered(self):
+        tools.assert_raises(Site.DoesNotExist, utils.get_cached_object, Site, pk=100)
+        with self.assertNumQueries(0):
+            tools.assert_raises(Site.DoesNotExist, utils.get_cached_object, Site, pk=100)
+
+    def test_missing_object_is_forgotten_once_created(self):
+        tools.assert_raises(Site.DoesNotExist, utils.get_cached_object, Site, pk=100)
+        site = Site.objects.create(pk=100, domain='example.org', name='example.org')
+        tools.assert_equals(site, utils.get_cached_object(Site, pk=100))
+
+    def test_missing_lookup_is_forgotten_once_created(self):
+        tools.assert_raises(Site.DoesNotExist, utils.get_cached_object, Site, domain='example.org')
+        with self.assertNumQueries(0):
+            tools.assert_raises(Site.DoesNotExist, utils.get_cached_object, Site, domain='example.org')
+        site = Site.objects.create(domain='example.org', name='example.org')
+        tools.assert_equals(site, utils.get_cached_object(Site, domain='example.org'))
+
+    def test_get_cached_object_or_404_uses_remembered_miss(self):
+        from django.http import Http404
+        tools.assert_raises(Http404, utils.get_cached_object_or_404, Site, pk=100)
+        with self.assertNumQueries(0):
+            tools.assert_raises(Http404, utils.get_cached_object_or_404, Site, pk=100)
+
+    def test_get_many_objects_remembers_missing(self):
+        site_ct = ContentType.objects.get_for_model(Site)
+        utils.get_cached_objects([(site_ct.id, 1), (site_ct.id, 100)], missing=utils.SKIP)
+        with self.assertNumQueries(0):
+            objs = utils.get_cached_objects([(site_ct.id, 1), (site_ct.id, 100)], missing=utils.SKIP)
+        tools.assert_equals([Site.objects.get(pk=1)], objs)
+
+class TestCompactObjects(CacheTestCase):
+    def setUp(self):
+        super(TestCompactObjects, self).setUp()
+        self.settings_override = self.settings(CACHE_COMPACT_OBJECTS=True)
+        self.settings_override.enable()
+        create_basic_categories(self)
+        create_and_place_a_publishable(self)
+        self.key = utils._get_key(utils.KEY_PREFIX, ContentType.objects.get_for_model(Article), pk=self.publishable.pk, versioned=False)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        super(TestCompactObjects, self).tearDown()
+
+    def test_object_is_stored_as_field_values(self):
+        utils.get_cached_object(Publishable, pk=self.publishable.pk)
+        version, packed = self.cache.get(self.key)
+        tools.assert_equals(utils.PACKED, packed[0])
+        tools.assert_true(self.publishable.title in packed[3])
+
+    def test_object_is_rehydrated(self):
+        utils.get_cached_object(Publishable, pk=self.publishable.pk)
+        with self.assertNumQueries(0):
+            a = utils.get_cached_object(Publishable, pk=self.publishable.pk)
+        tools.assert_true(isinstance(a, Article))
+        tools.assert_equals(self.publishable, a)
+        tools.assert_equals(self.publishable.content, a.content)
+        tools.assert_equals(self.publishable.category_id, a.category_id)
+        tools.assert_false(a._state.adding)
+
+    def test_get_many_objects_rehydrates_objects(self):
+        utils.get_cached_objects([self.publishable.pk], Publishable)
+        with self.assertNumQueries(0):
+            tools.assert_equals([self.publishable], utils.get_cached_objects([self.publishable.pk], Publishable))
+
+    def test_object_with_different_field_layout_is_ignored(self):
+        utils.get_cached_object(Publishable, pk=self.publishable.pk)
+        version, packed = self.cache.get(self.key)
+        self.cache.set(self.key, (version, packed[:2] + ('outdated', packed[3])))
+        with self.assertNumQueries(2):
+            tools.assert_equals(self.publishable, utils.get_cached_object(Publishable, pk=self.publishable.pk))
+
+class TestLocalCache(CacheTestCase):
+    def setUp(self):
+        super(TestLocalCache, self).setUp()
+        self.old_local_cache = utils.local_cache
+        utils.local_cache = LocalCache(10, 60)
+        self.ct = ContentType.objects.get_for_model(ContentType)
+
+    def tearDown(self):
+        utils.local_cache = self.old_local_cache
+        super(TestLocalCache, self).tearDown()
+
+    def test_evicts_least_recently_used(self):
+        lc = LocalCache(2, 60)
+        lc.set('a', 1)
+        lc.set('b', 2)
+        lc.get('a')
+        lc.set('c', 3)
+        tools.assert_equals({'a': 1, 'c': 3}, lc.get_many(['a', 'b', 'c']))
+
+    def test_expired_values_are_not_returned(self):
+        lc = LocalCache(2, -1)
+        lc.set('a', 1)
+        tools.assert_equals(None, lc.get('a'))
+
+    def test_disabled_cache_stores_nothing(self):
+        lc = LocalCache(0, 60)
+        lc.set('a', 1)
+        tools.assert_equals(0, len(lc))
+
+    def test_object_is_served_without_the_shared_cache(self):
+        utils.get_cached_object(self.ct, pk=self.ct.pk)
+        self.cache.clear()
+        self.assertNumQueries(0, lambda: utils.get_cached_object(self.ct, pk=self.ct.pk))
+        tools.assert_equals(self.ct, utils.get_cached_object(self.ct, pk=self.ct.pk))
+
+    def test_get_many_objects_uses_local_cache(self):
+        site_ct = ContentType.objects.get_for_model(Site)
+        utils.get_cached_object(self.ct, pk=self.ct.pk)
+        self.cache.clear()
+        objs = utils.get_cached_objects([self.ct.pk, site_ct.pk], self.ct)
+        tools.assert_equals([self.ct, site_ct], objs)
+        self.cache.clear()
+        self.assertNumQueries(0, lambda: utils.get_cached_objects([self.ct.pk, site_ct.pk], self.ct))
+
+    def test_save_removes_object_from_local_cache(self):
+        utils.get_cached_object(self.ct, pk=self.ct.pk)
+        self.ct.save()
+        tools.assert_equals(0, len(utils.local_cache))
+
+class TestIdentityMap(CacheTestCase):
+    def setUp(self):
+        super(TestIdentityMap, self).setUp()
+        self.middleware = IdentityMapMiddleware()
+        self.middleware.process_request(None)
+        self.ct = ContentType.objects.get_for_model(ContentType)
+
+    def tearDown(self):
+        self.middleware.process_response(None, None)
+        super(TestIdentityMap, self).tearDown()
+
+    def test_same_instance_is_returned_within_request(self):
+        ct = utils.get_cached_object(self.ct, pk=self.ct.pk)
+        tools.assert_true(ct is utils.get_cached_object(self.ct, pk=self.ct.pk))
+        tools.assert_true(ct is utils.get_cached_objects([self.ct.pk], self.ct)[0])
+
+    def test_object_is_not_fetched_twice_within_request(self):
+        utils.get_cached_object(self.ct, pk=self.ct.pk)
+        self.cache.clear()
+        self.assertNumQueries(0, lambda: utils.get_cached_object(self.ct, pk=self.ct.pk))
+
+    def test_get_many_objects_only_fetches_unknown_objects(self):
+        site_ct = ContentType.objects.get_for_model(Site)
+        utils.get_cached_object(self.ct, pk=self.ct.pk)
+        self.cache.clear()
+        with self.assertNumQueries(1):
+            objs = utils.get_cached_objects([self.ct.pk, site_ct.pk], self.ct)
+        tools.assert_equals([self.ct, site_ct], objs)
+
+    def test_save_removes_object_from_identity_map(self):
+        ct = utils.get_cached_object(self.ct, pk=self.ct.pk)
+        self.ct.save()
+        tools.assert_false(ct is utils.get_cached_object(self.ct, pk=self.ct.pk))
+
+    def test_nothing_is_remembered_after_request(self):
+        ct = utils.get_cached_object(self.ct, pk=self.ct.pk)
+        self.middleware.process_response(None, None)
+        tools.assert_false(ct is utils.get_cached_object(self.ct, pk=self.ct.pk))
+
+class TestCacheStats(CacheTestCase):
+    def setUp(self):
+        super(TestCacheStats, self).setUp()
+        self.settings_override = self.settings(
+            CACHE_STATS_BACKEND='ella.core.cache.stats.LocalStatsBackend',
+            CACHE_STATS_SAMPLE_RATE=1
+        )
+        self.settings_override.enable()
+        stats.reset()
+        self.ct = ContentType.objects.get_for_model(ContentType)
+        self.group = 'ella.obj:contenttypes.contenttype'
+
+    def tearDown(self):
+        stats.reset()
+        self.settings_override.disable()
+        super(TestCacheStats, self).tearDown()
+
+    def test_get_object_counts_hits_and_misses(self):
+        utils.get_cached_object(self.ct, pk=self.ct.pk)
+        utils.get_cached_object(self.ct, pk=self.ct.pk)
+        values = stats.get_stats()[self.group]
+        tools.assert_equals(1, values['misses'])
+        tools.assert_equals(1, values['db_fetches'])
+        tools.assert_equals(1, values['hits'])
+        tools.assert_equals(1, values['sampled'])
+        tools.assert_true(values['avg_bytes'] > 0)
+
+    def test_get_many_objects_counts_every_object(self):
+        site_ct = ContentType.objects.get_for_model(Site)
+        utils.get_cached_object(self.ct, pk=self.ct.pk)
+        utils.get_cached_objects([self.ct.pk, site_ct.pk], self.ct)
+        values = stats.get_stats()[self.group]
+        tools.assert_equals(2, values['misses'])
+        tools.assert_equals(1, values['hits'])
+        tools.assert_equals(2, values['db_fetches'])
+
+    def test_cache_this_counts_by_key_prefix(self):
+        @utils.cache_this(lambda: 'some.prefix:key')
+        def f():
+            return 42
+        f()
+        f()
+        values = stats.get_stats()['some.prefix']
+        tools.assert_equals(1, values['misses'])
+        tools.assert_equals(1, values['hits'])
+
+    def test_nothing_is_collected_when_turned_off(self):
+        with self.settings(CACHE_STATS_BACKEND=None):
+            utils.get_cached_object(self.ct, pk=self.ct.pk)
+        tools.assert_equals({}, stats.get_stats())
+
+class TestRedisCacheStats(TestCase):
+    def test_counters_are_stored_in_redis(self):
+        backend = stats.RedisStatsBackend()
+        backend.incr_many([('group', 'hits', 1), ('group', 'hits', 2), ('group', 'time', 0.5)])
+        tools.assert_equals({'group': {'hits': 3.0, 'time': 0.5}}, backend.get_stats())
+        backend.reset()
+        tools.assert_equals({}, backend.get_stats())
+
+    def test_counters_are_buffered_until_flush(self):
+        backend = stats.RedisStatsBackend()
+        backend.incr_many([('group', 'hits', 1), ('group', 'hits', 2)])
+        tools.assert_equals(set(), redis.client.smembers(backend.GROUPS_KEY))
+        backend.flush()
+        tools.assert_equals({'hits': '3'}, redis.client.hgetall(backend.GROUP_KEY % 'group'))
+
+    def test_counters_are_sent_after_flush_size_increments(self):
+        backend = stats.RedisStatsBackend()
+        with self.settings(CACHE_STATS_FLUSH_SIZE=3):
+            backend.incr_many([('group', 'hits', 1), ('group', 'misses', 1)])
+            tools.assert_equals({}, redis.client.hgetall(backend.GROUP_KEY % 'group'))
+            backend.incr_many([('group', 'hits', 1)])
+        tools.assert_equals({'hits': '2', 'misses': '1'}, redis.client.hgetall(backend.GROUP_KEY % 'group'))
+
+    def test_middleware_flushes_counters_of_the_request(self):
+        with self.settings(CACHE_STATS_BACKEND='ella.core.cache.stats.RedisStatsBackend'):
+            backend = stats.get_backend()
+            stats.incr('group', 'hits')
+            CacheStatsMiddleware().process_response(None, None)
+            tools.assert_equals({'hits': '1'}, redis.client.hgetall(backend.GROUP_KEY % 'group'))
+
+class TestCacheWarming(CacheTestCase):
+    def setUp(self):
+        super(TestCacheWarming, self).setUp()
+        create_basic_categories(self)
+        create_and_place_more_publishables(self)
+        list_all_publishables_in_category_by_hour(self)
+
+    def test_listed_objects_are_loaded(self):
+        warm_caches()
+        with self.assertNumQueries(0):
+            utils.get_cached_objects([p.pk for p in self.publishables], Publishable)
+
+    def test_listing_pages_are_loaded(self):
+        warm_caches()
+        with self.assertNumQueries(0):
+            list(self.category_nested.app_data.ella.get_listings_page(1, children=ListingHandler.ALL).object_list)
+
+    def test_urls_are_requested_over_http(self):
+        requested = []
+        class Response(object):
+            def getcode(self):
+                return 200
+            def close(self):
+                pass
+        urlopen = management.urllib2.urlopen
+        management.urllib2.urlopen = lambda url, timeout: requested.append(url) or Response()
+        try:
+            warm_caches(urls=['/', 'http://other.example.com/about/'])
+        finally:
+            management.urllib2.urlopen = urlopen
+        tools.assert_equals(['http://%s/' % Site.objects.get_current().domain, 'http://other.example.com/about/'], requested)
+
+    def test_throttle_limits_rate(self):
+        throttle = Throttle(100)
+        start = time.time()
+        for i in range(3):
+            throttle.wait()
+        tools.assert_true(time.time() - start >= 0.02)
+
+class TestPrefetchCached(CacheTestCase):
+    def setUp(self):
+        super(TestPrefetchCached, self).setUp()
+        create_basic_categories(self)
+        create_and_place_more_publishables(self)
+        list_all_publishables_in_category_by_hour(self)
+        self.sources = [Source.objects.create(name='Source %d' % i) for i in range(2)]
+        for i, p in enumerate(self.publishables):
+            p.source = self.sources[i % 2]
+            p.save()
+
+    def test_foreign_keys_are_resolved_at_once(self):
+        publishables = list(Publishable.objects.order_by('pk'))
+        with self.assertNumQueries(1):
+            prefetch_cached(publishables, 'source')
+        with self.assertNumQueries(0):
+            tools.assert_equals([p.source for p in self.publishables], [p.source for p in publishables])
+
+    def test_generic_foreign_keys_are_resolved(self):
+        related = [Related(publishable_id=self.publishables[0].pk, related_ct_id=p.content_type_id, related_id=p.pk) for p in self.publishables[1:]]
+        prefetch_cached(related, 'related')
+        with self.assertNumQueries(0):
+            tools.assert_equals(self.publishables[1:], [r.related for r in related])
+
+    def test_missing_generic_target_is_none(self):
+        r = Related(publishable_id=self.publishables[0].pk, related_ct_id=self.publishables[0].content_type_id, related_id=12345)
+        prefetch_cached([r], 'related')
+        tools.assert_equals(None, r.related)
+
+    def test_fields_can_span_relations(self):
+        listings = list(Listing.objects.order_by('pk'))
+        prefetch_cached(listings, 'publishable__source')
+        with self.assertNumQueries(0):
+            tools.assert_equals(self.sources[0], listings[0].publishable.source)
+
+class TestListingCounts(CacheTestCase):
+    def setUp(self):
+        super(TestListingCounts, self).setUp()
+        create_basic_categories(self)
+        create_and_place_a_publishable(self)
+        create_and_place_more_publishables(self)
+        list_all_publishables_in_category_by_hour(self)
+
+    def get_handler(self, category=None, children=ListingHandler.ALL, **kwargs):
+        return Listing.objects.get_queryset_wrapper(category=category or self.category, children=children, **kwargs)
+
+    def test_count_is_cached(self):
+        tools.assert_equals(len(self.listings), self.get_handler().count())
+        with self.assertNumQueries(0):
+            tools.assert_equals(len(self.listings), self.get_handler().count())
+
+    def test_new_listing_updates_count_of_all_ancestors(self):
+        self.get_handler().count()
+        nested_count = self.get_handler(self.category_nested_second).count()
+        p = self.publishables[0]
+        Listing.objects.filter(publishable=p).delete()
+
+        tools.assert_equals(len(self.listings) - 1, self.get_handler().count())
+        Listing.objects.create(publishable=p, category=self.category_nested_second, publish_from=p.publish_from)
+        tools.assert_equals(len(self.listings), self.get_handler().count())
+        tools.assert_equals(nested_count + 1, self.get_handler(self.category_nested_second).count())
+
+    def test_unpublishing_updates_count(self):
+        self.get_handler().count()
+        self.publishables[0].published = False
+        self.publishables[0].save()
+        tools.assert_equals(len(self.listings) - 1, self.get_handler().count())
+
+    def test_approximate_counts_are_only_adjusted(self):
+        handler = self.get_handler(self.category_nested_second, children=ListingHandler.NONE)
+        count = handler.count()
+        with self.settings(CACHE_LISTING_COUNT_APPROXIMATE=0):
+            Listing.objects.create(publishable=self.publishables[0], category=self.category_nested_second, publish_from=now())
+            with self.assertNumQueries(0):
+                tools.assert_equals(count + 1, self.get_handler(self.category_nested_second, children=ListingHandler.NONE).count())
+
+    def test_approximate_counts_of_children_are_recounted(self):
+        tools.assert_equals(len(self.listings), self.get_handler().count())
+        with self.settings(CACHE_LISTING_COUNT_APPROXIMATE=1):
+            Listing.objects.create(publishable=self.publishables[0], category=self.category_nested_second, publish_from=now())
+            # the same publishable listed twice, counted once
+            tools.assert_equals(len(self.listings), self.get_handler().count())
+
+    def test_specific_handlers_are_not_cached(self):
+        tools.assert_equals(len(self.listings) - 1, self.get_handler(exclude=self.publishables[0]).count())
+        with self.assertNumQueries(1):
+            self.get_handler(exclude=self.publishables[0]).count()
+
+class TestListingGenerations(CacheTestCase):
+    def setUp(self):
+        super(TestListingGenerations, self).setUp()
+        create_basic_categories(self)
+        create_and_place_a_publishable(self)
+        create_and_place_more_publishables(self)
+        list_all_publishables_in_category_by_hour(self)
+
+    def get_listing(self, **kwargs):
+        return Listing.objects.get_listing(**kwargs)
+
+    def test_listing_is_cached(self):
+        self.get_listing(category=self.category, children=ListingHandler.ALL)
+        with self.assertNumQueries(0):
+            self.get_listing(category=self.category, children=ListingHandler.ALL)
+
+    def test_new_listing_in_descendant_shows_up_immediately(self):
+        tools.assert_equals(self.listings, self.get_listing(category=self.category, children=ListingHandler.ALL))
+        listing = Listing.objects.create(publishable=self.publishables[0], category=self.category_nested_second, publish_from=now() - timedelta(minutes=5))
+        tools.assert_equals(listing, self.get_listing(category=self.category, children=ListingHandler.ALL)[0])
+
+    def test_unpublished_publishable_disappears_immediately(self):
+        tools.assert_equals(len(self.listings), len(self.get_listing(category=self.category, children=ListingHandler.ALL)))
+        self.publishables[0].published = False
+        self.publishables[0].save()
+        tools.assert_equals(len(self.listings) - 1, len(self.get_listing(category=self.category, children=ListingHandler.ALL)))
+
+    def test_content_type_listing_is_invalidated(self):
+        ct = ContentType.objects.get_for_model(Article)
+        tools.assert_equals(len(self.listings), len(self.get_listing(content_types=[ct])))
+        Listing.objects.filter(publishable=self.publishables[0]).delete()
+        tools.assert_equals(len(self.listings) - 1, len(self.get_listing(content_types=[ct])))
+
+    def test_moved_category_invalidates_old_and_new_ancestors(self):
+        other = Category.objects.create(title='Other', slug='other', tree_parent=self.category, site=self.category.site)
+        listings = self.get_listing(category=self.category_nested, children=ListingHandler.ALL)
+        tools.assert_equals([], self.get_listing(category=other, children=ListingHandler.ALL))
+
+        category = Category.objects.get(pk=self.category_nested_second.pk)
+        category.tree_parent = other
+        category.save()
+        moved = [l for l in listings if l.category_id == category.pk]
+        tools.assert_equals([l for l in listings if l not in moved], self.get_listing(category=self.category_nested, children=ListingHandler.ALL))
+        tools.assert_equals(moved, self.get_listing(category=other, children=ListingHandler.ALL))
+
+    def test_category_not_propagating_listings_invalidates_ancestors(self):
+        listings = self.get_listing(category=self.category, children=ListingHandler.ALL)
+        category = Category.objects.get(pk=self.category_nested_second.pk)
+        category.app_data = {'ella': {'propagate_listings': False}}
+        category.save()
+        tools.assert_equals([l for l in listings if l.category_id != category.pk],
+            self.get_listing(category=self.category, children=ListingHandler.ALL))
+
+    def test_unrelated_generation_is_kept(self):
+        ct = ContentType.objects.get_for_model(Site)
+        generation = get_generation(content_types=[ct])
+        Listing.objects.filter(publishable=self.publishables[0]).delete()
+        tools.assert_equals(generation, get_generation(content_types=[ct]))
+
+class TestListingHead(CacheTestCase):
+    def setUp(self):
+        super(TestListingHead, self).setUp()
+        create_basic_categories(self)
+        create_and_place_a_publishable(self)
+        create_and_place_more_publishables(self)
+        list_all_publishables_in_category_by_hour(self)
+
+    def test_pages_are_sliced_from_shared_head(self):
+        Listing.objects.get_listing(category=self.category, children=ListingHandler.ALL, count=4)
+        # objects are cached by now, no need to look at the listing again
+        with self.assertNumQueries(0):
+            l = Listing.objects.get_listing(category=self.category, children=ListingHandler.ALL, count=3, offset=1)
+        tools.assert_equals(self.listings[1:4], l)
+
+    def test_head_is_cached_as_rows(self):
+        Listing.objects.get_listing(category=self.category, children=ListingHandler.ALL, count=2)
+        key = get_listings_key(Listing.objects, self.category, ListingHandler.ALL, count=100, offset=0)
+        rows = utils._unwrap(self.cache.get(key))[1]
+        tools.assert_equals(len(self.listings), len(rows))
+        tools.assert_equals((self.listings[0].pk, self.listings[0].category_id), rows[0][:2])
+
+    def test_pages_past_head_are_cached_separately(self):
+        with self.settings(CACHE_LISTING_HEAD_SIZE=2):
+            l = Listing.objects.get_listing(category=self.category, children=ListingHandler.ALL, count=2, offset=1)
+            tools.assert_equals(self.listings[1:3], l)
+            with self.assertNumQueries(0):
+                Listing.objects.get_listing(category=self.category, children=ListingHandler.ALL, count=2, offset=1)
+
+    def test_excluded_publishables_are_filtered_out_of_shared_head(self):
+        Listing.objects.get_listing(category=self.category, children=ListingHandler.ALL, count=4)
+        with self.assertNumQueries(0):
+            l = Listing.objects.get_listing(category=self.category, children=ListingHandler.ALL, count=2, offset=1,
+                exclude=[self.listings[0].publishable, self.listings[1].publishable])
+        tools.assert_equals([], l)
+        tools.assert_equals(self.listings[2:], Listing.objects.get_listing(category=self.category, children=ListingHandler.ALL,
+            exclude=[self.listings[0].publishable, self.listings[1].publishable]))
+
+    def test_excluded_publishables_past_head_are_left_out_by_query(self):
+        with self.settings(CACHE_LISTING_HEAD_SIZE=2):
+            l = Listing.objects.get_listing(category=self.category, children=ListingHandler.ALL, count=1, offset=1,
+                exclude=self.listings[0].publishable)
+        tools.assert_equals(self.listings[2:], l)
+
+    def test_listings_have_concrete_publishables(self):
+        l = Listing.objects.get_listing(category=self.category, children=ListingHandler.ALL)
+        tools.assert_true(all(isinstance(x.publishable, Article) for x in l))
+
+    def test_many_listings_are_read_with_one_cache_call(self):
+        specs = [
+            dict(category=self.category, children=ListingHandler.ALL, count=2),
+            dict(category=self.category, children=ListingHandler.ALL, count=2, offset=2),
+            dict(category=self.category_nested, count=10),
+        ]
+        expected = [Listing.objects.get_listing(**spec) for spec in specs]
+
+        calls = []
+        get = self.cache.get
+        def counting_get_many(keys):
+            calls.append(keys)
+            # locmem's get_many is implemented using get
+            return dict((k, get(k)) for k in keys if get(k) is not None)
+        self.cache.get_many = counting_get_many
+        self.cache.get = lambda key, *args, **kwargs: calls.append(key) or get(key, *args, **kwargs)
+        try:
+            with self.assertNumQueries(0):
+                tools.assert_equals(expected, Listing.objects.get_listing_many(specs))
+        finally:
+            del self.cache.get, self.cache.get_many
+        # generations, listings and publishables
+        tools.assert_equals(3, len(calls))
+
 class TestCacheInvalidation(CacheTestCase):
     def test_save_invalidates_object(self):
         self.ct = ContentType.objects.get_for_model(ContentType)
         ct = utils.get_cached_object(self.ct, pk=self.ct.pk)
+        key = utils._get_key(utils.KEY_PREFIX, self.ct, pk=self.ct.pk, versioned=False)
 
         tools.assert_equals(ct, self.ct)
-        tools.assert_equals(self.ct, self.cache.get(utils._get_key(utils.KEY_PREFIX, self.ct, pk=self.ct.pk)))
+        tools.assert_equals((0, self.ct), self.cache.get(key))
         self.ct.save()
-        tools.assert_equals(None, self.cache.get(utils._get_key(utils.KEY_PREFIX, self.ct, pkr=self.ct.pk)))
+        tools.assert_equals({}, utils._get_many_versioned([key])[0])
 
-    def test_save_increases_version(self):
+    def test_save_changes_version(self):
         self.ct = ContentType.objects.get_for_model(ContentType)
         key = utils._get_key(utils.KEY_PREFIX, self.ct, pk=self.ct.pk, version_key=True)
 
@@ -107,8 +787,107 @@ class TestCacheInvalidation(CacheTestCase):
         self.ct.save()
         new_version = self.cache.get(key)
 
-        tools.assert_equals(new_version, initial_version + 1)
+        tools.assert_not_equals(None, initial_version)
+        tools.assert_not_equals(new_version, initial_version)
+
+    def test_invalidations_in_batch_are_deduplicated(self):
+        self.ct = ContentType.objects.get_for_model(ContentType)
+        calls = []
+        set_many = self.cache.set_many
+        def counting_set_many(data, *args, **kwargs):
+            calls.append(sorted(data.keys()))
+            return set_many(data, *args, **kwargs)
+        self.cache.set_many = counting_set_many
+
+        with utils.invalidation_batch():
+            self.ct.save()
+            with utils.invalidation_batch():
+                self.ct.save()
+                Site.objects.get_current().save()
+            tools.assert_equals([], calls)
+        tools.assert_equals(1, len(calls))
+        tools.assert_equals(2, len(calls[0]))
+
+    def test_batch_invalidates_objects(self):
+        self.ct = ContentType.objects.get_for_model(ContentType)
+        utils.get_cached_object(self.ct, pk=self.ct.pk)
+        key = utils._get_key(utils.KEY_PREFIX, self.ct, pk=self.ct.pk, versioned=False)
+        with utils.invalidation_batch():
+            self.ct.save()
+        tools.assert_equals({}, utils._get_many_versioned([key])[0])
+
+    def test_changed_object_is_read_back_inside_batch(self):
+        site = Site.objects.get_current()
+        utils.identity_map.activate()
+        try:
+            utils.get_cached_object(Site, pk=site.pk)
+            with utils.invalidation_batch():
+                site.name = 'Changed'
+                site.save()
+                tools.assert_equals('Changed', utils.get_cached_object(Site, pk=site.pk).name)
+                tools.assert_equals('Changed', utils.get_cached_object(Site, domain=site.domain).name)
+                tools.assert_equals(['Changed'], [s.name for s in utils.get_cached_objects([site.pk], Site)])
+            tools.assert_equals('Changed', utils.get_cached_object(Site, pk=site.pk).name)
+        finally:
+            utils.identity_map.deactivate()
+
+    def test_middleware_flushes_batch_on_exception(self):
+        self.ct = ContentType.objects.get_for_model(ContentType)
+        utils.get_cached_object(self.ct, pk=self.ct.pk)
+        key = utils._get_key(utils.KEY_PREFIX, self.ct, pk=self.ct.pk, versioned=False)
+        middleware = InvalidationBatchMiddleware()
+        request = RequestFactory().get('/')
+
+        middleware.process_request(request)
+        self.ct.save()
+        middleware.process_exception(request, ValueError())
+        tools.assert_equals({}, utils._get_many_versioned([key])[0])
+        tools.assert_equals(0, utils._batch.depth)
+
+    def test_batch_of_skipped_response_is_flushed_by_next_request(self):
+        self.ct = ContentType.objects.get_for_model(ContentType)
+        utils.get_cached_object(self.ct, pk=self.ct.pk)
+        key = utils._get_key(utils.KEY_PREFIX, self.ct, pk=self.ct.pk, versioned=False)
+        middleware = InvalidationBatchMiddleware()
+
+        middleware.process_request(RequestFactory().get('/'))
+        self.ct.save()
+        request = RequestFactory().get('/')
+        middleware.process_request(request)
+        tools.assert_equals({}, utils._get_many_versioned([key])[0])
 
+        middleware.process_response(request, None)
+        tools.assert_equals(0, utils._batch.depth)
+
+    def test_excluded_models_are_not_registered(self):
+        tools.assert_true(ContentType in utils.cached_models)
+        tools.assert_true(Article in utils.cached_models)
+        tools.assert_false(Session in utils.cached_models)
+
+    def test_cached_models_can_be_listed_explicitly(self):
+        with self.settings(CACHE_MODELS=('core.publishable',)):
+            tools.assert_true(utils.is_cached_model(Article))
+            tools.assert_false(utils.is_cached_model(ContentType))
+
+
+class TestListingFanout(CacheTestCase):
+    def setUp(self):
+        super(TestListingFanout, self).setUp()
+        create_basic_categories(self)
+
+    def test_fanout_follows_the_tree(self):
+        tools.assert_equals((self.category_nested.pk, [self.category_nested.pk, self.category.pk]), redis.get_fanout(self.category_nested_second))
+
+    def test_fanout_is_cached(self):
+        redis.get_fanout(self.category_nested_second)
+        self.assertNumQueries(0, lambda: redis.get_fanout(self.category_nested_second))
+
+    def test_change_of_ancestor_invalidates_fanout(self):
+        redis.get_fanout(self.category_nested_second)
+        self.category_nested.app_data = {'ella': {'propagate_listings': False}}
+        self.category_nested.save()
+        category = Category.objects.get(pk=self.category_nested_second.pk)
+        tools.assert_equals((self.category_nested.pk, [self.category_nested.pk]), redis.get_fanout(category))
 
 class TestRedisListings(TestCase):
     def setUp(self):
@@ -123,6 +902,27 @@ class TestRedisListings(TestCase):
 
         tools.assert_equals(l.publishable, self.listings[0].publishable)
 
+    def test_get_listings_after_cursor_walks_whole_listing(self):
+        list_all_publishables_in_category_by_hour(self)
+        lh = Listing.objects.get_queryset_wrapper(category=self.category, children=ListingHandler.ALL, source='redis')
+        out, cursor = [], None
+        while True:
+            page = lh.get_listings_after(cursor, 1)
+            if not page:
+                break
+            out.extend(l.publishable for l in page)
+            cursor = lh.get_cursor(page[-1])
+        tools.assert_equals([l.publishable for l in self.listings], out)
+
+    def test_get_listings_after_cursor_handles_same_score(self):
+        for p in self.publishables:
+            redis.client.zadd('listing:d:1', '%d:%d' % (p.content_type_id, p.pk), repr(to_timestamp(self.publishables[0].publish_from)))
+        lh = Listing.objects.get_queryset_wrapper(category=self.category, children=ListingHandler.ALL, source='redis')
+        first = lh.get_listings_after(None, 1)[0]
+        rest = lh.get_listings_after(lh.get_cursor(first), 10)
+        tools.assert_equals(len(self.publishables), len(rest) + 1)
+        tools.assert_false(first.publishable in [l.publishable for l in rest])
+
     def test_listings_dont_propagate_where_they_shouldnt(self):
         self.category_nested.app_data = {'ella': {'propagate_listings': False}}
         self.category_nested.save()
@@ -276,6 +1076,148 @@ class TestRedisListings(TestCase):
         tools.assert_equals(l[0].publishable, self.publishables[2])
         tools.assert_equals(l[0].publish_from, dt2)
 
+    def test_listing_change_is_one_script_call(self):
+        pipe = redis.RedisListingHandler.remove_publishable(self.category_nested_second, self.publishables[0], commit=False)
+        tools.assert_equals(1, len(pipe))
+
+    def test_moved_listing_is_one_script_call(self):
+        list_all_publishables_in_category_by_hour(self)
+        listing = self.listings[0]
+        calls = []
+        orig = redis.get_write_listings_script
+        def get_write_listings_script():
+            script = orig()
+            def counted(keys, args, client=None):
+                calls.append(keys)
+                return script(keys=keys, args=args, client=client)
+            return counted
+        old_category = listing.category
+        redis.get_write_listings_script = get_write_listings_script
+        try:
+            listing.category = self.category_nested_second
+            listing.save()
+        finally:
+            redis.get_write_listings_script = orig
+        tools.assert_equals(1, len(calls))
+        tools.assert_true('listing:%d' % old_category.pk in calls[0])
+        tools.assert_true('listing:%d' % self.category_nested_second.pk in calls[0])
+
+    def test_moved_listing_of_unpublished_publishable_leaves_old_categories(self):
+        list_all_publishables_in_category_by_hour(self)
+        listing = self.listings[0]
+        member = '%d:%d' % (listing.publishable.content_type_id, listing.publishable.pk)
+        old_category = listing.category
+        # unpublished without the signals, redis still has the listing
+        Publishable.objects.filter(pk=listing.publishable_id).update(published=False)
+        tools.assert_not_equals(None, redis.client.zscore('listing:%d' % old_category.pk, member))
+        listing = Listing.objects.get(pk=listing.pk)
+        listing.category = self.category_nested_second
+        listing.save()
+
+        tools.assert_equals(None, redis.client.zscore('listing:%d' % old_category.pk, member))
+        tools.assert_equals(None, redis.client.zscore('listing:%d' % self.category_nested_second.pk, member))
+
+    def test_moved_listing_leaves_old_categories(self):
+        list_all_publishables_in_category_by_hour(self)
+        listing = self.listings[0]
+        member = '%d:%d' % (listing.publishable.content_type_id, listing.publishable.pk)
+        listing.category = self.category_nested_second
+        listing.save()
+
+        tools.assert_equals(None, redis.client.zscore('listing:%d' % self.category.pk, member))
+        tools.assert_not_equals(None, redis.client.zscore('listing:%d' % self.category_nested_second.pk, member))
+        tools.assert_not_equals(None, redis.client.zscore('listing:d:%d' % self.category.pk, member))
+
+    def test_excluded_publishable_before_page_shifts_it(self):
+        ct_id = self.publishables[0].content_type_id
+        t1, t2, t3 = time.time()-90, time.time()-100, time.time() - 110
+        redis.client.zadd('listing:c:2', '%d:1' % ct_id, repr(t1))
+        redis.client.zadd('listing:c:2', '%d:3' % ct_id, repr(t2))
+        redis.client.zadd('listing:c:2', '%d:2' % ct_id, repr(t3))
+
+        lh = Listing.objects.get_queryset_wrapper(category=self.category_nested, children=ListingHandler.IMMEDIATE, exclude=self.publishables[0], source='redis')
+        tools.assert_equals([self.publishables[1]], [l.publishable for l in lh.get_listings(1, 1)])
+        tools.assert_equals(2, lh.count())
+
+    def test_several_excluded_publishables_are_skipped(self):
+        ct_id = self.publishables[0].content_type_id
+        t1, t2, t3 = time.time()-90, time.time()-100, time.time() - 110
+        redis.client.zadd('listing:c:2', '%d:1' % ct_id, repr(t1))
+        redis.client.zadd('listing:c:2', '%d:3' % ct_id, repr(t2))
+        redis.client.zadd('listing:c:2', '%d:2' % ct_id, repr(t3))
+
+        lh = Listing.objects.get_queryset_wrapper(category=self.category_nested, children=ListingHandler.IMMEDIATE, exclude=[self.publishables[0], self.publishables[2]], source='redis')
+        tools.assert_equals([self.publishables[1]], [l.publishable for l in lh.get_listings(0, 1)])
+        tools.assert_equals([], lh.get_listings(1, 1))
+        tools.assert_equals(1, lh.count())
+
+        lh = Listing.objects.get_queryset_wrapper(category=self.category_nested, children=ListingHandler.IMMEDIATE, exclude=[self.publishables[2]], source='redis')
+        tools.assert_equals([self.publishables[1]], [l.publishable for l in lh.get_listings_after(lh.get_cursor(lh.get_listings(0, 1)[0]), 10)])
+
+    def test_listing_read_includes_count(self):
+        ct_id = self.publishables[0].content_type_id
+        redis.client.zadd('listing:c:2', '%d:1' % ct_id, repr(time.time() - 90))
+        redis.client.zadd('listing:c:2', '%d:3' % ct_id, repr(time.time() - 100))
+
+        lh = Listing.objects.get_queryset_wrapper(category=self.category_nested, children=ListingHandler.IMMEDIATE, source='redis')
+        lh.get_listings(0, 1)
+        redis.client.flushdb()
+        tools.assert_equals(2, lh.count())
+
+    def test_content_type_listing_reuses_intersection(self):
+        ct_id = self.publishables[0].content_type_id
+        redis.client.zadd('listing:c:2', '%d:1' % ct_id, repr(time.time() - 90))
+        redis.client.zadd('listing:ct:%d' % ct_id, '%d:1' % ct_id, repr(time.time() - 90))
+        ct = ContentType.objects.get_for_id(ct_id)
+
+        lh = Listing.objects.get_queryset_wrapper(category=self.category_nested, children=ListingHandler.IMMEDIATE, content_types=[ct], source='redis')
+        tools.assert_equals([self.publishables[0]], [l.publishable for l in lh.get_listings(0, 10)])
+
+        inter_key = lh._get_keys()[2]
+        tools.assert_true(0 < redis.client.ttl(inter_key) <= redis.RedisListingHandler.TEMP_KEY_TIMEOUT)
+        # the category key is no longer needed while the intersection lives
+        redis.client.delete('listing:c:2')
+        lh = Listing.objects.get_queryset_wrapper(category=self.category_nested, children=ListingHandler.IMMEDIATE, content_types=[ct], source='redis')
+        tools.assert_equals([self.publishables[0]], [l.publishable for l in lh.get_listings(0, 10)])
+
+    def test_listing_of_several_content_types(self):
+        ct_id = self.publishables[0].content_type_id
+        redis.client.zadd('listing:c:2', '%d:1' % ct_id, repr(time.time() - 90))
+        redis.client.zadd('listing:c:2', '99:3', repr(time.time() - 100))
+        redis.client.zadd('listing:ct:%d' % ct_id, '%d:1' % ct_id, repr(time.time() - 90))
+        redis.client.zadd('listing:ct:99', '99:3', repr(time.time() - 100))
+        cts = [ContentType.objects.get_for_id(ct_id), ContentType(pk=99)]
+
+        lh = Listing.objects.get_queryset_wrapper(category=self.category_nested, children=ListingHandler.IMMEDIATE, content_types=cts, source='redis')
+        tools.assert_equals(2, lh.count())
+        tools.assert_equals(2, redis.client.zcard(lh._get_keys()[1]))
+
+    def test_float_score_is_written_with_all_digits(self):
+        score = 1380000000.123456
+        redis.RedisListingHandler.update(self.publishables[0], [('listing:c:2', score)])
+        tools.assert_equals(score, redis.client.zscore('listing:c:2', redis.RedisListingHandler.get_value(self.publishables[0])))
+
+    def test_change_of_listing_drops_derived_keys(self):
+        ct_id = self.publishables[0].content_type_id
+        redis.client.zadd('listing:c:2', '%d:1' % ct_id, repr(time.time() - 90))
+        redis.client.zadd('listing:ct:%d' % ct_id, '%d:1' % ct_id, repr(time.time() - 90))
+        redis.client.zadd('listing:ct:99', '99:3', repr(time.time() - 100))
+        cts = [ContentType.objects.get_for_id(ct_id), ContentType(pk=99)]
+
+        lh = Listing.objects.get_queryset_wrapper(category=self.category_nested, children=ListingHandler.IMMEDIATE, content_types=cts, source='redis')
+        tools.assert_equals(1, lh.count())
+
+        p = Publishable(pk=3, content_type_id=99)
+        redis.RedisListingHandler.update(p, [('listing:c:2', repr(time.time() - 100))])
+        tools.assert_false(redis.client.exists(lh._get_keys()[2]))
+        tools.assert_true(redis.client.exists(lh._get_keys()[1]))
+
+        redis.RedisListingHandler.update(p, [('listing:ct:99', '+1')])
+        tools.assert_false(redis.client.exists(lh._get_keys()[1]))
+
+        lh = Listing.objects.get_queryset_wrapper(category=self.category_nested, children=ListingHandler.IMMEDIATE, content_types=cts, source='redis')
+        tools.assert_equals(2, lh.count())
+
     def test_redis_listing_handler_used_from_view_when_requested(self):
         ct_id = self.publishables[0].content_type_id
         t1, t2 = time.time()-90, time.time()-100
@@ -470,6 +1412,16 @@ class TestSlidingListings(TestCase):
         SlidingLH.regenerate(date(2010, 10, 10))
         tools.assert_equals([('17:2', 6.0), ('17:3', 11.0), ('17:1', 27.0)], redis.client.zrange('sliding:1', 0, -1, withscores=True))
 
+    def test_regenerate_drops_derived_keys(self):
+        redis.client.sadd('sliding:KEYS', 'sliding:1')
+        redis.client.zadd('sliding:1:20101010', **{'17:1': 10})
+        redis.client.zadd('sliding:zis:some', **{'17:1': 1})
+        redis.client.sadd('sliding:1:derived', 'sliding:zis:some')
+
+        SlidingLH.regenerate(date(2010, 10, 10))
+        tools.assert_false(redis.client.exists('sliding:zis:some'))
+        tools.assert_false(redis.client.exists('sliding:1:derived'))
+
     def test_regenerate_removes_old_slots(self):
         redis.client.zadd('sliding:WINDOWS', **{
                 'sliding:1:20101010': 20101010,
@@ -6,7 +6,7 @@ from nose import tools
 from django.core.urlresolvers import reverse
 from django.core.exceptions import ValidationError
 
-from ella.core.models import Category
+from ella.core.models import Category, CategoryClosure
 
 from test_ella.test_core import create_basic_categories
 
@@ -80,3 +80,70 @@ class TestCategory(TestCase):
         url = reverse('category_detail', args=(self.category_nested.tree_path, ))
         tools.assert_equals(url, self.category_nested.get_absolute_url())
 
+
+class TestCategoryClosure(TestCase):
+
+    def setUp(self):
+        super(TestCategoryClosure, self).setUp()
+        create_basic_categories(self)
+
+    def get_ancestors(self, category):
+        return [(c.ancestor, c.depth) for c in CategoryClosure.objects.filter(descendant=category).order_by('depth')]
+
+    def test_category_is_its_own_ancestor(self):
+        tools.assert_equals([(self.category, 0)], self.get_ancestors(self.category))
+
+    def test_nested_category_has_all_its_parents(self):
+        tools.assert_equals(
+            [(self.category_nested_second, 0), (self.category_nested, 1), (self.category, 2)],
+            self.get_ancestors(self.category_nested_second)
+        )
+
+    def test_ancestors_stop_at_category_not_propagating_listings(self):
+        self.category_nested.app_data = {'ella': {'propagate_listings': False}}
+        self.category_nested.save()
+        tools.assert_equals(
+            [(self.category_nested_second, 0), (self.category_nested, 1)],
+            self.get_ancestors(self.category_nested_second)
+        )
+
+    def test_moving_category_updates_its_descendants(self):
+        self.category_nested_second.tree_parent = self.category
+        self.category_nested_second.save()
+        tools.assert_equals(
+            [(self.category_nested_second, 0), (self.category, 1)],
+            self.get_ancestors(self.category_nested_second)
+        )
+
+    def test_category_keeping_its_place_doesnt_rebuild(self):
+        CategoryClosure.objects.all().delete()
+        self.category_nested.title = 'New title'
+        self.category_nested.slug = 'new-slug'
+        self.category_nested.save()
+        tools.assert_equals(0, CategoryClosure.objects.count())
+
+    def test_moving_category_with_descendants_rebuilds_once(self):
+        other = Category.objects.create(title='Other', slug='other', tree_parent=self.category, site=self.category.site)
+        calls = []
+        rebuild = CategoryClosure.objects.rebuild
+        def counting_rebuild(*args, **kwargs):
+            calls.append(args)
+            return rebuild(*args, **kwargs)
+        CategoryClosure.objects.rebuild = counting_rebuild
+        try:
+            self.category_nested.tree_parent = other
+            self.category_nested.save()
+        finally:
+            del CategoryClosure.objects.rebuild
+
+        tools.assert_equals([(self.category_nested, )], calls)
+        tools.assert_equals(
+            [(self.category_nested_second, 0), (self.category_nested, 1), (other, 2), (self.category, 3)],
+            self.get_ancestors(self.category_nested_second)
+        )
+
+    def test_rebuild_restores_all_rows(self):
+        rows = set(CategoryClosure.objects.values_list('ancestor', 'descendant', 'depth'))
+        CategoryClosure.objects.all().delete()
+        CategoryClosure.objects.rebuild()
+        tools.assert_equals(rows, set(CategoryClosure.objects.values_list('ancestor', 'descendant', 'depth')))
@@ -5,8 +5,9 @@ from test_ella.cases import RedisTestCase as TestCase
 
 from nose import tools
 
-from ella.core.models import Listing, Category
-from ella.core.managers import ListingHandler
+from ella.core.models import Listing, Category, ListingFeed
+from ella.core.managers import ListingHandler, get_listings_refresh_timeout
+from ella.articles.models import Article
 from ella.utils.timezone import now
 
 from test_ella.test_core import create_basic_categories, create_and_place_a_publishable, \
@@ -81,6 +82,87 @@ class TestListing(TestCase):
         tools.assert_equals(len(self.listings), len(l))
         tools.assert_equals(listing, l[0])
 
+    def test_count_ignores_duplicates(self):
+        Listing.objects.create(
+                publishable=self.publishables[0],
+                category=self.category_nested_second,
+                publish_from=now() - timedelta(days=2),
+            )
+        lh = Listing.objects.get_queryset_wrapper(category=self.category, children=ListingHandler.ALL)
+        tools.assert_equals(len(self.listings), lh.count())
+        tools.assert_equals(len(self.listings), len(lh.get_listings(0, 10)))
+
+    def test_duplicates_dont_shift_pages(self):
+        for l in self.listings:
+            Listing.objects.create(publishable=l.publishable, category=self.category_nested_second, publish_from=l.publish_from)
+        lh = Listing.objects.get_queryset_wrapper(category=self.category, children=ListingHandler.ALL)
+        tools.assert_equals(len(self.listings), lh.count())
+        # publishables, their listings, next scheduled change (2) and articles
+        with self.assertNumQueries(5):
+            page = list(lh.get_listings(1, 2))
+        tools.assert_equals([l.publishable for l in self.listings[1:3]], [l.publishable for l in page])
+
+    def test_listings_come_with_concrete_publishables(self):
+        lh = Listing.objects.get_queryset_wrapper(category=self.category, children=ListingHandler.ALL)
+        tools.assert_equals(len(self.listings), lh.count())
+        # publishables, their listings, next scheduled change (2) and
+        # articles, nothing more for content
+        with self.assertNumQueries(5):
+            listings = lh.get_listings(0, 10)
+            tools.assert_true(all(isinstance(l.publishable, Article) for l in listings))
+            [l.publishable.content for l in listings]
+
+    def test_next_change_is_next_publish_from(self):
+        publish_from = now().replace(second=0, microsecond=0) + timedelta(hours=2)
+        Listing.objects.create(publishable=self.publishables[0], category=self.category, publish_from=publish_from)
+        tools.assert_equals(publish_from, Listing.objects.get_next_change(self.category, children=ListingHandler.ALL))
+
+    def test_next_change_is_minute_after_publish_to(self):
+        publish_to = now().replace(second=0, microsecond=0) + timedelta(hours=1)
+        self.listings[0].publish_to = publish_to
+        self.listings[0].save()
+        tools.assert_equals(publish_to + timedelta(minutes=1), Listing.objects.get_next_change(self.category, children=ListingHandler.ALL))
+
+    def test_no_next_change(self):
+        tools.assert_equals(None, Listing.objects.get_next_change(self.category, children=ListingHandler.ALL))
+
+    def test_refresh_timeout_is_limited_by_next_change(self):
+        Listing.objects.create(publishable=self.publishables[0], category=self.category, publish_from=now() + timedelta(seconds=90))
+        timeout = get_listings_refresh_timeout(Listing.objects, self.category, children=ListingHandler.ALL)
+        tools.assert_true(90 <= timeout <= 151)
+
+    def test_get_listings_after_cursor_walks_whole_listing(self):
+        lh = Listing.objects.get_queryset_wrapper(category=self.category, children=ListingHandler.ALL)
+        out, cursor = [], None
+        while True:
+            page = lh.get_listings_after(cursor, 2)
+            if not page:
+                break
+            out.extend(page)
+            cursor = lh.get_cursor(page[-1])
+        tools.assert_equals(list(lh.get_listings(0, 10)), out)
+
+    def test_get_listings_after_cursor_handles_same_publish_from(self):
+        Listing.objects.update(publish_from=self.listings[0].publish_from)
+        lh = Listing.objects.get_queryset_wrapper(category=self.category, children=ListingHandler.ALL)
+        first = lh.get_listings_after(None, 1)[0]
+        rest = lh.get_listings_after(lh.get_cursor(first), 10)
+        tools.assert_equals(len(self.listings), len(rest) + 1)
+        tools.assert_false(first in rest)
+
+    def test_get_listings_after_cursor_reads_rows_of_the_page(self):
+        lh = Listing.objects.get_queryset_wrapper(category=self.category, children=ListingHandler.ALL)
+        cursor = lh.get_cursor(lh.get_listings(0, 1)[0])
+        # publishables, their listings and articles
+        with self.assertNumQueries(3):
+            page = lh.get_listings_after(cursor, 2)
+            tools.assert_true(all(isinstance(l.publishable, Article) for l in page))
+        tools.assert_equals([l.publishable for l in self.listings[1:3]], [l.publishable for l in page])
+
+    def test_invalid_cursor_raises_value_error(self):
+        lh = Listing.objects.get_queryset_wrapper(category=self.category, children=ListingHandler.ALL)
+        tools.assert_raises(ValueError, lh.get_listings_after, 'garbage', 2)
+
     def test_get_listing_IMMEDIATE_without_limited_categories(self):
         self.category_nested.app_data = {'ella': {'propagate_listings': False}}
         self.category_nested.save()
@@ -113,8 +195,135 @@ class TestListing(TestCase):
         l = Listing.objects.get_listing(category=self.category, children=ListingHandler.ALL, exclude=l.publishable)
         tools.assert_equals(self.listings[1:], l)
 
+    def test_several_excluded_publishables_wont_show(self):
+        exclude = [self.listings[0].publishable, self.listings[2].publishable]
+        l = Listing.objects.get_listing(category=self.category, children=ListingHandler.ALL, exclude=exclude)
+        tools.assert_equals([self.listings[1]] + self.listings[3:], l)
+
     def test_queryset_wrapper_can_get_individual_listings(self):
         lh = Listing.objects.get_queryset_wrapper(self.category, children=ListingHandler.ALL)
         l = lh[0]
         tools.assert_equals(self.listings[0], l)
 
+
+class TestFeedListing(TestCase):
+
+    def setUp(self):
+        super(TestFeedListing, self).setUp()
+        create_basic_categories(self)
+        create_and_place_a_publishable(self)
+        create_and_place_more_publishables(self)
+        list_all_publishables_in_category_by_hour(self)
+
+    def get_publishables(self, source, **kwargs):
+        lh = Listing.objects.get_queryset_wrapper(category=self.category, source=source, **kwargs)
+        return [l.publishable for l in lh.get_listings(0, 10)]
+
+    def test_feed_matches_model_listings(self):
+        for children in (ListingHandler.NONE, ListingHandler.IMMEDIATE, ListingHandler.ALL):
+            tools.assert_equals(
+                self.get_publishables('default', children=children),
+                self.get_publishables('feed', children=children)
+            )
+
+    def get_listings(self, source, **kwargs):
+        lh = Listing.objects.get_queryset_wrapper(category=self.category, source=source, **kwargs)
+        return [(l.pk, l.publishable, l.category, l.publish_from, l.publish_to, l.commercial) for l in lh.get_listings(0, 10)], lh.count()
+
+    def test_duplicate_listings_are_listed_once(self):
+        Listing.objects.create(publishable=self.publishables[0], category=self.category_nested_second, publish_from=now() - timedelta(days=2))
+        tools.assert_equals(2, ListingFeed.objects.filter(publishable=self.publishables[0], category=self.category, children=ListingHandler.ALL).count())
+        tools.assert_equals(self.get_listings('default', children=ListingHandler.ALL), self.get_listings('feed', children=ListingHandler.ALL))
+
+    def test_scheduled_listing_doesnt_hide_visible_one(self):
+        Listing.objects.create(publishable=self.publishables[0], category=self.category_nested_second, publish_from=now() + timedelta(days=2))
+        tools.assert_true(self.publishables[0] in self.get_publishables('feed', children=ListingHandler.ALL))
+        tools.assert_equals(self.get_listings('default', children=ListingHandler.ALL), self.get_listings('feed', children=ListingHandler.ALL))
+
+    def test_listings_keep_their_category_and_attributes(self):
+        listing = self.listings[0]
+        listing.commercial = True
+        listing.publish_to = now() + timedelta(days=2)
+        listing.save()
+        for children in (ListingHandler.NONE, ListingHandler.ALL):
+            tools.assert_equals(self.get_listings('default', children=children), self.get_listings('feed', children=children))
+
+    def test_moved_category_is_listed_under_new_parent(self):
+        other = Category.objects.create(title='Other', slug='other', tree_parent=self.category, site=self.category.site)
+        category = Category.objects.get(pk=self.category_nested_second.pk)
+        category.tree_parent = other
+        category.save()
+
+        for c in (self.category_nested, other):
+            for children in (ListingHandler.IMMEDIATE, ListingHandler.ALL):
+                default = Listing.objects.get_queryset_wrapper(category=c, children=children, source='default')
+                feed = Listing.objects.get_queryset_wrapper(category=c, children=children, source='feed')
+                tools.assert_equals(
+                    [l.publishable for l in default.get_listings(0, 10)],
+                    [l.publishable for l in feed.get_listings(0, 10)]
+                )
+        feed = Listing.objects.get_queryset_wrapper(category=other, children=ListingHandler.IMMEDIATE, source='feed')
+        tools.assert_equals([l.publishable for l in self.listings if l.category_id == category.pk], [l.publishable for l in feed.get_listings(0, 10)])
+
+    def test_listing_without_category_is_limited_to_site(self):
+        lh = Listing.objects.get_queryset_wrapper(category=None, source='feed')
+        tools.assert_equals(
+            set(l.publishable for l in self.listings),
+            set(l.publishable for l in lh.get_listings(0, 10))
+        )
+
+    def test_non_propagating_category_is_not_in_parent_feed(self):
+        self.category_nested.app_data = {'ella': {'propagate_listings': False}}
+        self.category_nested.save()
+        ListingFeed.objects.rebuild()
+        tools.assert_equals(
+            self.get_publishables('default', children=ListingHandler.ALL),
+            self.get_publishables('feed', children=ListingHandler.ALL)
+        )
+
+    def test_unpublished_publishable_is_removed(self):
+        self.publishables[0].published = False
+        self.publishables[0].save()
+        tools.assert_false(ListingFeed.objects.filter(publishable=self.publishables[0]).exists())
+
+    def test_deleted_listing_is_removed(self):
+        Listing.objects.filter(publishable=self.publishables[0]).delete()
+        tools.assert_false(ListingFeed.objects.filter(publishable=self.publishables[0]).exists())
+
+    def test_count_and_cursor(self):
+        lh = Listing.objects.get_queryset_wrapper(category=self.category, children=ListingHandler.ALL, source='feed')
+        tools.assert_equals(len(self.listings), lh.count())
+        first = lh.get_listings_after(None, 1)
+        rest = lh.get_listings_after(lh.get_cursor(first[0]), 10)
+        tools.assert_equals(
+            self.get_publishables('default', children=ListingHandler.ALL),
+            [l.publishable for l in first + rest]
+        )
+
+    def test_cursor_doesnt_repeat_publishable_listed_below_it(self):
+        Listing.objects.create(publishable=self.listings[0].publishable, category=self.category_nested_second,
+                               publish_from=self.listings[-1].publish_from - timedelta(hours=1))
+        for source in ('default', 'feed'):
+            lh = Listing.objects.get_queryset_wrapper(category=self.category, children=ListingHandler.ALL, source=source)
+            out, cursor = [], None
+            while True:
+                page = lh.get_listings_after(cursor, 2)
+                if not page:
+                    break
+                out.extend(l.publishable for l in page)
+                cursor = lh.get_cursor(page[-1])
+            tools.assert_equals(self.get_publishables(source, children=ListingHandler.ALL), out)
+
+    def test_individual_listing_is_taken_from_unique_listings(self):
+        Listing.objects.create(publishable=self.listings[0].publishable, category=self.category_nested_second,
+                               publish_from=self.listings[1].publish_from + timedelta(minutes=30))
+        for source in ('default', 'feed'):
+            lh = Listing.objects.get_queryset_wrapper(category=self.category, children=ListingHandler.ALL, source=source)
+            tools.assert_equals(self.listings[1].publishable, lh[1].publishable)
+
+    def test_feed_excludes_several_publishables(self):
+        exclude = self.publishables[:2]
+        tools.assert_equals(
+            self.get_publishables('default', children=ListingHandler.ALL, exclude=exclude),
+            self.get_publishables('feed', children=ListingHandler.ALL, exclude=exclude)
+        )
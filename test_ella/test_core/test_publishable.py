@@ -7,15 +7,18 @@ from django.contrib.sites.models import Site
 from django.contrib.redirects.models import Redirect
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
+from django.db.models.signals import post_save
 
-from ella.core.models import Category, Publishable
+from ella.core.models import Category, Publishable, Author
+from ella.core.models.publishable import update_author_ids
 from ella.core import signals
 from ella.core.management import generate_publish_signals
 from ella.utils import timezone
 
 from nose import tools, SkipTest
 
-from test_ella.test_core import create_basic_categories, create_and_place_a_publishable, default_time
+from test_ella.test_core import create_basic_categories, create_and_place_a_publishable, \
+    create_and_place_more_publishables, default_time
 
 class PublishableTestCase(TestCase):
     def setUp(self):
@@ -69,6 +72,73 @@ class TestPublishableHelpers(PublishableTestCase):
         tools.assert_equals(current_ct, p.content_type)
 
 
+class TestAuthorIds(PublishableTestCase):
+    def setUp(self):
+        super(TestAuthorIds, self).setUp()
+        self.authors = [Author.objects.create(slug='author-%d' % i, name='Author %d' % i) for i in range(3)]
+
+    def test_ids_follow_added_and_removed_authors(self):
+        self.publishable.authors.add(self.authors[1], self.authors[0])
+        tools.assert_equals([self.authors[0].pk, self.authors[1].pk], Publishable.objects.get(pk=self.publishable.pk).get_author_ids())
+        self.publishable.authors.remove(self.authors[0])
+        tools.assert_equals([self.authors[1].pk], Publishable.objects.get(pk=self.publishable.pk).get_author_ids())
+
+    def test_ids_follow_changes_from_author_side(self):
+        self.publishable.authors.add(self.authors[2])
+        self.authors[2].publishable_set.clear()
+        tools.assert_equals([], Publishable.objects.get(pk=self.publishable.pk).get_author_ids())
+
+    def test_authors_of_all_publishables_are_loaded_at_once(self):
+        self.publishable.authors.add(*self.authors)
+        p = Publishable.objects.get(pk=self.publishable.pk)
+        Publishable.objects.load_authors([p])
+        with self.assertNumQueries(0):
+            tools.assert_equals(self.authors, p.get_authors())
+
+    def test_changing_authors_drops_loaded_authors(self):
+        self.publishable.authors.add(self.authors[0])
+        tools.assert_equals([self.authors[0]], self.publishable.get_authors())
+        self.publishable.authors.add(self.authors[1])
+        tools.assert_equals(self.authors[:2], self.publishable.get_authors())
+
+    def test_saving_stale_publishable_keeps_author_ids(self):
+        p = Publishable.objects.get(pk=self.publishable.pk)
+        self.publishable.authors.add(self.authors[0])
+        p.title = 'New title'
+        p.save()
+        p = Publishable.objects.get(pk=self.publishable.pk)
+        tools.assert_equals('New title', p.title)
+        tools.assert_equals([self.authors[0].pk], p.get_author_ids())
+
+    def test_author_ids_of_all_publishables_are_updated_at_once(self):
+        create_and_place_more_publishables(self)
+        through = Publishable.authors.through
+        through.objects.bulk_create([through(publishable_id=p.pk, author=self.authors[0]) for p in self.publishables])
+        pks = set(p.pk for p in self.publishables)
+        # one SELECT of the authors, one UPDATE for the shared value
+        with self.assertNumQueries(2):
+            update_author_ids(through, instance=self.authors[0], action='post_add', reverse=True, pk_set=pks)
+        tools.assert_equals(
+            set([str(self.authors[0].pk)]),
+            set(Publishable.objects.filter(pk__in=pks).values_list('author_ids', flat=True))
+        )
+
+    def test_save_is_a_regular_save(self):
+        saves = []
+        def receiver(sender, **kwargs):
+            saves.append(kwargs.get('update_fields'))
+        post_save.connect(receiver)
+        try:
+            self.publishable.save()
+        finally:
+            post_save.disconnect(receiver)
+        tools.assert_equals([None], saves)
+
+    def test_many_author_ids_fit(self):
+        authors = [Author.objects.create(slug='many-%d' % i, name='Many %d' % i) for i in range(60)]
+        self.publishable.authors.add(*authors)
+        tools.assert_equals(sorted(a.pk for a in authors), Publishable.objects.get(pk=self.publishable.pk).get_author_ids())
+
 class TestRedirects(PublishableTestCase):
     def test_url_change_creates_redirect(self):
         self.publishable.slug = 'old-article-new-slug'
@@ -14,7 +14,7 @@ from django.test import RequestFactory
 from ella.core.templatetags.core import listing_parse, _parse_box, BoxNode, EmptyNode
 from ella.core.templatetags.pagination import _do_paginator
 from ella.core.models import Category
-from ella.core.managers import ListingHandler
+from ella.core.managers import ListingHandler, ModelListingHandler
 from ella.articles.models import Article
 from ella.photos.models import Photo
 
@@ -147,6 +147,88 @@ class TestListingTag(TestCase):
         t = template.Template('{% listing 10 for category without p as var %}{{ var|join:":" }}')
         tools.assert_equals('', t.render(template.Context({'category': self.category, 'p': self.publishables[0]})))
 
+    def test_get_listing_without_several_publishables(self):
+        t = template.Template('{% listing 10 for category with children without shown as var %}{{ var|join:":" }}')
+        listings = [listing for listing in self.listings if listing.category in (self.category, self.category_nested)]
+        shown = [listings[0].publishable, listings[1].publishable]
+        expected = ':'.join(str(listing) for listing in listings[2:])
+        tools.assert_equals(expected, t.render(template.Context({'category': self.category, 'shown': shown})))
+
+class TestBatchListingsTag(TestCase):
+    def setUp(self):
+        super(TestBatchListingsTag, self).setUp()
+        create_basic_categories(self)
+        create_and_place_a_publishable(self)
+        create_and_place_more_publishables(self)
+        list_all_publishables_in_category_by_hour(self)
+        self.context = template.Context({'category': self.category})
+
+    def test_renders_the_same_as_separate_tags(self):
+        tags = (
+            '{% listing 10 for category as var %}{{ var|join:":" }}|'
+            '{% listing 2 from 2 for category with children as var %}{{ var|join:":" }}|'
+            '{% listing 10 for category using "redis" as var %}{{ var|join:":" }}'
+        )
+        expected = template.Template(tags).render(self.context)
+        t = template.Template('{% batchlistings %}' + tags + '{% endbatchlistings %}')
+        tools.assert_equals(expected, t.render(self.context))
+
+    def test_publishables_are_loaded_once_for_all_listings(self):
+        tags = '{% listing 10 for category as var %}{% listing 10 for category with children as var %}'
+        # listings (2 queries with children), 2x next change and articles for each tag
+        self.assertNumQueries(9, lambda: template.Template(tags).render(self.context))
+        # articles of both the tags loaded together
+        t = template.Template('{% batchlistings %}' + tags + '{% endbatchlistings %}')
+        self.assertNumQueries(8, lambda: t.render(self.context))
+
+    def test_identical_listings_are_fetched_once(self):
+        single = template.Template('{% listing 10 for category as var %}')
+        t = template.Template('{% batchlistings %}{% listing 10 for category as var %}{% listing 10 for category as other %}{% endbatchlistings %}')
+        self.assertNumQueries(4, lambda: single.render(self.context))
+        self.assertNumQueries(4, lambda: t.render(self.context))
+
+    def test_redis_listings_share_one_pipeline(self):
+        from ella.core.cache.redis import client
+        t = template.Template(
+            '{% batchlistings %}'
+            '{% listing 10 for category using "redis" as var %}{{ var|join:":" }}|'
+            '{% listing 10 for category with children using "redis" as var %}{{ var|join:":" }}'
+            '{% endbatchlistings %}'
+        )
+        pipelines = []
+        pipeline = client.pipeline
+        client.pipeline = lambda *args, **kwargs: pipelines.append(1) or pipeline(*args, **kwargs)
+        try:
+            t.render(self.context)
+        finally:
+            del client.pipeline
+        tools.assert_equals(1, len(pipelines))
+
+    def test_listings_depending_on_variables_inside_block_are_fetched_on_render(self):
+        t = template.Template('{% batchlistings %}{% with category as c %}{% listing 10 for c as var %}{{ var|join:":" }}{% endwith %}{% endbatchlistings %}')
+        expected = ':'.join([str(listing) for listing in self.listings if listing.category == self.category])
+        tools.assert_equals(expected, t.render(self.context))
+
+    def test_listings_in_branches_not_rendered_are_not_fetched(self):
+        t = template.Template(
+            '{% batchlistings %}'
+            '{% if category.pk == 0 %}{% listing 10 for category as var %}'
+            '{% else %}{% listing 10 for category with children as var %}{% endif %}'
+            '{% endbatchlistings %}'
+        )
+        requests = []
+        original = ModelListingHandler.__dict__['get_listings_many']
+        ModelListingHandler.get_listings_many = classmethod(lambda cls, r: requests.extend(r) or original.__get__(None, cls)(r))
+        try:
+            t.render(self.context)
+        finally:
+            ModelListingHandler.get_listings_many = original
+        tools.assert_equals([ListingHandler.IMMEDIATE], [lh.children for lh, offset, count in requests])
+
+    def test_batch_result_does_not_leak_out_of_block(self):
+        t = template.Template('{% batchlistings %}{% listing 10 for category as var %}{% endbatchlistings %}{{ var|join:":" }}')
+        tools.assert_equals('', t.render(self.context))
+
 class TestListingTagParser(TestCase):
     '''
     {% listing <limit>[ from <offset>][of <app.model>[, <app.model>[, ...]]][ for <category> ] [with children|descendents] as <result> %}
@@ -1,7 +1,7 @@
 from unittest import TestCase
 
 from nose import tools
-from ella.utils.pagination import FirstPagePaginator
+from ella.utils.pagination import FirstPagePaginator, CursorPaginator
 
 
 OBJECTS = ['1', '2', '3', '4', '5']
@@ -24,3 +24,38 @@ class TestPaginator(TestCase):
 
         tools.assert_equals(p.page(1).object_list, ['1', '2'])
         tools.assert_equals(p.page(2).object_list, ['3', '4'])
+
+
+class ListHandler(object):
+    " Listing handler stand-in whose cursor is the item itself. "
+    def __init__(self, items):
+        self.items = items
+
+    def count(self):
+        return len(self.items)
+
+    def get_listings_after(self, cursor=None, count=10):
+        start = 0 if cursor is None else self.items.index(cursor) + 1
+        return self.items[start:start + count]
+
+    def get_cursor(self, item):
+        return item
+
+
+class TestCursorPaginator(TestCase):
+    def test_first_page(self):
+        page = CursorPaginator(ListHandler(OBJECTS), first_page_count=1, per_page=2).page_after()
+        tools.assert_equals(['1'], page.object_list)
+        tools.assert_equals('1', page.next_cursor)
+        tools.assert_false(page.has_previous())
+
+    def test_page_after_cursor(self):
+        page = CursorPaginator(ListHandler(OBJECTS), first_page_count=1, per_page=2).page_after('1')
+        tools.assert_equals(['2', '3'], page.object_list)
+        tools.assert_true(page.has_next())
+
+    def test_last_page_has_no_next_cursor(self):
+        page = CursorPaginator(ListHandler(OBJECTS), per_page=2).page_after('3')
+        tools.assert_equals(['4', '5'], page.object_list)
+        tools.assert_equals(None, page.next_cursor)
+        tools.assert_false(page.has_next())